@@ -0,0 +1,361 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import re
+import sys
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+import cli
+import consultas
+import db
+import instrumentacao
+import ocupacao
+import preparadas
+import referencia
+import rotas
+from validacao import validar_cpf
+
+HOST = os.getenv("API_HOST", "127.0.0.1")
+PORTA = int(os.getenv("API_PORT", "8080"))
+# Prazo de cada requisicao, incluindo a espera por vaga; o statement_timeout acompanha
+TIMEOUT_REQUISICAO = float(os.getenv("API_TIMEOUT", "5"))
+# Requisicoes usando o banco ao mesmo tempo (uma thread e uma conexao do pool cada)
+MAX_CONCORRENTES = int(os.getenv("API_MAX_CONCORRENTES", str(db.POOL_MAX)))
+# Requisicoes esperando vaga; acima disso a resposta e 503 na hora
+MAX_FILA = int(os.getenv("API_MAX_FILA", "200"))
+LIMITE_PAGINA = 100
+TAMANHO_MAXIMO_CABECALHO = 16384
+# As rotas sao todas GET e o corpo e descartado; acima disso a resposta e 413 sem ler o corpo
+TAMANHO_MAXIMO_CORPO = 65536
+
+STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+          413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+          504: "Gateway Timeout"}
+
+class ErroHttp(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+def _colunas(tabela, nome):
+    return tabela[nome][2]
+
+def _registros(colunas, rows):
+    return list(cli.para_registros(colunas, rows))
+
+def _cpf(cpf):
+    valido, mensagem = validar_cpf(cpf)
+    if not valido:
+        raise ErroHttp(400, mensagem)
+    return cpf
+
+def _obrigatorio(params, nome):
+    valor = params.get(nome)
+    if not valor:
+        raise ErroHttp(400, f"parametro '{nome}' obrigatorio")
+    return valor
+
+def _inteiro(params, nome, padrao, maximo):
+    try:
+        return max(1, min(int(params.get(nome, padrao)), maximo))
+    except ValueError:
+        raise ErroHttp(400, f"parametro '{nome}' deve ser inteiro")
+
+def _data(params, nome):
+    valor = params.get(nome)
+    if not valor:
+        return None
+    try:
+        return datetime.date.fromisoformat(valor)
+    except ValueError:
+        raise ErroHttp(400, f"parametro '{nome}' deve ser uma data AAAA-MM-DD")
+
+def _data_hora(params, nome):
+    valor = params.get(nome)
+    if not valor:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(valor)
+    except ValueError:
+        raise ErroHttp(400, f"parametro '{nome}' deve ser data e hora ISO (AAAA-MM-DDTHH:MM:SS)")
+
+def _consultar(funcao, *args):
+    with db.conexao(timeout_ms=TIMEOUT_REQUISICAO * 1000) as conn:
+        return funcao(conn, *args)
+
+# ROTAS (executadas nas threads do executor)
+def rota_viagens(params, cpf):
+    limite = _inteiro(params, "limite", consultas.TAMANHO_PAGINA_VIAGENS, LIMITE_PAGINA)
+    rows, tem_mais = _consultar(consultas.buscar_pagina_viagens, _cpf(cpf),
+                                _data_hora(params, "antes"), _data_hora(params, "depois"), limite)
+    viagens = _registros(_colunas(cli.CONSULTAS, "viagens"), rows)
+    # Cursores do keyset: repassar em ?antes= ou ?depois= para navegar
+    return {
+        "viagens": viagens,
+        "tem_mais": tem_mais,
+        "antes": viagens[-1]["datahora_inicio"] if viagens else None,
+        "depois": viagens[0]["datahora_inicio"] if viagens else None,
+    }
+
+def rota_gasto(params, cpf):
+    row = _consultar(consultas.buscar_total_gasto, _cpf(cpf))
+    return _registros(_colunas(cli.CONSULTAS, "gasto"), [row])[0]
+
+def rota_linhas(params):
+    rows = referencia.linhas_por_bairro(_obrigatorio(params, "bairro"))
+    return _registros(_colunas(cli.CONSULTAS, "linhas"), rows)
+
+def rota_pontos(params):
+    rows = referencia.pontos_parada(_obrigatorio(params, "bairro"), _obrigatorio(params, "rua"))
+    return _registros(_colunas(cli.CONSULTAS, "pontos"), rows)
+
+def rota_trajeto(params):
+    criterio = params.get("criterio", "tempo")
+    if criterio not in rotas.CRITERIOS:
+        raise ErroHttp(400, f"parametro 'criterio' deve ser um de {', '.join(rotas.CRITERIOS)}")
+    origem, destino = _obrigatorio(params, "de"), _obrigatorio(params, "para")
+    rota = rotas.planejar(origem, destino, criterio)
+    if rota is None:
+        raise ErroHttp(404, "nenhuma linha ativa passa por um dos bairros")
+    if rota.minutos is None:
+        raise ErroHttp(404, f"nao ha trajeto de {origem} ate {destino}")
+    colunas = _colunas(cli.CONSULTAS, "pontos")
+    return {
+        "minutos": round(rota.minutos, 1),
+        "tarifa": rota.tarifa,
+        "baldeacoes": rota.baldeacoes,
+        "trechos": [{
+            "linha": trecho.linha,
+            "embarque": _registros(colunas, [trecho.embarque])[0],
+            "desembarque": _registros(colunas, [trecho.desembarque])[0],
+            "paradas": trecho.paradas,
+            "minutos": round(trecho.minutos, 1),
+            "tarifa": trecho.tarifa,
+        } for trecho in rota.trechos],
+    }
+
+def rota_linhas_ativas(params):
+    return _registros(_colunas(cli.RELATORIOS, "linhas-ativas"), referencia.linhas_ativas())
+
+def rota_viagens_linha(params):
+    rows = _consultar(consultas.buscar_viagens_por_linha)
+    return _registros(_colunas(cli.RELATORIOS, "viagens-linha"), rows)
+
+def rota_rotas(params):
+    rows = _consultar(consultas.buscar_rotas_mais_utilizadas, _inteiro(params, "limite", 10, 1000))
+    return _registros(_colunas(cli.RELATORIOS, "rotas"), rows)
+
+def rota_picos(params):
+    # ?de=&ate= (datas ISO) limita ao periodo e le so as particoes dele; sem eles, o rollup
+    rows = _consultar(consultas.buscar_horarios_de_pico, _data(params, "de"), _data(params, "ate"))
+    return _registros(_colunas(cli.RELATORIOS, "picos"), rows)
+
+def rota_ocupacao(params):
+    try:
+        limiar = float(params.get("limiar", ocupacao.LIMIAR))
+    except ValueError:
+        raise ErroHttp(400, "parametro 'limiar' deve ser numerico")
+    relatorio = _consultar(ocupacao.calcular, _data(params, "de"), _data(params, "ate"), limiar)
+    return ocupacao.para_json(relatorio)
+
+def rota_todas_as_linhas(params, cnpj):
+    limite = _inteiro(params, "limite", consultas.TAMANHO_PAGINA_CIDADAOS, LIMITE_PAGINA)
+    resultado = _consultar(consultas.buscar_cidadaos_todas_as_linhas, cnpj,
+                           params.get("depois", ""), limite)
+    if resultado is None:
+        raise ErroHttp(404, f"empresa {cnpj} inexistente")
+    empresa, rows, tem_mais = resultado
+    # Cursor do keyset: repassar em ?depois= para a proxima pagina
+    return {
+        "empresa": empresa,
+        "cidadaos": _registros(["cpf", "email"], rows),
+        "tem_mais": tem_mais,
+        "depois": rows[-1][0] if rows else None,
+    }
+
+ROTAS = [
+    (re.compile(r"/cidadaos/(\d+)/viagens"), rota_viagens),
+    (re.compile(r"/cidadaos/(\d+)/gasto"), rota_gasto),
+    (re.compile(r"/linhas"), rota_linhas),
+    (re.compile(r"/linhas/ativas"), rota_linhas_ativas),
+    (re.compile(r"/pontos"), rota_pontos),
+    (re.compile(r"/trajetos"), rota_trajeto),
+    (re.compile(r"/relatorios/viagens-linha"), rota_viagens_linha),
+    (re.compile(r"/relatorios/rotas"), rota_rotas),
+    (re.compile(r"/relatorios/picos"), rota_picos),
+    (re.compile(r"/relatorios/ocupacao"), rota_ocupacao),
+    (re.compile(r"/empresas/(\d{14})/cidadaos-todas-linhas"), rota_todas_as_linhas),
+]
+
+class Servidor:
+    def __init__(self, max_concorrentes=MAX_CONCORRENTES, max_fila=MAX_FILA,
+                 timeout=TIMEOUT_REQUISICAO):
+        self.executor = ThreadPoolExecutor(max_workers=max_concorrentes,
+                                           thread_name_prefix="api")
+        self.vagas = asyncio.Semaphore(max_concorrentes)
+        self.limite = max_concorrentes + max_fila
+        self.timeout = timeout
+        self.em_andamento = 0
+        self.atendidas = 0
+        self.recusadas = 0
+
+    async def executar(self, funcao, *args):
+        loop = asyncio.get_running_loop()
+        async with self.vagas:
+            return await loop.run_in_executor(self.executor, funcao, *args)
+
+    async def despachar(self, metodo, alvo):
+        url = urllib.parse.urlsplit(alvo)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        caminho = url.path.rstrip("/") or "/"
+
+        if caminho == "/saude":
+            return 200, {"status": "ok", "em_andamento": self.em_andamento,
+                         "atendidas": self.atendidas, "recusadas": self.recusadas,
+                         "cache_referencia": referencia.carregado()}
+        if caminho == "/metricas":
+            return 200, dict(instrumentacao.resumo(), preparadas=preparadas.resumo())
+
+        for padrao, funcao in ROTAS:
+            casamento = padrao.fullmatch(caminho)
+            if casamento:
+                break
+        else:
+            return 404, {"erro": f"rota {caminho} inexistente"}
+        if metodo != "GET":
+            return 405, {"erro": "apenas GET"}
+
+        if self.em_andamento >= self.limite:
+            self.recusadas += 1
+            return 503, {"erro": "servidor ocupado"}
+
+        self.em_andamento += 1
+        try:
+            corpo = await asyncio.wait_for(self.executar(funcao, params, *casamento.groups()),
+                                           self.timeout)
+            self.atendidas += 1
+            return 200, corpo
+        except asyncio.TimeoutError:
+            return 504, {"erro": f"tempo limite de {self.timeout:.1f}s excedido"}
+        except ErroHttp as e:
+            return e.status, {"erro": str(e)}
+        except psycopg2.extensions.QueryCanceledError:
+            return 504, {"erro": "consulta cancelada pelo statement_timeout"}
+        except db.PoolIndisponivel as e:
+            return 503, {"erro": str(e)}
+        except Exception as e:
+            return 500, {"erro": str(e)}
+        finally:
+            self.em_andamento -= 1
+
+    async def atender(self, reader, writer):
+        try:
+            while True:
+                try:
+                    requisicao = await ler_requisicao(reader)
+                except ErroHttp as e:
+                    # O corpo ficou no socket: responde e fecha em vez de reaproveitar a conexao
+                    writer.write(resposta(e.status, {"erro": str(e)}, False))
+                    await writer.drain()
+                    break
+                if requisicao is None:
+                    break
+                metodo, alvo, versao, cabecalhos = requisicao
+                status, corpo = await self.despachar(metodo, alvo)
+                manter = versao == "HTTP/1.1" and cabecalhos.get("connection", "").lower() != "close"
+                writer.write(resposta(status, corpo, manter))
+                await writer.drain()
+                if not manter:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def fechar(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+async def ler_requisicao(reader):
+    try:
+        bruto = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise
+    if len(bruto) > TAMANHO_MAXIMO_CABECALHO:
+        raise ValueError("cabecalho grande demais")
+
+    linhas = bruto.decode("latin-1").split("\r\n")
+    metodo, alvo, versao = linhas[0].split(" ", 2)
+    cabecalhos = {}
+    for linha in linhas[1:]:
+        if ":" in linha:
+            nome, valor = linha.split(":", 1)
+            cabecalhos[nome.strip().lower()] = valor.strip()
+
+    # GET nao deveria ter corpo, mas se vier e descartado para nao quebrar o keep-alive
+    tamanho = cabecalhos.get("content-length", "0") or "0"
+    if not tamanho.isdigit():
+        raise ErroHttp(400, "Content-Length invalido")
+    if int(tamanho) > TAMANHO_MAXIMO_CORPO:
+        raise ErroHttp(413, f"corpo maior que {TAMANHO_MAXIMO_CORPO} bytes")
+    if int(tamanho):
+        await reader.readexactly(int(tamanho))
+    return metodo, alvo, versao, cabecalhos
+
+def resposta(status, corpo, manter):
+    dados = json.dumps(corpo, ensure_ascii=False, default=str).encode("utf-8")
+    cabecalho = (
+        f"HTTP/1.1 {status} {STATUS.get(status, '')}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(dados)}\r\n"
+        f"Connection: {'keep-alive' if manter else 'close'}\r\n\r\n"
+    )
+    return cabecalho.encode("latin-1") + dados
+
+async def servir(host, porta, servidor):
+    server = await asyncio.start_server(servidor.atender, host, porta,
+                                        limit=TAMANHO_MAXIMO_CABECALHO)
+    print(json.dumps({"ouvindo": f"http://{host}:{porta}"}), file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP (JSON) com as consultas do sistema")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--porta", type=int, default=PORTA)
+    parser.add_argument("--concorrentes", type=int, default=MAX_CONCORRENTES,
+                        help="consultas simultaneas no banco (threads e conexoes do pool)")
+    parser.add_argument("--fila", type=int, default=MAX_FILA,
+                        help="requisicoes aguardando vaga antes de responder 503")
+    args = parser.parse_args(argv)
+
+    db.iniciar_pool(maximo=args.concorrentes)
+    try:
+        referencia.iniciar()
+    except Exception as e:
+        print(json.dumps({"aviso": f"cache de referencia indisponivel: {e}"}), file=sys.stderr)
+
+    async def rodar():
+        servidor = Servidor(args.concorrentes, args.fila)
+        try:
+            await servir(args.host, args.porta, servidor)
+        finally:
+            servidor.fechar()
+
+    try:
+        asyncio.run(rodar())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        referencia.parar()
+        db.fechar_pool()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,18 @@
-import psycopg2
+import sys
 import time
+
+_inicio_processo = time.perf_counter()
+
+# Modo nao interativo: despacha antes de carregar rich, pyfiglet e readchar
+if __name__ == "__main__" and len(sys.argv) > 1:
+    import cli
+    sys.exit(cli.main(sys.argv[1:]))
+
+import datetime
 import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import psycopg2
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
@@ -8,59 +20,45 @@ from rich.progress import Progress, SpinnerColumn, TextColumn
 from rich.prompt import Prompt
 from rich import box
 from rich.align import Align
-from pyfiglet import Figlet
+from rich.console import Group
+from rich.live import Live
+from rich.text import Text
 import readchar
 
-console = Console()
-
-def validar_cpf(cpf):
-    if not cpf:
-        return False, "CPF não pode estar vazio"
-
-    if not cpf.isdigit():
-        return False, "CPF deve conter apenas números (sem pontos ou traços)"
-
-    if len(cpf) != 11:
-        return False, "CPF deve conter exatamente 11 dígitos"
-
-    return True, "CPF válido"
-
-def validar_cep(cep):
-    if not cep:
-        return False, "CEP não pode estar vazio"
-
-    if not cep.isdigit():
-        return False, "CEP deve conter apenas números (sem pontos ou traços)"
-
-    if len(cep) != 8:
-        return False, "CEP deve conter exatamente 8 dígitos"
-
-    return True, "CEP válido"
-
-def validar_email(email):
-    if not email:
-        return False, "Email não pode estar vazio"
+import autenticacao
+import consultas
+import db
+import exportacao
+import instrumentacao
+import migrador
+import ocupacao
+import paginador
+import particoes
+import preparadas
+import referencia
+import rotas
+from validacao import validar_cpf, validar_cep, validar_email, validar_numero_casa
 
-    if '@' not in email:
-        return False, "Email deve conter o caractere @"
-
-    partes = email.split('@')
-    if len(partes) != 2 or not partes[0] or not partes[1]:
-        return False, "Email deve ter o formato nome@dominio"
+console = Console()
 
-    return True, "Email válido"
+# Prazo de cada quadro do painel do gestor (tambem o statement_timeout da consulta dele)
+TIMEOUT_PAINEL_MS = int(os.getenv("PAINEL_TIMEOUT_MS", "5000"))
 
-def validar_numero_casa(numero):
-    if not numero:
-        return True, "Número vazio é válido"
+# Banner ja renderizado (com os codigos de cor) por largura de terminal
+_banner_renderizado = {}
 
-    if not numero.isdigit():
-        return False, "Número da casa deve conter apenas dígitos"
+# Quanto cada etapa da inicializacao levou, mostrado na tela de DEBUG
+tempos_inicio = []
+_ultima_marca = _inicio_processo
 
-    return True, "Número válido"
+def marcar_etapa(nome):
+    global _ultima_marca
+    agora = time.perf_counter()
+    tempos_inicio.append((nome, agora - _ultima_marca))
+    _ultima_marca = agora
 
 def clear_screen():
-    os.system('clear' if os.name != 'nt' else 'cls')
+    console.clear()
 
 def show_loading(message, duration=1):
     with Progress(
@@ -72,16 +70,10 @@ def show_loading(message, duration=1):
         task = progress.add_task(f"[cyan]{message}...", total=None)
         time.sleep(duration)
 
-def show_banner():
-    clear_screen()
-    f = Figlet(font='slant')
-    banner = f.renderText('SISTEMA DE')
-    banner2 = f.renderText('   ONIBUS')
+def montar_banner():
+    from pyfiglet import Figlet
 
-    console.print(banner, style="bold cyan")
-    console.print(banner2, style="bold yellow")
-    console.print("\n[dim]Sistema de Gerenciamento de Transporte Publico[/dim]", justify="center")
-    console.print("\n[bold cyan]Equipe de Desenvolvimento[/bold cyan]\n", justify="center")
+    f = Figlet(font='slant')
 
     team_table = Table(show_header=False, box=box.SIMPLE, padding=(0, 2), show_edge=False)
     team_table.add_column(justify="left", style="cyan")
@@ -92,10 +84,27 @@ def show_banner():
     team_table.add_row("Manassés Arange de Moura", "15474205")
     team_table.add_row("Carolina Gomes Guerreiro", "15445453")
 
-    console.print(Align.center(team_table))
-    console.print()
+    return Group(
+        Text(f.renderText('SISTEMA DE'), style="bold cyan"),
+        Text(f.renderText('   ONIBUS'), style="bold yellow"),
+        Text.from_markup("\n[dim]Sistema de Gerenciamento de Transporte Publico[/dim]", justify="center"),
+        Text.from_markup("\n[bold cyan]Equipe de Desenvolvimento[/bold cyan]\n", justify="center"),
+        Align.center(team_table),
+        Text(),
+    )
 
-def get_connection():
+def show_banner():
+    # O figlet e a tabela so sao renderizados uma vez; depois o banner e so reescrito
+    clear_screen()
+    largura = console.width
+    if largura not in _banner_renderizado:
+        with console.capture() as captura:
+            console.print(montar_banner())
+        _banner_renderizado[largura] = captura.get()
+    console.file.write(_banner_renderizado[largura])
+    console.file.flush()
+
+def conectar_banco():
     try:
         with Progress(
             SpinnerColumn(),
@@ -104,172 +113,240 @@ def get_connection():
             transient=True
         ) as progress:
             task = progress.add_task("[cyan]Conectando ao banco de dados...", total=None)
-            conn = psycopg2.connect(
-                host=os.getenv("DB_HOST", "localhost"),
-                port=int(os.getenv("DB_PORT", "5433")),
-                database=os.getenv("DB_NAME", "sistemaonibus"),
-                user=os.getenv("DB_USER", "app_user"),
-                password=os.getenv("DB_PASSWORD", "trabalhobd")
-            )
-            time.sleep(0.5)
+            db.aguardar_banco()
+            marcar_etapa("espera do banco")
+            db.iniciar_pool()
+            marcar_etapa("pool de conexoes")
         console.print("[green]Conexao estabelecida com sucesso![/green]\n")
-        time.sleep(0.5)
-        return conn
+        return True
     except Exception as e:
         console.print(f"[red]Erro ao conectar ao banco:[/red] {e}\n")
-        return None
+        return False
+
+def aplicar_migracoes():
+    try:
+        with db.conexao() as conn:
+            novas = migrador.aplicar(conn)
+        for nome in novas:
+            console.print(f"[green]Migracao aplicada:[/green] {nome}")
+    except Exception as e:
+        console.print(f"[red]Erro ao aplicar migracoes:[/red] {e}\n")
+        return False
+
+    # Particoes dos proximos meses de VIAGEM; sem elas as viagens caem na particao padrao
+    try:
+        with db.conexao() as conn:
+            particoes.garantir_futuras(conn)
+    except Exception as e:
+        console.print(f"[yellow]Particoes de VIAGEM nao criadas:[/yellow] {e}\n")
+    return True
+
+def opcoes_menu(options, selected):
+    texto = Text()
+    for i, option in enumerate(options):
+        if i == selected:
+            texto.append(f"  > {option}", style="black on cyan")
+        else:
+            texto.append(f"    {option}")
+        texto.append("\n")
+    texto.append("\nUse setas para navegar, Enter para selecionar", style="dim")
+    return texto
 
 def menu_select(title, options, description=None):
     selected = 0
 
-    while True:
-        clear_screen()
-        show_banner()
+    # Banner e titulo sao desenhados uma vez; cada tecla so repinta as linhas das opcoes
+    show_banner()
 
-        if description:
-            console.print(Panel(description, style="cyan", box=box.ROUNDED))
-            console.print()
+    if description:
+        console.print(Panel(description, style="cyan", box=box.ROUNDED))
+        console.print()
 
-        console.print(f"[bold cyan]=== {title} ===[/bold cyan]\n")
+    console.print(f"[bold cyan]=== {title} ===[/bold cyan]\n")
 
-        for i, option in enumerate(options):
-            if i == selected:
-                console.print(f"  [black on cyan]> {option}[/black on cyan]")
+    with Live(opcoes_menu(options, selected), console=console, auto_refresh=False) as live:
+        while True:
+            key = readchar.readkey()
+
+            if key == readchar.key.UP and selected > 0:
+                selected -= 1
+            elif key == readchar.key.DOWN and selected < len(options) - 1:
+                selected += 1
+            elif key == readchar.key.ENTER or key == '\r' or key == '\n':
+                return selected
             else:
-                console.print(f"    {option}")
+                continue
 
-        console.print("\n[dim]Use setas para navegar, Enter para selecionar[/dim]")
+            live.update(opcoes_menu(options, selected), refresh=True)
 
-        key = readchar.readkey()
+# INFORMACOES DEBUG
+def senha_debug(senha):
+    # Senhas ja convertidas para hash nao tem mais como ser mostradas
+    if senha.startswith(autenticacao.ALGORITMO + "$"):
+        return "[dim](hash)[/dim]"
+    return senha
+
+def contagem_debug(valor, exatas):
+    if valor is None:
+        return "?"
+    return str(valor) if exatas else f"~{valor}"
+
+def resumo_debug(exatas):
+    with db.conexao() as conn:
+        total_cidadaos, total_gestores, total_viagens, total_linhas = \
+            consultas.buscar_estatisticas(conn, exatas)
+
+    resumo = (
+        f"[cyan]Cidadaos:[/cyan] {contagem_debug(total_cidadaos, exatas)}    "
+        f"[yellow]Gestores:[/yellow] {contagem_debug(total_gestores, exatas)}    "
+        f"[green]Viagens:[/green] {contagem_debug(total_viagens, exatas)}    "
+        f"[blue]Linhas Ativas:[/blue] {total_linhas}"
+    )
+    if not exatas:
+        resumo += "\n[dim]Estimativas das estatisticas do Postgres (ANALYZE/autovacuum)[/dim]"
+    if tempos_inicio:
+        total = sum(segundos for _, segundos in tempos_inicio)
+        resumo += f"\n[dim]Inicializacao ({total:.2f} s):[/dim] " + "    ".join(
+            f"[cyan]{nome}:[/cyan] {segundos * 1000:.0f} ms" for nome, segundos in tempos_inicio)
+    return resumo
+
+def filtro_debug():
+    filtro = console.input("[cyan]Filtrar por trecho do email ou CPF (vazio = todos):[/cyan] ")
+    filtro = filtro.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{filtro}%"
+
+def mostrar_info_debug():
+    # Abre com estimativas (nao le as tabelas); a contagem exata e pedida pelo menu
+    exatas = False
+    try:
+        resumo = resumo_debug(exatas)
+    except Exception as e:
+        clear_screen()
+        show_banner()
+        console.print(f"[red]Erro ao buscar informacoes:[/red] {e}")
+        console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+        return
 
-        if key == readchar.key.UP and selected > 0:
-            selected -= 1
-        elif key == readchar.key.DOWN and selected < len(options) - 1:
-            selected += 1
-        elif key == readchar.key.ENTER or key == '\r' or key == '\n':
-            return selected
+    while True:
+        escolha = menu_select(
+            "Informacoes para DEBUG",
+            ["Usuarios cidadao", "Usuarios gestor", "Linhas e bairros",
+             "Usar estimativas" if exatas else "Contar exatamente", "Voltar"],
+            resumo
+        )
 
-# INFORMACOES DEBUG
-def mostrar_info_debug(conn):
-    clear_screen()
-    show_banner()
+        try:
+            if escolha == 0:
+                filtro = filtro_debug()
+                paginador.paginar(
+                    console, "USUARIOS CIDADAO",
+                    [("Email", {"style": "cyan"}), ("Senha", {"style": "yellow"}),
+                     ("CPF", {"style": "white"}),
+                     ("Status", {"style": "green", "justify": "center"})],
+                    paginador.FonteKeyset("SQL_DEBUG_CIDADAOS", (filtro, filtro)),
+                    lambda row: [row[0], senha_debug(row[1]), row[2],
+                                 "Ativo" if row[3] == 'A' else "Inativo"])
+            elif escolha == 1:
+                filtro = filtro_debug()
+                paginador.paginar(
+                    console, "USUARIOS GESTOR",
+                    [("Email", {"style": "yellow"}), ("Senha", {"style": "cyan"}),
+                     ("CPF", {"style": "white"}), ("Cargo", {"style": "green"})],
+                    paginador.FonteKeyset("SQL_DEBUG_GESTORES", (filtro, filtro)),
+                    lambda row: [row[0], senha_debug(row[1]), row[2], row[3]],
+                    estilo="yellow")
+            elif escolha == 2:
+                filtro = console.input(
+                    "[cyan]Filtrar por linha ou bairro (vazio = todos):[/cyan] ").strip().lower()
+                pares = [(linha, bairro) for linha, bairro in referencia.linhas_e_bairros()
+                         if filtro in linha.lower() or filtro in bairro.lower()]
+                paginador.paginar(
+                    console, "LINHAS E BAIRROS DISPONIVEIS",
+                    [("Linha", {"style": "cyan"}), ("Bairro", {"style": "green"})],
+                    paginador.FonteLista(pares),
+                    estilo="green")
+            elif escolha == 3:
+                exatas = not exatas
+                resumo = resumo_debug(exatas)
+            else:
+                break
+        except Exception as e:
+            console.print(f"[red]Erro ao buscar informacoes:[/red] {e}")
+            console.input("\n[dim]Pressione Enter para continuar...[/dim]")
 
-    console.print(Panel.fit(
-        "[bold yellow]Informacoes para DEBUG[/bold yellow]",
-        border_style="yellow"
-    ))
-    console.print()
+def mostrar_desempenho():
+    while True:
+        clear_screen()
+        show_banner()
 
-    try:
-        # Usuarios Cidadao
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT uc.EMAIL, uc.SENHA, uc.CPF, uc.STATUS
-                FROM USUARIO_CIDADAO uc
-                ORDER BY uc.EMAIL
-            """)
-            cidadaos = cur.fetchall()
-
-        if cidadaos:
-            table = Table(title="USUARIOS CIDADAO",
+        dados = instrumentacao.resumo()
+        console.print(Panel.fit(
+            f"[bold yellow]Desempenho das consultas[/bold yellow]  [dim]desde {dados['desde']}, "
+            f"lentas acima de {dados['limiar_lenta_ms']:.0f} ms em {instrumentacao.ARQUIVO_LENTAS}[/dim]",
+            border_style="yellow"
+        ))
+        console.print()
+
+        if dados["consultas"]:
+            table = Table(title="CONSULTAS (mais tempo acumulado primeiro)",
                         title_style="bold cyan",
                         box=box.ROUNDED,
                         border_style="cyan")
 
-            table.add_column("Email", style="cyan")
-            table.add_column("Senha", style="yellow")
-            table.add_column("CPF", style="white")
-            table.add_column("Status", style="green", justify="center")
+            table.add_column("Consulta", style="cyan")
+            table.add_column("Chamadas", style="white", justify="right")
+            table.add_column("Media (ms)", style="green", justify="right")
+            table.add_column("p95 (ms)", style="yellow", justify="right")
+            table.add_column("Max (ms)", style="yellow", justify="right")
+            table.add_column("Linhas/chamada", style="white", justify="right")
+            table.add_column("Lentas", style="red", justify="right")
+            table.add_column("Erros", style="red", justify="right")
 
-            for email, senha, cpf, status in cidadaos:
-                table.add_row(email, senha, cpf, "Ativo" if status == 'A' else "Inativo")
+            for nome, e in dados["consultas"].items():
+                table.add_row(nome, str(e["chamadas"]), f"{e['media_ms']:.1f}",
+                              f"{e['p95_ms']:.1f}", f"{e['max_ms']:.1f}",
+                              f"{e['linhas_por_chamada']:.1f}", str(e["lentas"]), str(e["erros"]))
 
             console.print(table)
-            console.print()
-
-        # Usuarios Gestor
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT ug.EMAIL, ug.SENHA, ug.CPF, ug.CARGO
-                FROM USUARIO_GESTOR ug
-                ORDER BY ug.EMAIL
-            """)
-            gestores = cur.fetchall()
-
-        if gestores:
-            table = Table(title="USUARIOS GESTOR",
-                        title_style="bold yellow",
+        else:
+            console.print("[yellow]Nenhuma consulta executada ainda.[/yellow]")
+
+        preparadas_resumo = preparadas.resumo()
+        if any(c["acertos"] or c["preparos"] or c["texto"]
+               for c in preparadas_resumo["consultas"].values()):
+            table = Table(title=f"CONSULTAS PREPARADAS (acerto "
+                                f"{preparadas_resumo['taxa_acerto']:.0%}, "
+                                f"{preparadas_resumo['conexoes']} conexoes)",
+                        title_style="bold cyan",
                         box=box.ROUNDED,
-                        border_style="yellow")
+                        border_style="cyan")
 
-            table.add_column("Email", style="yellow")
-            table.add_column("Senha", style="cyan")
-            table.add_column("CPF", style="white")
-            table.add_column("Cargo", style="green")
+            table.add_column("Consulta", style="cyan")
+            table.add_column("EXECUTE", style="green", justify="right")
+            table.add_column("PREPARE", style="yellow", justify="right")
+            table.add_column("Perdidas", style="red", justify="right")
+            table.add_column("Texto", style="white", justify="right")
+            table.add_column("Acerto", style="bold green", justify="right")
 
-            for email, senha, cpf, cargo in gestores:
-                table.add_row(email, senha, cpf, cargo)
+            for nome, c in preparadas_resumo["consultas"].items():
+                table.add_row(nome, str(c["acertos"]), str(c["preparos"]), str(c["perdidas"]),
+                              str(c["texto"]), f"{c['taxa_acerto']:.0%}")
 
-            console.print(table)
             console.print()
-
-        # Linhas e Bairros
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT DISTINCT l.NOME_CODIGO, p.BAIRRO
-                FROM LINHA l
-                JOIN PONTO_PARADA p ON l.NOME_CODIGO = p.NOME_CODIGO_LINHA
-                WHERE l.ATIVO = 'S' AND p.BAIRRO IS NOT NULL
-                ORDER BY l.NOME_CODIGO, p.BAIRRO
-            """)
-            linhas = cur.fetchall()
-
-        if linhas:
-            table = Table(title="LINHAS E BAIRROS DISPONIVEIS",
-                        title_style="bold green",
-                        box=box.ROUNDED,
-                        border_style="green")
-
-            table.add_column("Linha", style="cyan")
-            table.add_column("Bairro", style="green")
-
-            for linha, bairro in linhas:
-                table.add_row(linha, bairro)
-
             console.print(table)
-            console.print()
 
-        # Estatisticas
-        with conn.cursor() as cur:
-            cur.execute("SELECT COUNT(*) FROM USUARIO_CIDADAO")
-            total_cidadaos = cur.fetchone()[0]
-
-            cur.execute("SELECT COUNT(*) FROM USUARIO_GESTOR")
-            total_gestores = cur.fetchone()[0]
-
-            cur.execute("SELECT COUNT(*) FROM VIAGEM")
-            total_viagens = cur.fetchone()[0]
-
-            cur.execute("SELECT COUNT(*) FROM LINHA WHERE ATIVO = 'S'")
-            total_linhas = cur.fetchone()[0]
-
-        stats = Panel(
-            f"[cyan]Cidadaos:[/cyan] {total_cidadaos}    "
-            f"[yellow]Gestores:[/yellow] {total_gestores}    "
-            f"[green]Viagens:[/green] {total_viagens}    "
-            f"[blue]Linhas Ativas:[/blue] {total_linhas}",
-            title="ESTATISTICAS DO SISTEMA",
-            border_style="magenta",
-            box=box.DOUBLE
-        )
-        console.print(stats)
-
-    except Exception as e:
-        console.print(f"[red]Erro ao buscar informacoes:[/red] {e}")
-
-    console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+        opcao = console.input("\n[dim]S salva em JSON, Z zera os contadores, Enter volta:[/dim] ")
+        opcao = opcao.strip().lower()
+        if opcao == "s":
+            caminho = instrumentacao.salvar()
+            console.input(f"[green]Salvo em {caminho}.[/green] [dim]Enter para continuar...[/dim]")
+        elif opcao == "z":
+            instrumentacao.zerar()
+            preparadas.zerar()
+        else:
+            break
 
-def cadastrar_cidadao(conn):
+def cadastrar_cidadao():
     clear_screen()
     show_banner()
 
@@ -317,27 +394,20 @@ def cadastrar_cidadao(conn):
 
     try:
         show_loading("Salvando dados")
-        with conn.cursor() as cur:
-            cur.execute("INSERT INTO USUARIO (CPF, TIPO) VALUES (%s, 'C')", (cpf,))
-            numero_int = int(numero) if numero != "" else None
-            cur.execute(
-                """INSERT INTO USUARIO_CIDADAO
-                   (CPF, RUA, BAIRRO, NUMERO, CEP, STATUS, EMAIL, SENHA)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
-                (cpf, rua, bairro, numero_int, cep, status, email, senha)
-            )
-        conn.commit()
+        numero_int = int(numero) if numero != "" else None
+        with db.conexao() as conn:
+            consultas.inserir_cidadao(conn, cpf, rua, bairro, numero_int, cep, email,
+                                      autenticacao.gerar_hash(senha), status)
+            conn.commit()
         console.print("\n[green]Cidadao cadastrado com sucesso![/green]")
     except psycopg2.IntegrityError:
-        conn.rollback()
         console.print("\n[red]Ja existe um usuario com esse CPF![/red]")
     except Exception as e:
-        conn.rollback()
         console.print(f"\n[red]Erro ao cadastrar:[/red] {e}")
 
     console.input("\n[dim]Pressione Enter para continuar...[/dim]")
 
-def cadastrar_gestor(conn):
+def cadastrar_gestor():
     clear_screen()
     show_banner()
 
@@ -386,28 +456,21 @@ def cadastrar_gestor(conn):
 
     try:
         show_loading("Salvando dados")
-        with conn.cursor() as cur:
-            cur.execute("INSERT INTO USUARIO (CPF, TIPO) VALUES (%s, 'G')", (cpf,))
-            numero_int = int(numero) if numero != "" else None
-            cur.execute(
-                """INSERT INTO USUARIO_GESTOR
-                   (CPF, RUA, BAIRRO, NUMERO, CEP, CARGO, EMAIL, SENHA, CNPJ_ORGAO_PUBLICO)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                (cpf, rua, bairro, numero_int, cep, cargo, email, senha, cnpj_orgao)
-            )
-        conn.commit()
+        numero_int = int(numero) if numero != "" else None
+        with db.conexao() as conn:
+            consultas.inserir_gestor(conn, cpf, rua, bairro, numero_int, cep, cargo,
+                                     email, autenticacao.gerar_hash(senha), cnpj_orgao)
+            conn.commit()
         console.print("\n[green]Gestor cadastrado com sucesso![/green]")
     except psycopg2.IntegrityError as e:
-        conn.rollback()
         console.print(f"\n[red]Erro de integridade:[/red] {e}")
     except Exception as e:
-        conn.rollback()
         console.print(f"\n[red]Erro ao cadastrar:[/red] {e}")
 
     console.input("\n[dim]Pressione Enter para continuar...[/dim]")
 
 # CONSULTAS CIDADAO
-def listar_viagens_por_cpf(conn, cpf=None):
+def listar_viagens_por_cpf(cpf=None):
     clear_screen()
     show_banner()
 
@@ -420,87 +483,65 @@ def listar_viagens_por_cpf(conn, cpf=None):
             console.input("\n[dim]Pressione Enter para continuar...[/dim]")
             return
 
-    show_loading("Buscando viagens")
-
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """SELECT v.DATAHORA_INICIO, v.DATAHORA_FINAL, v.CUSTO_TOTAL,
-                          v.NOME_CODIGO_LINHA_EMBARQUE, v.NRO_PARADA_EMBARQUE,
-                          v.NOME_CODIGO_LINHA_DESEMBARQUE, v.NRO_PARADA_DESEMBARQUE,
-                          o.PLACA, l.TARIFA
-                   FROM VIAGEM v
-                   JOIN ONIBUS o ON v.PLACA_ONIBUS = o.PLACA
-                   JOIN LINHA l ON v.NOME_CODIGO_LINHA_EMBARQUE = l.NOME_CODIGO
-                   WHERE v.CPF_CIDADAO = %s
-                   ORDER BY v.DATAHORA_INICIO DESC;""",
-                (cpf,)
-            )
-            rows = cur.fetchall()
-
-            if not rows:
-                console.print(f"\n[yellow]Nenhuma viagem encontrada para o CPF {cpf}[/yellow]")
-            else:
-                table = Table(title=f"Viagens do CPF {cpf}",
-                            title_style="bold cyan",
-                            box=box.ROUNDED,
-                            border_style="cyan")
-
-                table.add_column("Data/Hora Inicio", style="cyan")
-                table.add_column("Data/Hora Fim", style="cyan")
-                table.add_column("Embarque", style="green")
-                table.add_column("Desembarque", style="red")
-                table.add_column("Placa", style="yellow")
-                table.add_column("Custo", style="bold green", justify="right")
-
-                for row in rows:
-                    data_inicio, data_fim, custo, linha_emb, parada_emb, linha_des, parada_des, placa, tarifa = row
-                    table.add_row(
-                        str(data_inicio),
-                        str(data_fim),
-                        f"{linha_emb} (P{parada_emb})",
-                        f"{linha_des} (P{parada_des})",
-                        placa,
-                        f"R$ {float(custo):.2f}"
-                    )
-
-                console.print("\n")
-                console.print(table)
+        # Por keyset a primeira tela nao depende do tamanho do historico; o total fica
+        # desconhecido ate a navegacao chegar ao fim
+        fonte = paginador.FonteKeyset("SQL_VIAGENS_POR_CPF_PROXIMA", (cpf,), inicio="infinity")
+        if not fonte.janela(0, 1):
+            console.print(f"\n[yellow]Nenhuma viagem encontrada para o CPF {cpf}[/yellow]")
+            console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+            return
+        paginador.paginar(console, f"Viagens do CPF {cpf}", COLUNAS_VIAGENS, fonte,
+                          formatar_viagem)
     except Exception as e:
         console.print(f"\n[red]Erro ao consultar viagens:[/red] {e}")
+        console.input("\n[dim]Pressione Enter para continuar...[/dim]")
 
-    console.input("\n[dim]Pressione Enter para continuar...[/dim]")
-
-def total_gasto_por_cidadao(conn, cpf):
+COLUNAS_VIAGENS = [
+    ("Data/Hora Inicio", {"style": "cyan"}),
+    ("Data/Hora Fim", {"style": "cyan"}),
+    ("Embarque", {"style": "green"}),
+    ("Desembarque", {"style": "red"}),
+    ("Placa", {"style": "yellow"}),
+    ("Custo", {"style": "bold green", "justify": "right"}),
+]
+
+def formatar_viagem(row):
+    data_inicio, data_fim, custo, linha_emb, parada_emb, linha_des, parada_des, placa, tarifa = row
+    return [
+        str(data_inicio),
+        str(data_fim),
+        f"{linha_emb} (P{parada_emb})",
+        f"{linha_des} (P{parada_des})",
+        placa,
+        f"R$ {float(custo):.2f}",
+    ]
+
+def total_gasto_por_cidadao(cpf):
     clear_screen()
     show_banner()
 
     show_loading("Calculando total gasto")
 
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """SELECT COALESCE(SUM(CUSTO_TOTAL), 0), COUNT(*)
-                   FROM VIAGEM WHERE CPF_CIDADAO = %s""",
-                (cpf,)
-            )
-            total, quantidade = cur.fetchone()
-
-            panel = Panel(
-                f"[bold green]R$ {float(total):.2f}[/bold green]\n\n"
-                f"[dim]Total de viagens: {quantidade}[/dim]",
-                title=f"Total Gasto - CPF {cpf}",
-                border_style="green",
-                box=box.DOUBLE
-            )
-            console.print("\n")
-            console.print(panel, justify="center")
+        with db.conexao() as conn:
+            total, quantidade = consultas.buscar_total_gasto(conn, cpf)
+
+        panel = Panel(
+            f"[bold green]R$ {float(total):.2f}[/bold green]\n\n"
+            f"[dim]Total de viagens: {quantidade}[/dim]",
+            title=f"Total Gasto - CPF {cpf}",
+            border_style="green",
+            box=box.DOUBLE
+        )
+        console.print("\n")
+        console.print(panel, justify="center")
     except Exception as e:
         console.print(f"\n[red]Erro ao calcular total:[/red] {e}")
 
     console.input("\n[dim]Pressione Enter para continuar...[/dim]")
 
-def consultar_linhas_disponiveis(conn):
+def consultar_linhas_disponiveis():
     clear_screen()
     show_banner()
 
@@ -509,278 +550,574 @@ def consultar_linhas_disponiveis(conn):
     show_loading("Buscando linhas")
 
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """SELECT DISTINCT l.NOME_CODIGO, l.TARIFA, l.TEMPO_PERCURSO, e.NOME
-                   FROM LINHA l
-                   JOIN PONTO_PARADA p ON p.NOME_CODIGO_LINHA = l.NOME_CODIGO
-                   JOIN EMPRESA_PUBLICA e ON l.CNPJ_EMPRESA_PUBLICA = e.CNPJ
-                   WHERE p.BAIRRO ILIKE %s AND l.ATIVO = 'S'
-                   ORDER BY l.NOME_CODIGO;""",
-                (bairro,)
-            )
-            rows = cur.fetchall()
+        rows = referencia.linhas_por_bairro(bairro)
 
-            if not rows:
-                console.print(f"\n[yellow]Nenhuma linha encontrada para o bairro '{bairro}'[/yellow]")
-            else:
-                table = Table(title=f"Linhas Disponiveis - {bairro}",
-                            title_style="bold cyan",
-                            box=box.ROUNDED,
-                            border_style="cyan")
-
-                table.add_column("Linha", style="bold cyan")
-                table.add_column("Tarifa", style="green", justify="right")
-                table.add_column("Tempo", style="yellow", justify="center")
-                table.add_column("Empresa", style="blue")
-
-                for nome_codigo, tarifa, tempo, empresa in rows:
-                    table.add_row(
-                        nome_codigo,
-                        f"R$ {float(tarifa):.2f}",
-                        f"{tempo} min" if tempo else "N/A",
-                        empresa
-                    )
-
-                console.print("\n")
-                console.print(table)
+        if not rows:
+            console.print(f"\n[yellow]Nenhuma linha encontrada para o bairro '{bairro}'[/yellow]")
+        else:
+            table = Table(title=f"Linhas Disponiveis - {bairro}",
+                        title_style="bold cyan",
+                        box=box.ROUNDED,
+                        border_style="cyan")
+
+            table.add_column("Linha", style="bold cyan")
+            table.add_column("Tarifa", style="green", justify="right")
+            table.add_column("Tempo", style="yellow", justify="center")
+            table.add_column("Empresa", style="blue")
+
+            for nome_codigo, tarifa, tempo, empresa in rows:
+                table.add_row(
+                    nome_codigo,
+                    f"R$ {float(tarifa):.2f}",
+                    f"{tempo} min" if tempo else "N/A",
+                    empresa
+                )
+
+            console.print("\n")
+            console.print(table)
     except Exception as e:
         console.print(f"\n[red]Erro ao consultar linhas:[/red] {e}")
 
     console.input("\n[dim]Pressione Enter para continuar...[/dim]")
 
-def consultar_pontos_parada(conn):
+def consultar_pontos_parada():
     clear_screen()
     show_banner()
 
     bairro = Prompt.ask("[cyan]Informe o bairro[/cyan]")
     rua = Prompt.ask("[cyan]Informe a rua[/cyan]")
 
-    show_loading("Buscando pontos de parada")
-
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """SELECT NOME_CODIGO_LINHA, NRO_PARADA, RUA, BAIRRO, NUMERO, CEP,
-                          PRESENCA_COBERTURA, EH_ORIGEM, EH_DESTINO
-                   FROM PONTO_PARADA
-                   WHERE BAIRRO ILIKE %s AND RUA ILIKE %s
-                   ORDER BY NOME_CODIGO_LINHA, NRO_PARADA;""",
-                (bairro, rua)
-            )
-            rows = cur.fetchall()
-
-            if not rows:
-                console.print(f"\n[yellow]Nenhum ponto encontrado em {rua} - {bairro}[/yellow]")
-            else:
-                table = Table(title=f"Pontos de Parada - {rua}, {bairro}",
-                            title_style="bold cyan",
-                            box=box.ROUNDED,
-                            border_style="cyan")
-
-                table.add_column("Linha", style="cyan")
-                table.add_column("Parada", style="yellow", justify="center")
-                table.add_column("Endereco", style="white")
-                table.add_column("Cobertura", style="green", justify="center")
-                table.add_column("Origem", justify="center")
-                table.add_column("Destino", justify="center")
-
-                for linha, nro, rua_p, bairro_p, num, cep, cob, orig, dest in rows:
-                    table.add_row(
-                        linha,
-                        str(nro),
-                        f"{rua_p}, {num} - {bairro_p}",
-                        "SIM" if cob == 'S' else "NAO",
-                        "SIM" if orig == 'S' else "NAO",
-                        "SIM" if dest == 'S' else "NAO"
-                    )
-
-                console.print("\n")
-                console.print(table)
+        rows = referencia.pontos_parada(bairro, rua)
     except Exception as e:
         console.print(f"\n[red]Erro ao consultar pontos:[/red] {e}")
+        console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+        return
 
-    console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+    if not rows:
+        console.print(f"\n[yellow]Nenhum ponto encontrado em {rua} - {bairro}[/yellow]")
+        console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+        return
 
-# CONSULTAS GESTOR
-def listar_linhas_ativas(conn):
+    paginador.paginar(
+        console, f"Pontos de Parada - {rua}, {bairro}",
+        [("Linha", {"style": "cyan"}), ("Parada", {"style": "yellow", "justify": "center"}),
+         ("Endereco", {"style": "white"}), ("Cobertura", {"style": "green", "justify": "center"}),
+         ("Origem", {"justify": "center"}), ("Destino", {"justify": "center"})],
+        paginador.FonteLista(rows),
+        lambda row: [row[0], str(row[1]), f"{row[2]}, {row[4]} - {row[3]}",
+                     "SIM" if row[6] == 'S' else "NAO",
+                     "SIM" if row[7] == 'S' else "NAO",
+                     "SIM" if row[8] == 'S' else "NAO"])
+
+def planejar_trajeto():
     clear_screen()
     show_banner()
 
-    show_loading("Carregando linhas ativas")
+    origem = Prompt.ask("[cyan]Bairro de origem[/cyan]")
+    destino = Prompt.ask("[cyan]Bairro de destino[/cyan]")
+    criterio = Prompt.ask("[cyan]Priorizar[/cyan]", choices=list(rotas.CRITERIOS), default="tempo")
 
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """SELECT l.NOME_CODIGO, l.TARIFA, l.TEMPO_PERCURSO, e.NOME
-                   FROM LINHA l
-                   JOIN EMPRESA_PUBLICA e ON l.CNPJ_EMPRESA_PUBLICA = e.CNPJ
-                   WHERE l.ATIVO = 'S'
-                   ORDER BY l.NOME_CODIGO;"""
+        rota = rotas.planejar(origem, destino, criterio)
+    except Exception as e:
+        console.print(f"\n[red]Erro ao planejar trajeto:[/red] {e}")
+        console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+        return
+
+    if rota is None:
+        console.print(f"\n[yellow]Nenhuma linha ativa passa por '{origem}' ou '{destino}'[/yellow]")
+    elif rota.minutos is None:
+        console.print(f"\n[yellow]Nao ha trajeto de {origem} ate {destino}, "
+                      f"nem com baldeacoes[/yellow]")
+    elif not rota.trechos:
+        console.print(f"\n[yellow]{origem} e {destino} sao o mesmo bairro[/yellow]")
+    else:
+        table = Table(title=f"Trajeto {origem} -> {destino}",
+                    title_style="bold cyan",
+                    box=box.ROUNDED,
+                    border_style="cyan")
+
+        table.add_column("Linha", style="bold cyan")
+        table.add_column("Embarque", style="green")
+        table.add_column("Desembarque", style="red")
+        table.add_column("Paradas", style="yellow", justify="center")
+        table.add_column("Tempo", style="yellow", justify="right")
+        table.add_column("Tarifa", style="green", justify="right")
+
+        for trecho in rota.trechos:
+            table.add_row(
+                trecho.linha,
+                f"{trecho.embarque[2]} - {trecho.embarque[3]} (P{trecho.embarque[1]})",
+                f"{trecho.desembarque[2]} - {trecho.desembarque[3]} (P{trecho.desembarque[1]})",
+                str(trecho.paradas),
+                f"{trecho.minutos:.0f} min",
+                f"R$ {trecho.tarifa:.2f}"
             )
-            rows = cur.fetchall()
 
-            if not rows:
-                console.print("\n[yellow]Nenhuma linha ativa encontrada[/yellow]")
-            else:
-                table = Table(title="Linhas Ativas",
-                            title_style="bold yellow",
-                            box=box.DOUBLE,
-                            border_style="yellow")
-
-                table.add_column("Linha", style="bold yellow")
-                table.add_column("Tarifa", style="green", justify="right")
-                table.add_column("Tempo Percurso", style="cyan", justify="center")
-                table.add_column("Empresa", style="blue")
-
-                for nome, tarifa, tempo, empresa in rows:
-                    table.add_row(
-                        nome,
-                        f"R$ {float(tarifa):.2f}",
-                        f"{tempo} min" if tempo else "N/A",
-                        empresa
-                    )
-
-                console.print("\n")
-                console.print(table)
+        console.print("\n")
+        console.print(table)
+        console.print(f"\n[bold]Total:[/bold] [yellow]{rota.minutos:.0f} min[/yellow]    "
+                      f"[green]R$ {rota.tarifa:.2f}[/green]    "
+                      f"[cyan]{rota.baldeacoes} baldeacao(oes)[/cyan]")
+
+    console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+
+# CONSULTAS GESTOR
+def listar_linhas_ativas():
+    try:
+        rows = referencia.linhas_ativas()
     except Exception as e:
+        clear_screen()
+        show_banner()
         console.print(f"\n[red]Erro ao listar linhas:[/red] {e}")
+        console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+        return
 
-    console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+    if not rows:
+        clear_screen()
+        show_banner()
+        console.print("\n[yellow]Nenhuma linha ativa encontrada[/yellow]")
+        console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+        return
 
-def viagens_por_linha(conn):
+    paginador.paginar(
+        console, "Linhas Ativas",
+        [("Linha", {"style": "bold yellow"}), ("Tarifa", {"style": "green", "justify": "right"}),
+         ("Tempo Percurso", {"style": "cyan", "justify": "center"}), ("Empresa", {"style": "blue"})],
+        paginador.FonteLista(rows),
+        lambda row: [row[0], f"R$ {float(row[1]):.2f}", f"{row[2]} min" if row[2] else "N/A", row[3]],
+        estilo="yellow")
+
+def viagens_por_linha():
     clear_screen()
     show_banner()
 
     show_loading("Analisando viagens por linha")
 
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """SELECT v.NOME_CODIGO_LINHA_EMBARQUE, COUNT(*) as qtd
-                   FROM VIAGEM v
-                   GROUP BY v.NOME_CODIGO_LINHA_EMBARQUE
-                   ORDER BY qtd DESC;"""
-            )
-            rows = cur.fetchall()
+        with db.conexao() as conn:
+            rows = consultas.buscar_viagens_por_linha(conn)
 
-            if not rows:
-                console.print("\n[yellow]Nenhuma viagem registrada[/yellow]")
-            else:
-                table = Table(title="Viagens por Linha",
-                            title_style="bold yellow",
-                            box=box.ROUNDED,
-                            border_style="yellow")
+        if not rows:
+            console.print("\n[yellow]Nenhuma viagem registrada[/yellow]")
+        else:
+            table = Table(title="Viagens por Linha",
+                        title_style="bold yellow",
+                        box=box.ROUNDED,
+                        border_style="yellow")
 
-                table.add_column("Linha", style="cyan", justify="left")
-                table.add_column("Quantidade", style="bold green", justify="right")
-                table.add_column("Grafico", style="blue")
+            table.add_column("Linha", style="cyan", justify="left")
+            table.add_column("Quantidade", style="bold green", justify="right")
+            table.add_column("Grafico", style="blue")
 
-                max_qtd = max(qtd for _, qtd in rows)
+            max_qtd = max(qtd for _, qtd in rows)
 
-                for linha, qtd in rows:
-                    bar_length = int((qtd / max_qtd) * 30)
-                    bar = "#" * bar_length
-                    table.add_row(linha, str(qtd), bar)
+            for linha, qtd in rows:
+                bar_length = int((qtd / max_qtd) * 30)
+                bar = "#" * bar_length
+                table.add_row(linha, str(qtd), bar)
 
-                console.print("\n")
-                console.print(table)
+            console.print("\n")
+            console.print(table)
     except Exception as e:
         console.print(f"\n[red]Erro ao listar viagens:[/red] {e}")
 
     console.input("\n[dim]Pressione Enter para continuar...[/dim]")
 
-def rotas_mais_utilizadas(conn):
+def rotas_mais_utilizadas():
     clear_screen()
     show_banner()
 
     show_loading("Analisando rotas mais utilizadas")
 
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """SELECT pe.BAIRRO, pd.BAIRRO, COUNT(*) as qtd
-                   FROM VIAGEM v
-                   JOIN PONTO_PARADA pe ON v.NOME_CODIGO_LINHA_EMBARQUE = pe.NOME_CODIGO_LINHA
-                       AND v.NRO_PARADA_EMBARQUE = pe.NRO_PARADA
-                   JOIN PONTO_PARADA pd ON v.NOME_CODIGO_LINHA_DESEMBARQUE = pd.NOME_CODIGO_LINHA
-                       AND v.NRO_PARADA_DESEMBARQUE = pd.NRO_PARADA
-                   WHERE pe.BAIRRO IS NOT NULL AND pd.BAIRRO IS NOT NULL
-                   GROUP BY pe.BAIRRO, pd.BAIRRO
-                   ORDER BY qtd DESC
-                   LIMIT 10;"""
-            )
-            rows = cur.fetchall()
+        with db.conexao() as conn:
+            rows = consultas.buscar_rotas_mais_utilizadas(conn)
 
-            if not rows:
-                console.print("\n[yellow]Nenhuma rota registrada[/yellow]")
-            else:
-                table = Table(title="Top 10 Rotas Mais Utilizadas",
-                            title_style="bold yellow",
-                            box=box.DOUBLE,
-                            border_style="yellow")
-
-                table.add_column("#", style="dim", justify="center", width=4)
-                table.add_column("Origem", style="green")
-                table.add_column("->", style="yellow", justify="center", width=3)
-                table.add_column("Destino", style="red")
-                table.add_column("Viagens", style="bold cyan", justify="right")
-
-                for i, (origem, destino, qtd) in enumerate(rows, 1):
-                    table.add_row(str(i), origem, "->", destino, str(qtd))
-
-                console.print("\n")
-                console.print(table)
+        if not rows:
+            console.print("\n[yellow]Nenhuma rota registrada[/yellow]")
+        else:
+            table = Table(title="Top 10 Rotas Mais Utilizadas",
+                        title_style="bold yellow",
+                        box=box.DOUBLE,
+                        border_style="yellow")
+
+            table.add_column("#", style="dim", justify="center", width=4)
+            table.add_column("Origem", style="green")
+            table.add_column("->", style="yellow", justify="center", width=3)
+            table.add_column("Destino", style="red")
+            table.add_column("Viagens", style="bold cyan", justify="right")
+
+            for i, (origem, destino, qtd) in enumerate(rows, 1):
+                table.add_row(str(i), origem, "->", destino, str(qtd))
+
+            console.print("\n")
+            console.print(table)
     except Exception as e:
         console.print(f"\n[red]Erro ao listar rotas:[/red] {e}")
 
     console.input("\n[dim]Pressione Enter para continuar...[/dim]")
 
-def horarios_de_pico(conn):
+def horarios_de_pico():
     clear_screen()
     show_banner()
 
     show_loading("Analisando horarios de pico")
 
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """SELECT EXTRACT(HOUR FROM DATAHORA_INICIO) as hora, COUNT(*) as qtd
-                   FROM VIAGEM
-                   GROUP BY hora
-                   ORDER BY qtd DESC;"""
-            )
-            rows = cur.fetchall()
+        with db.conexao() as conn:
+            rows = consultas.buscar_horarios_de_pico(conn)
 
-            if not rows:
-                console.print("\n[yellow]Nenhuma viagem registrada[/yellow]")
-            else:
-                table = Table(title="Horarios de Pico",
-                            title_style="bold yellow",
-                            box=box.ROUNDED,
-                            border_style="yellow")
+        if not rows:
+            console.print("\n[yellow]Nenhuma viagem registrada[/yellow]")
+        else:
+            table = Table(title="Horarios de Pico",
+                        title_style="bold yellow",
+                        box=box.ROUNDED,
+                        border_style="yellow")
 
-                table.add_column("Horario", style="cyan", justify="center")
-                table.add_column("Viagens", style="bold green", justify="right")
-                table.add_column("Grafico", style="blue")
+            table.add_column("Horario", style="cyan", justify="center")
+            table.add_column("Viagens", style="bold green", justify="right")
+            table.add_column("Grafico", style="blue")
 
-                max_qtd = max(qtd for _, qtd in rows)
-                sorted_rows = sorted(rows, key=lambda x: x[0])
+            max_qtd = max(qtd for _, qtd in rows)
+            sorted_rows = sorted(rows, key=lambda x: x[0])
 
-                for hora, qtd in sorted_rows:
-                    bar_length = int((qtd / max_qtd) * 30)
-                    bar = "#" * bar_length
-                    table.add_row(f"{int(hora):02d}:00", str(qtd), bar)
+            for hora, qtd in sorted_rows:
+                bar_length = int((qtd / max_qtd) * 30)
+                bar = "#" * bar_length
+                table.add_row(f"{int(hora):02d}:00", str(qtd), bar)
 
-                console.print("\n")
-                console.print(table)
+            console.print("\n")
+            console.print(table)
     except Exception as e:
         console.print(f"\n[red]Erro ao listar horarios:[/red] {e}")
 
     console.input("\n[dim]Pressione Enter para continuar...[/dim]")
 
+def tabela_painel(colunas, linhas):
+    table = Table(box=box.SIMPLE, show_edge=False, pad_edge=False)
+    for titulo, opcoes in colunas:
+        table.add_column(titulo, **opcoes)
+    for linha in linhas:
+        table.add_row(*linha)
+    return table
+
+def barra(qtd, max_qtd, largura=20):
+    return "#" * int((qtd / max_qtd) * largura) if max_qtd else ""
+
+def painel_linhas_ativas(rows):
+    return tabela_painel(
+        [("Linha", {"style": "bold yellow"}), ("Tarifa", {"style": "green", "justify": "right"}),
+         ("Empresa", {"style": "blue"})],
+        [(nome, f"R$ {float(tarifa):.2f}", empresa) for nome, tarifa, _, empresa in rows])
+
+def painel_viagens_por_linha(rows):
+    max_qtd = max((qtd for _, qtd in rows), default=0)
+    return tabela_painel(
+        [("Linha", {"style": "cyan"}), ("Viagens", {"style": "bold green", "justify": "right"}),
+         ("", {"style": "blue"})],
+        [(linha, str(qtd), barra(qtd, max_qtd)) for linha, qtd in rows])
+
+def painel_rotas(rows):
+    return tabela_painel(
+        [("Origem", {"style": "green"}), ("Destino", {"style": "red"}),
+         ("Viagens", {"style": "bold cyan", "justify": "right"})],
+        [(origem, destino, str(qtd)) for origem, destino, qtd in rows])
+
+def painel_picos(rows):
+    max_qtd = max((qtd for _, qtd in rows), default=0)
+    return tabela_painel(
+        [("Hora", {"style": "cyan", "justify": "center"}),
+         ("Viagens", {"style": "bold green", "justify": "right"}), ("", {"style": "blue"})],
+        [(f"{int(hora):02d}:00", str(qtd), barra(qtd, max_qtd))
+         for hora, qtd in sorted(rows, key=lambda row: row[0])])
+
+def consultar_painel(funcao, *args):
+    # Cada quadro pega a propria conexao do pool, com o statement_timeout do painel
+    with db.conexao(timeout_ms=TIMEOUT_PAINEL_MS) as conn:
+        return funcao(conn, *args)
+
+# Quadros do painel: titulo, consulta (roda numa thread do executor) e desenho do resultado
+PAINEIS = [
+    ("Linhas Ativas", referencia.linhas_ativas, painel_linhas_ativas),
+    ("Viagens por Linha",
+     lambda: consultar_painel(consultas.buscar_viagens_por_linha), painel_viagens_por_linha),
+    ("Top 10 Rotas",
+     lambda: consultar_painel(consultas.buscar_rotas_mais_utilizadas, 10), painel_rotas),
+    ("Horarios de Pico",
+     lambda: consultar_painel(consultas.buscar_horarios_de_pico), painel_picos),
+]
+
+def montar_painel(estados):
+    quadros = []
+    for (titulo, _, desenhar), (estado, valor, segundos) in zip(PAINEIS, estados):
+        if estado == "ok":
+            corpo = desenhar(valor) if valor else Text("Sem dados", style="yellow")
+            rodape, cor = f"{segundos * 1000:.0f} ms", "yellow"
+        elif estado == "erro":
+            corpo, rodape, cor = Text(str(valor), style="red"), "erro", "red"
+        elif estado == "tempo":
+            corpo = Text(f"Sem resposta em {TIMEOUT_PAINEL_MS} ms", style="red")
+            rodape, cor = "tempo esgotado", "red"
+        else:
+            corpo, rodape, cor = Text("Carregando...", style="dim"), "", "dim"
+        quadros.append(Panel(corpo, title=f"[bold]{titulo}[/bold]", subtitle=rodape,
+                             border_style=cor, box=box.ROUNDED))
+
+    grade = Table.grid(expand=True, padding=(0, 1))
+    grade.add_column(ratio=1)
+    grade.add_column(ratio=1)
+    for i in range(0, len(quadros), 2):
+        grade.add_row(*quadros[i:i + 2])
+    return grade
+
+def painel_gestor():
+    clear_screen()
+    show_banner()
+
+    # Todas as consultas saem juntas; cada quadro aparece quando a sua termina e o total
+    # fica no tempo da mais lenta (limitado por TIMEOUT_PAINEL_MS), nao na soma
+    estados = [("carregando", None, None)] * len(PAINEIS)
+    inicio = time.perf_counter()
+    prazo = inicio + TIMEOUT_PAINEL_MS / 1000
+    executor = ThreadPoolExecutor(max_workers=len(PAINEIS), thread_name_prefix="painel")
+    futuros = {executor.submit(consulta): i for i, (_, consulta, _) in enumerate(PAINEIS)}
+
+    with Live(montar_painel(estados), console=console, auto_refresh=False) as live:
+        pendentes = set(futuros)
+        while pendentes:
+            restante = prazo - time.perf_counter()
+            if restante <= 0:
+                for futuro in pendentes:
+                    estados[futuros[futuro]] = ("tempo", None, None)
+                break
+            prontos, pendentes = wait(pendentes, timeout=restante, return_when=FIRST_COMPLETED)
+            for futuro in prontos:
+                segundos = time.perf_counter() - inicio
+                try:
+                    estados[futuros[futuro]] = ("ok", futuro.result(), segundos)
+                except Exception as e:
+                    estados[futuros[futuro]] = ("erro", e, segundos)
+            live.update(montar_painel(estados), refresh=True)
+        live.update(montar_painel(estados), refresh=True)
+
+    # Quem estourou o prazo termina sozinho pelo statement_timeout; nao espera por ele
+    executor.shutdown(wait=False, cancel_futures=True)
+    console.print(f"[dim]Painel montado em {(time.perf_counter() - inicio) * 1000:.0f} ms[/dim]")
+    console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+
+def cidadaos_todas_as_linhas():
+    clear_screen()
+    show_banner()
+
+    cnpj = Prompt.ask("[cyan]CNPJ da empresa publica[/cyan] (14 digitos)").strip()
+    if len(cnpj) != 14 or not cnpj.isdigit():
+        console.print("\n[red]Erro de validacao:[/red] CNPJ deve ter 14 digitos")
+        console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+        return
+
+    # Inicio de cada pagina ja vista, para voltar sem refazer a contagem de tras para frente
+    inicios = [""]
+    # Pagina que esta na tela: outras teclas so redesenham, sem voltar ao banco
+    carregada = None
+
+    while True:
+        if carregada != len(inicios):
+            try:
+                with db.conexao() as conn:
+                    resultado = consultas.buscar_cidadaos_todas_as_linhas(conn, cnpj, inicios[-1])
+            except Exception as e:
+                console.print(f"\n[red]Erro ao consultar cidadaos:[/red] {e}")
+                console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+                return
+            carregada = len(inicios)
+
+        if resultado is None:
+            console.print(f"\n[yellow]Nenhuma empresa com CNPJ {cnpj}[/yellow]")
+            console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+            return
+
+        empresa, rows, tem_proxima = resultado
+        if not rows and len(inicios) == 1:
+            console.print(f"\n[yellow]Nenhum cidadao usou todas as linhas de {empresa}[/yellow]")
+            console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+            return
+
+        clear_screen()
+        show_banner()
+
+        table = Table(title=f"Cidadaos que usaram todas as linhas de {empresa} - Pagina {len(inicios)}",
+                    title_style="bold yellow",
+                    box=box.ROUNDED,
+                    border_style="yellow")
+
+        table.add_column("CPF", style="cyan")
+        table.add_column("Email", style="white")
+
+        for cpf, email in rows:
+            table.add_row(cpf, email)
+
+        console.print(table)
+
+        navegacao = []
+        if len(inicios) > 1:
+            navegacao.append("<- pagina anterior")
+        if tem_proxima:
+            navegacao.append("-> proxima pagina")
+        navegacao.append("Enter para voltar")
+        console.print(f"\n[dim]{'    '.join(navegacao)}[/dim]")
+
+        key = readchar.readkey()
+        if key in (readchar.key.RIGHT, 'n') and tem_proxima:
+            inicios.append(rows[-1][0])
+        elif key in (readchar.key.LEFT, 'p') and len(inicios) > 1:
+            inicios.pop()
+        elif key in (readchar.key.ENTER, '\r', '\n', 'q'):
+            break
+
+def ocupacao_da_frota():
+    clear_screen()
+    show_banner()
+
+    limiar = Prompt.ask("[cyan]Fracao da capacidade considerada cheia[/cyan]",
+                        default=str(ocupacao.LIMIAR))
+    de = Prompt.ask("[cyan]Inicio (AAAA-MM-DD, vazio = desde o comeco)[/cyan]",
+                    default="", show_default=False)
+    ate = Prompt.ask("[cyan]Fim exclusivo (AAAA-MM-DD, vazio = ate hoje)[/cyan]",
+                     default="", show_default=False)
+
+    try:
+        limiar = float(limiar)
+        de = datetime.date.fromisoformat(de) if de else None
+        ate = datetime.date.fromisoformat(ate) if ate else None
+    except ValueError as e:
+        console.print(f"\n[red]Valor invalido:[/red] {e}")
+        console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+        return
+
+    try:
+        with console.status("[cyan]Percorrendo as viagens...[/cyan]"):
+            with db.conexao(timeout_ms=0) as conn:
+                relatorio = ocupacao.calcular(conn, de, ate, limiar)
+    except Exception as e:
+        console.print(f"\n[red]Erro ao calcular ocupacao:[/red] {e}")
+        console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+        return
+
+    if not relatorio.viagens:
+        console.print("\n[yellow]Nenhuma viagem encerrada no periodo[/yellow]")
+        console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+        return
+
+    table = Table(title=f"Onibus mais cheios (pico / capacidade, cheio = {limiar:.0%})",
+                title_style="bold yellow",
+                box=box.ROUNDED,
+                border_style="yellow")
+    table.add_column("Placa", style="yellow")
+    table.add_column("Linha", style="cyan")
+    table.add_column("Pico", style="bold green", justify="right")
+    table.add_column("Capacidade", justify="right")
+    table.add_column("Pico em", style="dim")
+    table.add_column("Horas cheio", style="red", justify="right")
+    table.add_column("Media a bordo", justify="right")
+    for o in relatorio.onibus[:10]:
+        table.add_row(o.placa, o.linha, str(o.pico), str(o.capacidade), str(o.pico_em),
+                      f"{o.segundos_acima / 3600:.1f}", f"{o.passageiros_medio:.2f}")
+
+    linhas = Table(title="Pico simultaneo por linha",
+                title_style="bold cyan",
+                box=box.ROUNDED,
+                border_style="cyan")
+    linhas.add_column("Linha", style="cyan")
+    linhas.add_column("Onibus", justify="right")
+    linhas.add_column("Pico", style="bold green", justify="right")
+    linhas.add_column("Capacidade", justify="right")
+    linhas.add_column("Pico em", style="dim")
+    for l in relatorio.linhas[:10]:
+        linhas.add_row(l.linha, str(l.onibus), str(l.pico), str(l.capacidade), str(l.pico_em))
+
+    curva = Table(title="Utilizacao da frota por hora",
+                title_style="bold green",
+                box=box.ROUNDED,
+                border_style="green")
+    curva.add_column("Hora", style="cyan", justify="center")
+    curva.add_column("Media a bordo", justify="right")
+    curva.add_column("Utilizacao", style="bold green", justify="right")
+    curva.add_column("Grafico", style="blue")
+    maxima = max((h.utilizacao for h in relatorio.horas), default=0)
+    for h in relatorio.horas:
+        curva.add_row(f"{h.hora:02d}:00", f"{h.passageiros_medio:.1f}", f"{h.utilizacao:.2%}",
+                      barra(h.utilizacao, maxima, 30))
+
+    console.print("\n")
+    console.print(table)
+    console.print(linhas)
+    console.print(curva)
+    console.print(f"[dim]{relatorio.viagens} viagens de {relatorio.inicio} a {relatorio.fim}, "
+                  f"calculado em {relatorio.segundos * 1000:.0f} ms[/dim]")
+    console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+
+def exportar_dados():
+    clear_screen()
+    show_banner()
+
+    nomes = list(exportacao.EXPORTACOES)
+    escolha = menu_select(
+        "Exportar dados",
+        nomes + ["Voltar"],
+        "[cyan]viagens[/cyan] exporta VIAGEM crua por periodo; as demais sao os relatorios"
+    )
+    if escolha == len(nomes):
+        return
+    nome = nomes[escolha]
+
+    clear_screen()
+    show_banner()
+    formato = Prompt.ask("[cyan]Formato[/cyan]", choices=list(exportacao.FORMATOS), default="csv")
+    compressoes = exportacao.COMPRESSOES_PARQUET if formato == "parquet" \
+        else tuple(exportacao.COMPRESSOES_TEXTO)
+    compressao = Prompt.ask("[cyan]Compressao[/cyan]", choices=["nenhuma", *compressoes],
+                            default="nenhuma")
+    compressao = None if compressao == "nenhuma" else compressao
+
+    parametros = {}
+    argumentos = exportacao.EXPORTACOES[nome][1]
+    try:
+        for arg, rotulo in (("de", "Inicio (AAAA-MM-DD, vazio = desde o comeco)"),
+                            ("ate", "Fim exclusivo (AAAA-MM-DD, vazio = ate hoje)")):
+            if arg in argumentos:
+                valor = Prompt.ask(f"[cyan]{rotulo}[/cyan]", default="", show_default=False)
+                parametros[arg] = datetime.date.fromisoformat(valor) if valor else None
+    except ValueError as e:
+        console.print(f"\n[red]Data invalida:[/red] {e}")
+        console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+        return
+    caminho = Prompt.ask("[cyan]Arquivo[/cyan]",
+                         default=exportacao.caminho_padrao(nome, formato, compressao))
+
+    # A exportacao roda numa thread; a tela so le os contadores a cada atualizacao
+    progresso = exportacao.Progresso()
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            futuro = executor.submit(exportacao.exportar, nome, caminho, formato,
+                                     parametros, compressao, progresso)
+            with Progress(SpinnerColumn(), TextColumn("[cyan]{task.description}"),
+                          console=console, transient=True) as barra:
+                tarefa = barra.add_task("Exportando")
+                while not wait([futuro], timeout=0.2).done:
+                    barra.update(tarefa, description=f"Exportando: {progresso.texto()}")
+            futuro.result()
+        console.print(f"\n[green]Exportado:[/green] {progresso.texto()} "
+                      f"em {progresso.segundos():.1f} s -> [bold]{caminho}[/bold]")
+    except Exception as e:
+        console.print(f"\n[red]Erro ao exportar:[/red] {e}")
+
+    console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+
 # LOGIN
-def entrar_como_cidadao(conn):
+def entrar_como_cidadao():
     clear_screen()
     show_banner()
 
@@ -793,30 +1130,23 @@ def entrar_como_cidadao(conn):
     email = Prompt.ask("[cyan]Email[/cyan]")
     senha = Prompt.ask("[cyan]Senha[/cyan]", password=True)
 
-    show_loading("Autenticando")
-
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT CPF FROM USUARIO_CIDADAO WHERE EMAIL = %s AND SENHA = %s",
-                (email, senha)
-            )
-            result = cur.fetchone()
+        token = autenticacao.entrar("cidadao", email, senha)
 
-        if not result:
+        if not token:
             console.print("\n[red]Email ou senha invalidos![/red]")
             console.input("\n[dim]Pressione Enter para continuar...[/dim]")
             return
 
-        cpf = result[0]
-        console.print(f"\n[green]Login bem-sucedido![/green] [dim](CPF: {cpf})[/dim]")
-        time.sleep(1)
-        menu_cidadao(conn, cpf)
+        try:
+            menu_cidadao(token)
+        finally:
+            autenticacao.sair(token)
     except Exception as e:
         console.print(f"\n[red]Erro ao fazer login:[/red] {e}")
         console.input("\n[dim]Pressione Enter para continuar...[/dim]")
 
-def entrar_como_gestor(conn):
+def entrar_como_gestor():
     clear_screen()
     show_banner()
 
@@ -829,36 +1159,43 @@ def entrar_como_gestor(conn):
     email = Prompt.ask("[yellow]Email[/yellow]")
     senha = Prompt.ask("[yellow]Senha[/yellow]", password=True)
 
-    show_loading("Autenticando")
-
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT 1 FROM USUARIO_GESTOR WHERE EMAIL = %s AND SENHA = %s",
-                (email, senha)
-            )
-            result = cur.fetchone()
+        token = autenticacao.entrar("gestor", email, senha)
 
-        if not result:
+        if not token:
             console.print("\n[red]Email ou senha invalidos![/red]")
             console.input("\n[dim]Pressione Enter para continuar...[/dim]")
             return
 
-        console.print(f"\n[green]Login bem-sucedido![/green] [dim](Email: {email})[/dim]")
-        time.sleep(1)
-        menu_gestor(conn, email)
+        try:
+            menu_gestor(token)
+        finally:
+            autenticacao.sair(token)
     except Exception as e:
         console.print(f"\n[red]Erro ao fazer login:[/red] {e}")
         console.input("\n[dim]Pressione Enter para continuar...[/dim]")
 
 # MENUS
-def menu_cidadao(conn, cpf):
+def sessao_ativa(token):
+    sessao = autenticacao.sessao(token)
+    if sessao is None:
+        console.print("\n[yellow]Sessao expirada, entre novamente.[/yellow]")
+        console.input("\n[dim]Pressione Enter para continuar...[/dim]")
+    return sessao
+
+def menu_cidadao(token):
     while True:
+        sessao = sessao_ativa(token)
+        if sessao is None:
+            break
+        cpf = sessao.cpf
+
         opcoes = [
             "Listar minhas viagens",
             "Ver total gasto",
             "Consultar linhas por bairro",
             "Consultar pontos de parada",
+            "Planejar trajeto entre bairros",
             "Voltar ao menu principal"
         ]
 
@@ -869,53 +1206,83 @@ def menu_cidadao(conn, cpf):
         )
 
         if escolha == 0:
-            listar_viagens_por_cpf(conn, cpf)
+            listar_viagens_por_cpf(cpf)
         elif escolha == 1:
-            total_gasto_por_cidadao(conn, cpf)
+            total_gasto_por_cidadao(cpf)
         elif escolha == 2:
-            consultar_linhas_disponiveis(conn)
+            consultar_linhas_disponiveis()
         elif escolha == 3:
-            consultar_pontos_parada(conn)
+            consultar_pontos_parada()
         elif escolha == 4:
+            planejar_trajeto()
+        elif escolha == 5:
             break
 
-def menu_gestor(conn, email):
+def menu_gestor(token):
     while True:
+        sessao = sessao_ativa(token)
+        if sessao is None:
+            break
+
         opcoes = [
+            "Painel",
             "Listar linhas ativas",
             "Viagens por linha",
             "Rotas mais utilizadas",
             "Horarios de pico",
+            "Cidadaos que usaram todas as linhas de uma empresa",
+            "Ocupacao da frota",
+            "Exportar dados",
             "Voltar ao menu principal"
         ]
 
         escolha = menu_select(
             "Menu do Gestor",
             opcoes,
-            f"[yellow]Logado como:[/yellow] {email}"
+            f"[yellow]Logado como:[/yellow] {sessao.email}"
         )
 
         if escolha == 0:
-            listar_linhas_ativas(conn)
+            painel_gestor()
         elif escolha == 1:
-            viagens_por_linha(conn)
+            listar_linhas_ativas()
         elif escolha == 2:
-            rotas_mais_utilizadas(conn)
+            viagens_por_linha()
         elif escolha == 3:
-            horarios_de_pico(conn)
+            rotas_mais_utilizadas()
         elif escolha == 4:
+            horarios_de_pico()
+        elif escolha == 5:
+            cidadaos_todas_as_linhas()
+        elif escolha == 6:
+            ocupacao_da_frota()
+        elif escolha == 7:
+            exportar_dados()
+        elif escolha == 8:
             break
 
 # MENU PRINCIPAL
 def main():
+    marcar_etapa("imports")
     show_banner()
-    time.sleep(1)
+    marcar_etapa("banner")
 
-    conn = get_connection()
-    if not conn:
+    if not conectar_banco():
         console.print("[red]Nao foi possivel conectar ao banco. Encerrando.[/red]")
         return
 
+    if not aplicar_migracoes():
+        console.print("[red]Banco em versao incompativel. Encerrando.[/red]")
+        db.fechar_pool()
+        return
+    marcar_etapa("migracoes")
+
+    try:
+        referencia.iniciar()
+    except Exception as e:
+        console.print(f"[yellow]Cache de referencia indisponivel, consultando o banco:[/yellow] {e}\n")
+    marcar_etapa("cache de referencia")
+
     while True:
         opcoes = [
             "Cadastrar novo cidadao",
@@ -923,6 +1290,7 @@ def main():
             "Entrar como cidadao",
             "Entrar como gestor",
             "Informacoes para DEBUG",
+            "Desempenho das consultas",
             "Sair"
         ]
 
@@ -933,16 +1301,18 @@ def main():
         )
 
         if escolha == 0:
-            cadastrar_cidadao(conn)
+            cadastrar_cidadao()
         elif escolha == 1:
-            cadastrar_gestor(conn)
+            cadastrar_gestor()
         elif escolha == 2:
-            entrar_como_cidadao(conn)
+            entrar_como_cidadao()
         elif escolha == 3:
-            entrar_como_gestor(conn)
+            entrar_como_gestor()
         elif escolha == 4:
-            mostrar_info_debug(conn)
+            mostrar_info_debug()
         elif escolha == 5:
+            mostrar_desempenho()
+        elif escolha == 6:
             clear_screen()
             show_banner()
             console.print("[yellow]Encerrando sistema...[/yellow]", justify="center")
@@ -950,7 +1320,8 @@ def main():
             console.print("[green]Ate logo![/green]", justify="center")
             break
 
-    conn.close()
+    referencia.parar()
+    db.fechar_pool()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,129 @@
+import base64
+import functools
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import consultas
+import db
+
+ALGORITMO = "pbkdf2_sha256"
+# Custo do hash; subir o valor so afeta senhas novas, as antigas sao refeitas no proximo login
+ITERACOES = int(os.getenv("AUTH_PBKDF2_ITERATIONS", "200000"))
+TAMANHO_SALT = 16
+SESSAO_TTL = float(os.getenv("AUTH_SESSION_TTL", "1800"))
+SESSOES_MAX = int(os.getenv("AUTH_SESSION_MAX", "10000"))
+
+Sessao = namedtuple("Sessao", ["tipo", "cpf", "email"])
+
+BUSCAR_CREDENCIAL = {
+    "cidadao": consultas.buscar_credencial_cidadao,
+    "gestor": consultas.buscar_credencial_gestor,
+}
+ATUALIZAR_SENHA = {
+    "cidadao": consultas.atualizar_senha_cidadao,
+    "gestor": consultas.atualizar_senha_gestor,
+}
+
+class CacheTTL:
+    # Dicionario com expiracao e despejo do item usado ha mais tempo (LRU)
+    def __init__(self, capacidade, ttl):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            valor, expira_em = item
+            if expira_em <= time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + self.ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def remover(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._itens)
+
+_sessoes = CacheTTL(SESSOES_MAX, SESSAO_TTL)
+
+def _b64(dados):
+    return base64.b64encode(dados).decode("ascii")
+
+def gerar_hash(senha, iteracoes=None, salt=None):
+    iteracoes = iteracoes or ITERACOES
+    salt = salt or os.urandom(TAMANHO_SALT)
+    digest = hashlib.pbkdf2_hmac("sha256", senha.encode("utf-8"), salt, iteracoes)
+    return f"{ALGORITMO}${iteracoes}${_b64(salt)}${_b64(digest)}"
+
+def verificar_senha(senha, armazenada):
+    # Devolve (confere, precisa_refazer); senhas antigas em texto puro tambem sao aceitas
+    partes = armazenada.split("$")
+    if len(partes) != 4 or partes[0] != ALGORITMO:
+        confere = hmac.compare_digest(senha.encode("utf-8"), armazenada.encode("utf-8"))
+        return confere, confere
+
+    try:
+        iteracoes = int(partes[1])
+        salt = base64.b64decode(partes[2], validate=True)
+        digest = hashlib.pbkdf2_hmac("sha256", senha.encode("utf-8"), salt, iteracoes)
+    except ValueError:
+        # Hash corrompido no banco (iteracoes ou salt invalidos): nenhuma senha confere
+        return False, False
+    confere = hmac.compare_digest(_b64(digest), partes[3])
+    return confere, confere and iteracoes != ITERACOES
+
+@functools.lru_cache(maxsize=None)
+def _hash_ficticio():
+    return gerar_hash("")
+
+def _nova_sessao(sessao):
+    token = secrets.token_urlsafe(32)
+    _sessoes.guardar(token, sessao)
+    return token
+
+def entrar(tipo, email, senha):
+    # Devolve um token de sessao, ou None se email/senha nao conferem. Nao ha cache de
+    # logins: todo login busca a credencial no banco e refaz o PBKDF2, entao uma senha
+    # trocada por fora deste processo vale ja no proximo login
+    with db.conexao() as conn:
+        credencial = BUSCAR_CREDENCIAL[tipo](conn, email)
+        if credencial is None:
+            # Mesmo custo de um email existente, para nao revelar quais emails estao cadastrados
+            verificar_senha(senha, _hash_ficticio())
+            return None
+
+        cpf, armazenada = credencial
+        confere, refazer = verificar_senha(senha, armazenada)
+        if not confere:
+            return None
+        if refazer:
+            ATUALIZAR_SENHA[tipo](conn, cpf, gerar_hash(senha))
+            conn.commit()
+
+    return _nova_sessao(Sessao(tipo, cpf, email))
+
+def sessao(token):
+    return _sessoes.obter(token)
+
+def sair(token):
+    _sessoes.remover(token)
@@ -0,0 +1,228 @@
+import argparse
+import datetime
+import json
+import math
+import platform
+import sys
+import time
+
+import consultas
+import db
+import gerador
+import preparadas
+
+# Nome, SQL e funcao que monta os parametros a partir do contexto da escala
+CONSULTAS = [
+    ("consulta1_linhas_acessiveis", consultas.SQL_CONSULTA_1_LINHAS_ACESSIVEIS,
+     lambda c: (c["bairro"],)),
+    ("consulta2_historico_periodo", consultas.SQL_CONSULTA_2_HISTORICO_PERIODO,
+     lambda c: (c["cpf"], c["inicio_mes"], c["fim_mes"])),
+    ("consulta3_linhas_do_cidadao", consultas.SQL_CONSULTA_3_LINHAS_DO_CIDADAO,
+     lambda c: (c["cpf"],)),
+    ("consulta4_rotas_entre_bairros", consultas.SQL_CONSULTA_4_ROTAS_ENTRE_BAIRROS,
+     lambda c: ()),
+    ("consulta5_todas_as_linhas", consultas.SQL_CONSULTA_5_TODAS_AS_LINHAS,
+     lambda c: (c["cnpj"],)),
+    # Mesma resposta da consulta5 (todas as paginas de uma vez) e a primeira pagina da tela
+    ("consulta5_contagem_agrupada", consultas.SQL_CIDADAOS_TODAS_AS_LINHAS,
+     lambda c: (c["cnpj"], "", c["linhas_empresa"], 2**31 - 1)),
+    ("tela_todas_as_linhas_pagina", consultas.SQL_CIDADAOS_TODAS_AS_LINHAS,
+     lambda c: (c["cnpj"], "", c["linhas_empresa"], consultas.TAMANHO_PAGINA_CIDADAOS + 1)),
+    ("tela_login_cidadao", consultas.SQL_CREDENCIAL_CIDADAO,
+     lambda c: (c["email"],)),
+    ("tela_viagens_por_cpf_pagina", consultas.SQL_VIAGENS_POR_CPF_PROXIMA,
+     lambda c: (c["cpf"], "infinity", consultas.TAMANHO_PAGINA_VIAGENS + 1, 0)),
+    ("tela_viagens_por_cpf_completo", consultas.SQL_VIAGENS_POR_CPF,
+     lambda c: (c["cpf"],)),
+    ("tela_total_gasto", consultas.SQL_TOTAL_GASTO,
+     lambda c: (c["cpf"],)),
+    ("tela_linhas_por_bairro", consultas.SQL_LINHAS_POR_BAIRRO,
+     lambda c: (c["bairro"],)),
+    ("tela_pontos_parada", consultas.SQL_PONTOS_PARADA,
+     lambda c: (c["bairro"], c["rua"])),
+    ("tela_linhas_ativas", consultas.SQL_LINHAS_ATIVAS,
+     lambda c: ()),
+    ("tela_viagens_por_linha", consultas.SQL_VIAGENS_POR_LINHA,
+     lambda c: ()),
+    ("tela_viagens_por_linha_direto", consultas.SQL_VIAGENS_POR_LINHA_DIRETO,
+     lambda c: ()),
+    ("tela_rotas_mais_utilizadas", consultas.SQL_ROTAS_MAIS_UTILIZADAS,
+     lambda c: (10,)),
+    ("tela_rotas_mais_utilizadas_direto", consultas.SQL_ROTAS_MAIS_UTILIZADAS_DIRETO,
+     lambda c: (10,)),
+    ("tela_horarios_de_pico", consultas.SQL_HORARIOS_DE_PICO,
+     lambda c: ()),
+    ("tela_horarios_de_pico_direto", consultas.SQL_HORARIOS_DE_PICO_DIRETO,
+     lambda c: ()),
+]
+
+# As consultas do registro de preparadas.py sao medidas de novo via EXECUTE, como
+# <nome>_preparada, para comparar com o texto enviado a cada chamada
+PREPARADAS = {getattr(consultas, constante): constante for constante in preparadas.CONSULTAS}
+
+def percentil(valores, p):
+    # Nearest-rank: sempre devolve uma amostra real
+    ordenados = sorted(valores)
+    indice = max(0, math.ceil(p / 100 * len(ordenados)) - 1)
+    return ordenados[indice]
+
+def montar_contexto(cur):
+    # Usa o primeiro cidadao gerado (se houver carga sintetica) e o ultimo mes com viagens
+    cur.execute(
+        """SELECT CPF, EMAIL FROM USUARIO_CIDADAO
+           WHERE CPF IN (%s, '11111111111') ORDER BY CPF DESC LIMIT 1""",
+        (gerador.PREFIXO_CPF_CIDADAO + "0" * 9,)
+    )
+    cpf, email = cur.fetchone()
+    cur.execute("SELECT max(DATAHORA_INICIO) FROM VIAGEM")
+    ultima = cur.fetchone()[0] or datetime.datetime.now()
+    fim_mes = datetime.date(ultima.year, ultima.month, 1)
+    inicio_mes = (fim_mes - datetime.timedelta(days=1)).replace(day=1)
+    cur.execute(
+        """SELECT CNPJ_EMPRESA_PUBLICA, COUNT(*) FROM LINHA
+           GROUP BY CNPJ_EMPRESA_PUBLICA ORDER BY COUNT(*) DESC, CNPJ_EMPRESA_PUBLICA LIMIT 1"""
+    )
+    cnpj, linhas_empresa = cur.fetchone()
+    cur.execute("SELECT COUNT(*) FROM VIAGEM")
+    total_viagens = cur.fetchone()[0]
+    return {
+        "cpf": cpf, "email": email, "cnpj": cnpj, "linhas_empresa": linhas_empresa,
+        "bairro": "Centro", "rua": "Rua XV de Novembro",
+        "inicio_mes": inicio_mes, "fim_mes": fim_mes,
+        "viagens": total_viagens,
+    }
+
+def medir(cur, sql, params, aquecimento, repeticoes):
+    for _ in range(aquecimento):
+        cur.execute(sql, params)
+        cur.fetchall()
+
+    tempos = []
+    linhas = 0
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        cur.execute(sql, params)
+        linhas = len(cur.fetchall())
+        tempos.append((time.perf_counter() - inicio) * 1000)
+
+    cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+    explain = cur.fetchone()[0][0]
+    plano = explain["Plan"]
+
+    return {
+        "linhas": linhas,
+        "repeticoes": repeticoes,
+        "p50_ms": round(percentil(tempos, 50), 3),
+        "p95_ms": round(percentil(tempos, 95), 3),
+        "p99_ms": round(percentil(tempos, 99), 3),
+        "min_ms": round(min(tempos), 3),
+        "max_ms": round(max(tempos), 3),
+        "planejamento_ms": explain.get("Planning Time"),
+        "execucao_ms": explain.get("Execution Time"),
+        "buffers_hit": plano.get("Shared Hit Blocks", 0),
+        "buffers_read": plano.get("Shared Read Blocks", 0),
+        "no_raiz": plano["Node Type"],
+    }
+
+def rodar_escala(conn, aquecimento, repeticoes, filtro=None, progresso=None):
+    resultados = {}
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL statement_timeout = 0")
+        contexto = montar_contexto(cur)
+        for nome, sql, parametros in CONSULTAS:
+            if filtro and not any(f in nome for f in filtro):
+                continue
+            resultados[nome] = medir(cur, sql, parametros(contexto), aquecimento, repeticoes)
+            if progresso:
+                progresso(nome, resultados[nome])
+
+            constante = PREPARADAS.get(sql)
+            if constante is None or not preparadas.ATIVO:
+                continue
+            # Primeira execucao faz o PREPARE nesta conexao; as medidas so veem o EXECUTE
+            preparadas.executar(cur, constante, parametros(contexto))
+            nome = f"{nome}_preparada"
+            resultados[nome] = medir(cur, preparadas.registro()[constante].execute,
+                                     parametros(contexto), aquecimento, repeticoes)
+            if progresso:
+                progresso(nome, resultados[nome])
+    conn.rollback()
+    return contexto["viagens"], resultados
+
+def comparar(atual, base, tolerancia):
+    regressoes = []
+    for escala, dados in atual["escalas"].items():
+        anteriores = base.get("escalas", {}).get(escala, {}).get("consultas", {})
+        for nome, medida in dados["consultas"].items():
+            if nome not in anteriores:
+                continue
+            antes, depois = anteriores[nome]["p95_ms"], medida["p95_ms"]
+            variacao = (depois - antes) / antes if antes else 0.0
+            regressoes.append((escala, nome, antes, depois, variacao, variacao > tolerancia))
+    return regressoes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das consultas em varias escalas de dados")
+    parser.add_argument("--escalas", default="0.1,1",
+                        help="fatores de escala separados por virgula (ver gerador.py)")
+    parser.add_argument("--sem-carga", action="store_true",
+                        help="mede a base atual sem gerar dados")
+    parser.add_argument("--aquecimento", type=int, default=2)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--consulta", action="append",
+                        help="roda so as consultas cujo nome contem este texto (pode repetir)")
+    parser.add_argument("--saida", default="benchmark.json")
+    parser.add_argument("--comparar", help="relatorio anterior para detectar regressoes de p95")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="aumento de p95 aceito antes de acusar regressao (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    escalas = ["atual"] if args.sem_carga else args.escalas.split(",")
+    relatorio = {
+        "gerado_em": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "aquecimento": args.aquecimento,
+        "repeticoes": args.repeticoes,
+        "escalas": {},
+    }
+
+    def progresso(nome, medida):
+        print(f"  {nome:38s} p50 {medida['p50_ms']:9.2f} ms  p95 {medida['p95_ms']:9.2f} ms  "
+              f"p99 {medida['p99_ms']:9.2f} ms  {medida['linhas']:>8} linhas", file=sys.stderr)
+
+    try:
+        for escala in escalas:
+            with db.conexao() as conn:
+                if escala != "atual":
+                    print(f"carregando escala {escala}...", file=sys.stderr)
+                    gerador.carregar(conn, float(escala), limpar_antes=True)
+                with conn.cursor() as cur:
+                    cur.execute("SELECT version()")
+                    relatorio["postgres"] = cur.fetchone()[0]
+                conn.rollback()
+
+                print(f"escala {escala}:", file=sys.stderr)
+                viagens, resultados = rodar_escala(conn, args.aquecimento, args.repeticoes,
+                                                   args.consulta, progresso)
+            relatorio["escalas"][escala] = {"viagens": viagens, "consultas": resultados}
+    finally:
+        db.fechar_pool()
+
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2, default=str)
+    print(f"relatorio salvo em {args.saida}", file=sys.stderr)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        falhou = False
+        for escala, nome, antes, depois, variacao, regressao in comparar(relatorio, base, args.tolerancia):
+            marca = "REGRESSAO" if regressao else "ok"
+            print(f"{marca:9s} [{escala}] {nome}: p95 {antes:.2f} -> {depois:.2f} ms ({variacao:+.0%})")
+            falhou = falhou or regressao
+        return 1 if falhou else 0
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import collections
+import json
+import math
+import sys
+import time
+import urllib.parse
+
+# Mistura padrao com os dados de dados_completos.sql
+CAMINHOS = [
+    "/cidadaos/11111111111/viagens",
+    "/cidadaos/11111111111/gasto",
+    "/linhas?bairro=Centro",
+    "/linhas/ativas",
+    "/pontos?bairro=Centro&rua=Rua%20XV%20de%20Novembro",
+    "/relatorios/viagens-linha",
+    "/relatorios/rotas?limite=10",
+    "/relatorios/picos",
+]
+
+def percentil(valores, p):
+    # Nearest-rank, como no benchmark.py; aqui sem importar o driver do banco
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+async def ler_resposta(reader):
+    cabecalho = await reader.readuntil(b"\r\n\r\n")
+    linhas = cabecalho.decode("latin-1").split("\r\n")
+    status = int(linhas[0].split(" ", 2)[1])
+    tamanho = 0
+    for linha in linhas[1:]:
+        if linha.lower().startswith("content-length:"):
+            tamanho = int(linha.split(":", 1)[1])
+    await reader.readexactly(tamanho)
+    return status
+
+async def cliente(host, porta, caminhos, deslocamento, fim, latencias, status):
+    # Cada cliente usa uma conexao keep-alive e faz uma requisicao por vez
+    reader, writer = await asyncio.open_connection(host, porta)
+    i = deslocamento
+    try:
+        while time.monotonic() < fim:
+            caminho = caminhos[i % len(caminhos)]
+            i += 1
+            inicio = time.perf_counter()
+            writer.write(f"GET {caminho} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1"))
+            await writer.drain()
+            codigo = await ler_resposta(reader)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            status[codigo] += 1
+    finally:
+        writer.close()
+
+async def rodar(host, porta, caminhos, concorrencia, duracao):
+    latencias = []
+    status = collections.Counter()
+    inicio = time.monotonic()
+    fim = inicio + duracao
+    await asyncio.gather(*(cliente(host, porta, caminhos, i, fim, latencias, status)
+                           for i in range(concorrencia)))
+    decorrido = time.monotonic() - inicio
+    return {
+        "concorrencia": concorrencia,
+        "requisicoes": len(latencias),
+        "requisicoes_por_segundo": round(len(latencias) / decorrido, 1),
+        "p50_ms": round(percentil(latencias, 50), 3),
+        "p95_ms": round(percentil(latencias, 95), 3),
+        "p99_ms": round(percentil(latencias, 99), 3),
+        "max_ms": round(max(latencias), 3),
+        "status": {str(codigo): qtd for codigo, qtd in sorted(status.items())},
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga da API (api.py)")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--concorrencia", default="1,10,50",
+                        help="clientes simultaneos, separados por virgula")
+    parser.add_argument("--duracao", type=float, default=10.0, help="segundos por nivel")
+    parser.add_argument("--caminho", action="append",
+                        help="caminho a requisitar (pode repetir; padrao: mistura das rotas)")
+    args = parser.parse_args(argv)
+
+    url = urllib.parse.urlsplit(args.url)
+    caminhos = args.caminho or CAMINHOS
+    resultados = []
+    for nivel in args.concorrencia.split(","):
+        resultado = asyncio.run(rodar(url.hostname, url.port or 80, caminhos,
+                                      int(nivel), args.duracao))
+        print(json.dumps(resultado), file=sys.stderr)
+        resultados.append(resultado)
+
+    print(json.dumps(resultados, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
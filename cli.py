@@ -0,0 +1,158 @@
+import argparse
+import csv
+import datetime
+import decimal
+import json
+import sys
+import time
+
+import consultas
+import db
+from validacao import validar_cpf
+
+# Cada comando: funcao de consulta, argumentos que ela recebe e nomes das colunas
+CONSULTAS = {
+    "viagens": (
+        consultas.iterar_viagens_por_cpf, ["cpf"],
+        ["datahora_inicio", "datahora_final", "custo_total",
+         "linha_embarque", "parada_embarque", "linha_desembarque", "parada_desembarque",
+         "placa", "tarifa"],
+    ),
+    "gasto": (
+        consultas.buscar_total_gasto, ["cpf"],
+        ["total_gasto", "quantidade_viagens"],
+    ),
+    "linhas": (
+        consultas.buscar_linhas_por_bairro, ["bairro"],
+        ["linha", "tarifa", "tempo_percurso", "empresa"],
+    ),
+    "pontos": (
+        consultas.buscar_pontos_parada, ["bairro", "rua"],
+        ["linha", "nro_parada", "rua", "bairro", "numero", "cep",
+         "presenca_cobertura", "eh_origem", "eh_destino"],
+    ),
+}
+
+RELATORIOS = {
+    "linhas-ativas": (
+        consultas.buscar_linhas_ativas, [],
+        ["linha", "tarifa", "tempo_percurso", "empresa"],
+    ),
+    "viagens-linha": (
+        consultas.buscar_viagens_por_linha, [],
+        ["linha", "quantidade"],
+    ),
+    "rotas": (
+        consultas.buscar_rotas_mais_utilizadas, ["limite"],
+        ["bairro_origem", "bairro_destino", "quantidade"],
+    ),
+    "picos": (
+        consultas.buscar_horarios_de_pico, [],
+        ["hora", "quantidade"],
+    ),
+}
+
+def converter_valor(valor):
+    if isinstance(valor, decimal.Decimal):
+        # EXTRACT(HOUR ...) volta como numeric sem casas decimais
+        if valor.as_tuple().exponent >= 0:
+            return int(valor)
+        return float(valor)
+    if isinstance(valor, (datetime.datetime, datetime.date)):
+        return valor.isoformat()
+    return valor
+
+def para_registros(colunas, rows):
+    for row in rows:
+        yield dict(zip(colunas, (converter_valor(v) for v in row)))
+
+def escrever_saida(registros, colunas, formato, saida=sys.stdout):
+    # Escreve registro a registro para que consultas em streaming nao acumulem em memoria
+    total = 0
+    if formato == "json":
+        saida.write("[")
+        for registro in registros:
+            if total:
+                saida.write(", ")
+            json.dump(registro, saida, ensure_ascii=False)
+            total += 1
+        saida.write("]\n")
+    elif formato == "jsonl":
+        for registro in registros:
+            saida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            total += 1
+    elif formato == "csv":
+        writer = csv.DictWriter(saida, fieldnames=colunas)
+        writer.writeheader()
+        for registro in registros:
+            writer.writerow(registro)
+            total += 1
+    return total
+
+def executar(nome, funcao, argumentos, colunas, args):
+    valores = [getattr(args, arg) for arg in argumentos]
+
+    inicio = time.perf_counter()
+    with db.conexao() as conn:
+        resultado = funcao(conn, *valores)
+        rows = [resultado] if isinstance(resultado, tuple) else resultado
+        total = escrever_saida(para_registros(colunas, rows), colunas, args.format)
+    latencia_ms = (time.perf_counter() - inicio) * 1000
+
+    if args.tempo:
+        metrica = {"consulta": nome, "linhas": total, "latencia_ms": round(latencia_ms, 3)}
+        print(json.dumps(metrica), file=sys.stderr)
+
+def criar_parser():
+    parser = argparse.ArgumentParser(
+        prog="app.py",
+        description="Modo nao interativo do Sistema de Onibus (saida legivel por maquina)",
+    )
+    comum = argparse.ArgumentParser(add_help=False)
+    comum.add_argument("--format", choices=["json", "jsonl", "csv"], default="json")
+    comum.add_argument("--tempo", action="store_true",
+                       help="imprime a latencia da consulta em JSON no stderr")
+
+    sub = parser.add_subparsers(dest="grupo", required=True)
+
+    query = sub.add_parser("query", help="consultas do cidadao")
+    query_sub = query.add_subparsers(dest="nome", required=True)
+    for nome, (_, argumentos, _) in CONSULTAS.items():
+        p = query_sub.add_parser(nome, parents=[comum])
+        for arg in argumentos:
+            p.add_argument(f"--{arg}", required=True)
+
+    report = sub.add_parser("report", help="relatorios do gestor")
+    report_sub = report.add_subparsers(dest="nome", required=True)
+    for nome, (_, argumentos, _) in RELATORIOS.items():
+        p = report_sub.add_parser(nome, parents=[comum])
+        if "limite" in argumentos:
+            p.add_argument("--limite", type=int, default=10)
+
+    return parser
+
+def main(argv=None):
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+
+    cpf = getattr(args, "cpf", None)
+    if cpf is not None:
+        cpf_valido, mensagem = validar_cpf(cpf)
+        if not cpf_valido:
+            parser.error(mensagem)
+
+    tabela = CONSULTAS if args.grupo == "query" else RELATORIOS
+    funcao, argumentos, colunas = tabela[args.nome]
+
+    try:
+        executar(args.nome, funcao, argumentos, colunas, args)
+    except Exception as e:
+        print(json.dumps({"erro": str(e)}, ensure_ascii=False), file=sys.stderr)
+        return 1
+    finally:
+        db.fechar_pool()
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
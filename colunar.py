@@ -0,0 +1,324 @@
+import argparse
+import datetime
+import decimal
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+import consultas
+import db
+
+DIRETORIO = os.getenv("VIAGEM_COLUNAR_DIR", "viagem_colunar")
+# Bytes do COPY juntados antes de converter e gravar (a memoria da exportacao fica nisso)
+BLOCO_COPY = int(os.getenv("VIAGEM_COLUNAR_BLOCO", str(16 * 2**20)))
+VERSAO = 1
+# Marca de nulo das colunas int64 (DATAHORA_FINAL e CUSTO_TOTAL aceitam NULL)
+NULO = np.iinfo(np.int64).min
+ASSINATURA_COPY = b"PGCOPY\n\xff\r\n\x00"
+
+# Ordem das colunas no COPY e no disco; timestamps em segundos desde 1970 (hora local do
+# banco, como o TIMESTAMP sem fuso), custo em centavos, codigos como indices do dicionario
+COLUNAS = [
+    ("inicio", "i8"),
+    ("fim", "i8"),
+    ("custo_centavos", "i8"),
+    ("cpf", "i8"),
+    ("linha_embarque", "i4"),
+    ("parada_embarque", "i4"),
+    ("linha_desembarque", "i4"),
+    ("parada_desembarque", "i4"),
+    ("onibus", "i4"),
+]
+
+SQL_DICIONARIO_LINHAS = "SELECT NOME_CODIGO FROM LINHA ORDER BY NOME_CODIGO"
+SQL_DICIONARIO_ONIBUS = "SELECT PLACA FROM ONIBUS ORDER BY PLACA"
+
+# Sem NULL na saida (COALESCE com a marca), entao toda linha do COPY binario tem o mesmo
+# tamanho e um bloco inteiro vira um array estruturado com um np.frombuffer
+SQL_EXPORTAR = """
+    WITH linhas AS (
+        SELECT codigo, (i - 1)::INT AS id FROM unnest(%(linhas)s::TEXT[]) WITH ORDINALITY AS t(codigo, i)
+    ), onibus AS (
+        SELECT placa, (i - 1)::INT AS id FROM unnest(%(onibus)s::TEXT[]) WITH ORDINALITY AS t(placa, i)
+    )
+    SELECT FLOOR(EXTRACT(EPOCH FROM v.DATAHORA_INICIO))::BIGINT,
+           COALESCE(FLOOR(EXTRACT(EPOCH FROM v.DATAHORA_FINAL))::BIGINT, %(nulo)s),
+           COALESCE(ROUND(v.CUSTO_TOTAL * 100)::BIGINT, %(nulo)s),
+           v.CPF_CIDADAO::BIGINT,
+           le.id, v.NRO_PARADA_EMBARQUE,
+           ld.id, v.NRO_PARADA_DESEMBARQUE,
+           o.id
+    FROM VIAGEM v
+    JOIN linhas le ON le.codigo = v.NOME_CODIGO_LINHA_EMBARQUE
+    JOIN linhas ld ON ld.codigo = v.NOME_CODIGO_LINHA_DESEMBARQUE
+    JOIN onibus o ON o.placa = v.PLACA_ONIBUS
+    WHERE v.DATAHORA_INICIO >= %(de)s AND v.DATAHORA_INICIO < %(ate)s
+"""
+
+class SnapshotInvalido(Exception):
+    pass
+
+def _tipo_copy():
+    # Cada campo do COPY binario: tamanho (int32) e valor, big-endian; a linha comeca com
+    # o numero de campos (int16)
+    campos = [("campos", ">i2")]
+    for nome, tipo in COLUNAS:
+        campos += [(f"_{nome}", ">i4"), (nome, ">" + tipo)]
+    return np.dtype(campos)
+
+TIPO_COPY = _tipo_copy()
+
+def _epoch(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, datetime.date) and not isinstance(valor, datetime.datetime):
+        valor = datetime.datetime(valor.year, valor.month, valor.day)
+    return int((valor - datetime.datetime(1970, 1, 1)).total_seconds())
+
+class _Conversor:
+    # Destino do copy_expert: junta os bytes e, a cada BLOCO_COPY, converte as linhas
+    # completas e acrescenta cada coluna no seu arquivo
+    def __init__(self, arquivos):
+        self.arquivos = arquivos
+        self.buffer = bytearray()
+        self.cabecalho = False
+        self.linhas = 0
+
+    def write(self, dados):
+        self.buffer += dados
+        if len(self.buffer) >= BLOCO_COPY:
+            self.converter()
+
+    def converter(self):
+        if not self.cabecalho:
+            if len(self.buffer) < 19:
+                return
+            if bytes(self.buffer[:11]) != ASSINATURA_COPY:
+                raise SnapshotInvalido("saida do COPY nao esta no formato binario")
+            extensao = int.from_bytes(self.buffer[15:19], "big")
+            del self.buffer[:19 + extensao]
+            self.cabecalho = True
+
+        quantidade = len(self.buffer) // TIPO_COPY.itemsize
+        if not quantidade:
+            return
+        bloco = np.frombuffer(self.buffer, dtype=TIPO_COPY, count=quantidade)
+        if (bloco["campos"] != len(COLUNAS)).any():
+            raise SnapshotInvalido("linha do COPY com numero de campos inesperado")
+        for nome, tipo in COLUNAS:
+            bloco[nome].astype("<" + tipo).tofile(self.arquivos[nome])
+        self.linhas += quantidade
+        del bloco
+        del self.buffer[:quantidade * TIPO_COPY.itemsize]
+
+    def terminar(self):
+        self.converter()
+        if bytes(self.buffer) != b"\xff\xff":
+            raise SnapshotInvalido("COPY binario terminou sem o trailer")
+
+def exportar(diretorio=DIRETORIO, de=None, ate=None):
+    # Grava num diretorio temporario e troca no fim: quem esta lendo o snapshot antigo
+    # (memmap aberto) continua com os arquivos dele
+    temporario = f"{diretorio}.tmp"
+    shutil.rmtree(temporario, ignore_errors=True)
+    os.makedirs(temporario)
+
+    inicio = time.perf_counter()
+    with db.conexao(timeout_ms=0) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            cur.execute(SQL_DICIONARIO_LINHAS)
+            linhas = [row[0] for row in cur.fetchall()]
+            cur.execute(SQL_DICIONARIO_ONIBUS)
+            onibus = [row[0] for row in cur.fetchall()]
+            sql = cur.mogrify(SQL_EXPORTAR, {
+                "linhas": linhas, "onibus": onibus, "nulo": int(NULO),
+                "de": de or "-infinity", "ate": ate or "infinity",
+            }).decode()
+
+            arquivos = {nome: open(os.path.join(temporario, f"{nome}.bin"), "wb")
+                        for nome, _ in COLUNAS}
+            try:
+                conversor = _Conversor(arquivos)
+                cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT binary)", conversor)
+                conversor.terminar()
+            finally:
+                for arquivo in arquivos.values():
+                    arquivo.close()
+        conn.rollback()
+
+    meta = {
+        "versao": VERSAO,
+        "linhas": conversor.linhas,
+        "colunas": {nome: "<" + tipo for nome, tipo in COLUNAS},
+        "nulo": int(NULO),
+        "dicionarios": {"linha": linhas, "onibus": onibus},
+        "de": de.isoformat() if de else None,
+        "ate": ate.isoformat() if ate else None,
+        "gerado_em": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(os.path.join(temporario, "meta.json"), "w", encoding="utf-8") as arquivo:
+        json.dump(meta, arquivo, ensure_ascii=False, indent=2)
+
+    antigo = f"{diretorio}.antigo"
+    shutil.rmtree(antigo, ignore_errors=True)
+    if os.path.exists(diretorio):
+        os.rename(diretorio, antigo)
+    os.rename(temporario, diretorio)
+    shutil.rmtree(antigo, ignore_errors=True)
+    return conversor.linhas, time.perf_counter() - inicio
+
+class Colunas:
+    # Snapshot aberto: cada coluna e um np.memmap somente leitura; o SO carrega as paginas
+    # sob demanda e as mantem no cache entre execucoes
+    def __init__(self, diretorio=DIRETORIO):
+        caminho_meta = os.path.join(diretorio, "meta.json")
+        if not os.path.exists(caminho_meta):
+            raise SnapshotInvalido(f"snapshot colunar nao encontrado em {diretorio} "
+                                   f"(rode: python3 colunar.py exportar)")
+        with open(caminho_meta, encoding="utf-8") as arquivo:
+            self.meta = json.load(arquivo)
+        if self.meta["versao"] != VERSAO:
+            raise SnapshotInvalido(f"snapshot versao {self.meta['versao']}, esperada {VERSAO}")
+
+        self.linhas = self.meta["linhas"]
+        self.dicionario_linha = self.meta["dicionarios"]["linha"]
+        self.dicionario_onibus = self.meta["dicionarios"]["onibus"]
+        for nome, tipo in self.meta["colunas"].items():
+            if self.linhas:
+                coluna = np.memmap(os.path.join(diretorio, f"{nome}.bin"), dtype=tipo,
+                                   mode="r", shape=(self.linhas,))
+            else:
+                coluna = np.empty(0, dtype=tipo)
+            setattr(self, nome, coluna)
+
+    def periodo(self, inicio=None, fim=None):
+        # Mascara de DATAHORA_INICIO em [inicio, fim); None se nao ha filtro
+        mascara = None
+        if inicio is not None:
+            mascara = self.inicio >= _epoch(inicio)
+        if fim is not None:
+            ate = self.inicio < _epoch(fim)
+            mascara = ate if mascara is None else mascara & ate
+        return mascara
+
+def horarios_de_pico(colunas, inicio=None, fim=None):
+    # Mesmo resultado de SQL_HORARIOS_DE_PICO_DIRETO / _PERIODO: (hora, qtd), mais viagens primeiro
+    horas = colunas.inicio // 3600 % 24
+    mascara = colunas.periodo(inicio, fim)
+    if mascara is not None:
+        horas = horas[mascara]
+    contagem = np.bincount(horas, minlength=24)
+    return sorted(((hora, int(qtd)) for hora, qtd in enumerate(contagem) if qtd),
+                  key=lambda row: (-row[1], row[0]))
+
+def viagens_por_linha(colunas):
+    # Mesmo resultado de SQL_VIAGENS_POR_LINHA_DIRETO
+    contagem = np.bincount(colunas.linha_embarque, minlength=len(colunas.dicionario_linha))
+    return sorted(((colunas.dicionario_linha[i], int(qtd)) for i, qtd in enumerate(contagem) if qtd),
+                  key=lambda row: (-row[1], row[0]))
+
+def historico_periodo(colunas, cpf, inicio, fim):
+    # Consulta 2: (quantidade, custo total, tempo medio em minutos) do cidadao no periodo
+    mascara = colunas.cpf == int(cpf)
+    periodo = colunas.periodo(inicio, fim)
+    if periodo is not None:
+        mascara &= periodo
+
+    custos = colunas.custo_centavos[mascara]
+    custos = custos[custos != NULO]
+    total = decimal.Decimal(int(custos.sum())).scaleb(-2)
+
+    comeco, termino = colunas.inicio[mascara], colunas.fim[mascara]
+    com_fim = termino != NULO
+    tempo_medio = float((termino[com_fim] - comeco[com_fim]).mean() / 60) if com_fim.any() else None
+    return int(mascara.sum()), total, tempo_medio
+
+def conferir(colunas, conn, amostra_cpfs=5):
+    # Compara com as consultas diretas em VIAGEM; so faz sentido com o snapshot sem periodo
+    # e sem viagens novas desde a exportacao
+    resultado = []
+    with conn.cursor() as cur:
+        cur.execute(consultas.SQL_HORARIOS_DE_PICO_DIRETO)
+        banco = [(int(hora), qtd) for hora, qtd in cur.fetchall()]
+        resultado.append(("horarios_de_pico", banco == horarios_de_pico(colunas)))
+
+        cur.execute(consultas.SQL_VIAGENS_POR_LINHA_DIRETO)
+        resultado.append(("viagens_por_linha", cur.fetchall() == viagens_por_linha(colunas)))
+
+        cur.execute("SELECT CPF_CIDADAO FROM VIAGEM GROUP BY 1 ORDER BY random() LIMIT %s",
+                    (amostra_cpfs,))
+        de, ate = datetime.date(1970, 1, 1), datetime.date(9999, 1, 1)
+        for (cpf,) in cur.fetchall():
+            cur.execute(consultas.SQL_CONSULTA_2_HISTORICO_PERIODO, (cpf, de, ate))
+            qtd, total, medio = cur.fetchone()
+            q, t, m = historico_periodo(colunas, cpf, de, ate)
+            confere = qtd == q and total == t and (medio is None) == (m is None) \
+                and (m is None or abs(float(medio) - m) < 1e-6)
+            resultado.append((f"historico_periodo {cpf}", confere))
+    conn.rollback()
+    return resultado
+
+def _data(valor):
+    try:
+        return datetime.date.fromisoformat(valor)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data invalida: {valor} (use AAAA-MM-DD)")
+
+def _cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return resultado, (time.perf_counter() - inicio) * 1000
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Snapshot colunar de VIAGEM e analises com NumPy")
+    parser.add_argument("comando", choices=["exportar", "picos", "linhas", "historico", "conferir"])
+    parser.add_argument("--dir", default=DIRETORIO)
+    parser.add_argument("--de", type=_data, help="inicio do periodo (inclusive)")
+    parser.add_argument("--ate", type=_data, help="fim do periodo (exclusivo)")
+    parser.add_argument("--cpf", help="CPF para o comando historico")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.comando == "exportar":
+            linhas, segundos = exportar(args.dir, args.de, args.ate)
+            print(f"{linhas} viagens em {segundos:.1f} s -> {args.dir}")
+            return 0
+
+        colunas = Colunas(args.dir)
+        if args.comando == "picos":
+            rows, ms = _cronometrar(horarios_de_pico, colunas, args.de, args.ate)
+            registros = [{"hora": hora, "quantidade": qtd} for hora, qtd in rows]
+        elif args.comando == "linhas":
+            rows, ms = _cronometrar(viagens_por_linha, colunas)
+            registros = [{"linha": linha, "quantidade": qtd} for linha, qtd in rows]
+        elif args.comando == "historico":
+            if not args.cpf:
+                parser.error("historico precisa de --cpf")
+            (qtd, total, medio), ms = _cronometrar(historico_periodo, colunas, args.cpf,
+                                                   args.de, args.ate)
+            registros = {"quantidade_viagens": qtd, "custo_total": float(total),
+                         "tempo_medio_minutos": medio}
+        else:
+            with db.conexao(timeout_ms=0) as conn:
+                falhas = 0
+                for nome, confere in conferir(colunas, conn):
+                    print(f"{'OK   ' if confere else 'FALHA'} {nome}")
+                    falhas += not confere
+            return 1 if falhas else 0
+
+        print(json.dumps(registros, ensure_ascii=False, indent=2))
+        print(f"{colunas.linhas} viagens lidas em {ms:.1f} ms", file=sys.stderr)
+    except SnapshotInvalido as e:
+        print(f"erro: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.fechar_pool()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+# Os modulos ficam na raiz do repositorio; este arquivo a coloca no sys.path dos testes
+from contextlib import contextmanager
+
+import pytest
+
+import db
+
+class CursorFalso:
+    # execute guarda o que responder(sql, params) devolver: as linhas do resultado ou, para
+    # comandos sem resultado, o rowcount
+    def __init__(self, conexao, nome=None):
+        self.conexao = conexao
+        self.name = nome
+        self.itersize = None
+        self.rows = []
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conexao.executadas.append((sql, params))
+        resposta = self.conexao.responder(sql, params)
+        if isinstance(resposta, int):
+            self.rows, self.rowcount = [], resposta
+        else:
+            self.rows = list(resposta)
+            self.rowcount = len(self.rows)
+
+    def copy_expert(self, sql, arquivo):
+        self.conexao.copiadas.extend(arquivo.read().splitlines())
+
+    def fetchall(self):
+        return self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+class ConexaoFalsa:
+    def __init__(self, responder=lambda sql, params: []):
+        self.responder = responder
+        self.executadas = []
+        self.copiadas = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.emprestimos = 0
+
+    def cursor(self, name=None):
+        return CursorFalso(self, name)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+@pytest.fixture
+def conexao_falsa():
+    # conexao_falsa(responder) -> ConexaoFalsa
+    return ConexaoFalsa
+
+@pytest.fixture
+def banco(monkeypatch):
+    # banco(conn): db.conexao() passa a emprestar conn, contando os emprestimos
+    def usar(conn):
+        @contextmanager
+        def conexao(timeout_ms=None):
+            conn.emprestimos += 1
+            yield conn
+
+        monkeypatch.setattr(db, "conexao", conexao)
+        return conn
+    return usar
@@ -0,0 +1,458 @@
+import preparadas
+
+TAMANHO_PAGINA_VIAGENS = 15
+TAMANHO_PAGINA_CIDADAOS = 20
+# Linhas buscadas por ida ao servidor no cursor nomeado da exportacao
+ITERSIZE_EXPORTACAO = 2000
+
+SQL_VIAGENS_POR_CPF = """
+    SELECT v.DATAHORA_INICIO, v.DATAHORA_FINAL, v.CUSTO_TOTAL,
+           v.NOME_CODIGO_LINHA_EMBARQUE, v.NRO_PARADA_EMBARQUE,
+           v.NOME_CODIGO_LINHA_DESEMBARQUE, v.NRO_PARADA_DESEMBARQUE,
+           o.PLACA, l.TARIFA
+    FROM VIAGEM v
+    JOIN ONIBUS o ON v.PLACA_ONIBUS = o.PLACA
+    JOIN LINHA l ON v.NOME_CODIGO_LINHA_EMBARQUE = l.NOME_CODIGO
+    WHERE v.CPF_CIDADAO = %s
+    ORDER BY v.DATAHORA_INICIO DESC
+"""
+
+# Paginacao por keyset sobre a PK (CPF_CIDADAO, DATAHORA_INICIO): o custo de
+# cada pagina nao depende de quantas viagens vieram antes dela. O OFFSET e 0 nas paginas
+# da API; o paginador da tela (paginador.FonteKeyset) pula menos de BLOCO_BUSCA linhas
+# a partir do marco mais proximo
+SQL_VIAGENS_POR_CPF_PROXIMA = """
+    SELECT v.DATAHORA_INICIO, v.DATAHORA_FINAL, v.CUSTO_TOTAL,
+           v.NOME_CODIGO_LINHA_EMBARQUE, v.NRO_PARADA_EMBARQUE,
+           v.NOME_CODIGO_LINHA_DESEMBARQUE, v.NRO_PARADA_DESEMBARQUE,
+           o.PLACA, l.TARIFA
+    FROM VIAGEM v
+    JOIN ONIBUS o ON v.PLACA_ONIBUS = o.PLACA
+    JOIN LINHA l ON v.NOME_CODIGO_LINHA_EMBARQUE = l.NOME_CODIGO
+    WHERE v.CPF_CIDADAO = %s AND v.DATAHORA_INICIO < %s
+    ORDER BY v.DATAHORA_INICIO DESC
+    LIMIT %s OFFSET %s
+"""
+
+SQL_VIAGENS_POR_CPF_ANTERIOR = """
+    SELECT v.DATAHORA_INICIO, v.DATAHORA_FINAL, v.CUSTO_TOTAL,
+           v.NOME_CODIGO_LINHA_EMBARQUE, v.NRO_PARADA_EMBARQUE,
+           v.NOME_CODIGO_LINHA_DESEMBARQUE, v.NRO_PARADA_DESEMBARQUE,
+           o.PLACA, l.TARIFA
+    FROM VIAGEM v
+    JOIN ONIBUS o ON v.PLACA_ONIBUS = o.PLACA
+    JOIN LINHA l ON v.NOME_CODIGO_LINHA_EMBARQUE = l.NOME_CODIGO
+    WHERE v.CPF_CIDADAO = %s AND v.DATAHORA_INICIO > %s
+    ORDER BY v.DATAHORA_INICIO ASC
+    LIMIT %s
+"""
+
+SQL_TOTAL_GASTO = """
+    SELECT COALESCE(SUM(CUSTO_TOTAL), 0), COUNT(*)
+    FROM VIAGEM WHERE CPF_CIDADAO = %s
+"""
+
+SQL_LINHAS_POR_BAIRRO = """
+    SELECT DISTINCT l.NOME_CODIGO, l.TARIFA, l.TEMPO_PERCURSO, e.NOME
+    FROM LINHA l
+    JOIN PONTO_PARADA p ON p.NOME_CODIGO_LINHA = l.NOME_CODIGO
+    JOIN EMPRESA_PUBLICA e ON l.CNPJ_EMPRESA_PUBLICA = e.CNPJ
+    WHERE p.BAIRRO ILIKE %s AND l.ATIVO = 'S'
+    ORDER BY l.NOME_CODIGO
+"""
+
+SQL_PONTOS_PARADA = """
+    SELECT NOME_CODIGO_LINHA, NRO_PARADA, RUA, BAIRRO, NUMERO, CEP,
+           PRESENCA_COBERTURA, EH_ORIGEM, EH_DESTINO
+    FROM PONTO_PARADA
+    WHERE BAIRRO ILIKE %s AND RUA ILIKE %s
+    ORDER BY NOME_CODIGO_LINHA, NRO_PARADA
+"""
+
+SQL_LINHAS_ATIVAS = """
+    SELECT l.NOME_CODIGO, l.TARIFA, l.TEMPO_PERCURSO, e.NOME
+    FROM LINHA l
+    JOIN EMPRESA_PUBLICA e ON l.CNPJ_EMPRESA_PUBLICA = e.CNPJ
+    WHERE l.ATIVO = 'S'
+    ORDER BY l.NOME_CODIGO
+"""
+
+# As telas do gestor leem os rollups mantidos por trigger (migracao 0003);
+# as versoes _DIRETO agregam VIAGEM e servem para conferir os rollups
+SQL_VIAGENS_POR_LINHA = """
+    SELECT NOME_CODIGO_LINHA, QTD
+    FROM ROLLUP_VIAGENS_LINHA
+    ORDER BY QTD DESC, NOME_CODIGO_LINHA
+"""
+
+# CPF_CIDADAO e NOT NULL: conta-lo da o mesmo que COUNT(*), mas so IX_VIAGEM_LINHA_CIDADAO
+# (migracao 0006) cobre as duas colunas; com COUNT(*) o planner escolhia entre ele e
+# IX_VIAGEM_EMBARQUE conforme o tamanho de cada indice
+SQL_VIAGENS_POR_LINHA_DIRETO = """
+    SELECT v.NOME_CODIGO_LINHA_EMBARQUE, COUNT(v.CPF_CIDADAO) as qtd
+    FROM VIAGEM v
+    GROUP BY v.NOME_CODIGO_LINHA_EMBARQUE
+    ORDER BY qtd DESC, v.NOME_CODIGO_LINHA_EMBARQUE
+"""
+
+SQL_ROTAS_MAIS_UTILIZADAS = """
+    SELECT BAIRRO_ORIGEM, BAIRRO_DESTINO, QTD
+    FROM ROLLUP_ROTAS_BAIRRO
+    ORDER BY QTD DESC, BAIRRO_ORIGEM, BAIRRO_DESTINO
+    LIMIT %s
+"""
+
+SQL_ROTAS_MAIS_UTILIZADAS_DIRETO = """
+    SELECT pe.BAIRRO, pd.BAIRRO, COUNT(*) as qtd
+    FROM VIAGEM v
+    JOIN PONTO_PARADA pe ON v.NOME_CODIGO_LINHA_EMBARQUE = pe.NOME_CODIGO_LINHA
+        AND v.NRO_PARADA_EMBARQUE = pe.NRO_PARADA
+    JOIN PONTO_PARADA pd ON v.NOME_CODIGO_LINHA_DESEMBARQUE = pd.NOME_CODIGO_LINHA
+        AND v.NRO_PARADA_DESEMBARQUE = pd.NRO_PARADA
+    WHERE pe.BAIRRO IS NOT NULL AND pd.BAIRRO IS NOT NULL
+    GROUP BY pe.BAIRRO, pd.BAIRRO
+    ORDER BY qtd DESC, pe.BAIRRO, pd.BAIRRO
+    LIMIT %s
+"""
+
+SQL_HORARIOS_DE_PICO = """
+    SELECT HORA, QTD
+    FROM ROLLUP_VIAGENS_HORA
+    ORDER BY QTD DESC, HORA
+"""
+
+SQL_HORARIOS_DE_PICO_DIRETO = """
+    SELECT EXTRACT(HOUR FROM DATAHORA_INICIO) as hora, COUNT(*) as qtd
+    FROM VIAGEM
+    GROUP BY hora
+    ORDER BY qtd DESC, hora
+"""
+
+# Picos de um periodo: VIAGEM e particionada por mes (migracao 0007), entao so as
+# particoes do intervalo sao lidas
+SQL_HORARIOS_DE_PICO_PERIODO = """
+    SELECT EXTRACT(HOUR FROM DATAHORA_INICIO) as hora, COUNT(*) as qtd
+    FROM VIAGEM
+    WHERE DATAHORA_INICIO >= %s AND DATAHORA_INICIO < %s
+    GROUP BY hora
+    ORDER BY qtd DESC, hora
+"""
+
+# Exportacao de VIAGEM crua por periodo: sem ORDER BY para o COPY sair direto do scan
+# das particoes do intervalo, sem ordenar milhoes de linhas antes do primeiro byte
+SQL_EXPORTAR_VIAGENS = """
+    SELECT CPF_CIDADAO, PLACA_ONIBUS, DATAHORA_INICIO, DATAHORA_FINAL, CUSTO_TOTAL,
+           NOME_CODIGO_LINHA_EMBARQUE, NRO_PARADA_EMBARQUE,
+           NOME_CODIGO_LINHA_DESEMBARQUE, NRO_PARADA_DESEMBARQUE
+    FROM VIAGEM
+    WHERE DATAHORA_INICIO >= %s AND DATAHORA_INICIO < %s
+"""
+
+# Ocupacao da frota: cada viagem vira um evento de embarque (+1) e um de desembarque (-1),
+# em segundos desde 1970. A ordenacao e a do sweep: no mesmo instante quem desce sai antes
+# de quem sobe. Viagens sem fim ou com fim antes do inicio ficam de fora.
+SQL_EVENTOS_OCUPACAO = """
+    SELECT instante, delta, placa
+    FROM (
+        SELECT FLOOR(EXTRACT(EPOCH FROM DATAHORA_INICIO))::BIGINT AS instante, 1 AS delta,
+               PLACA_ONIBUS AS placa
+        FROM VIAGEM
+        WHERE DATAHORA_INICIO >= %(de)s AND DATAHORA_INICIO < %(ate)s
+          AND DATAHORA_FINAL > DATAHORA_INICIO
+        UNION ALL
+        SELECT FLOOR(EXTRACT(EPOCH FROM DATAHORA_FINAL))::BIGINT, -1, PLACA_ONIBUS
+        FROM VIAGEM
+        WHERE DATAHORA_INICIO >= %(de)s AND DATAHORA_INICIO < %(ate)s
+          AND DATAHORA_FINAL > DATAHORA_INICIO
+    ) eventos
+    ORDER BY instante, delta
+"""
+
+SQL_CAPACIDADE_ONIBUS = """
+    SELECT PLACA, NOME_CODIGO_LINHA, NRO_PASSAGEIROS
+    FROM ONIBUS
+"""
+
+# Consulta 5 sem o NOT EXISTS duplo: para cada linha da empresa, os CPFs distintos que
+# embarcaram nela (index-only scan em IX_VIAGEM_LINHA_CIDADAO, migracao 0006, com a linha
+# e o keyset no Index Cond); quem aparece em todas as linhas (total passado como
+# parametro) usou a empresa inteira. Paginada por keyset em CPF.
+SQL_CIDADAOS_TODAS_AS_LINHAS = """
+    SELECT uc.CPF, uc.EMAIL
+    FROM (
+        SELECT v.CPF_CIDADAO
+        FROM (SELECT NOME_CODIGO FROM LINHA WHERE CNPJ_EMPRESA_PUBLICA = %s) l
+        CROSS JOIN LATERAL (
+            SELECT DISTINCT CPF_CIDADAO
+            FROM VIAGEM
+            WHERE NOME_CODIGO_LINHA_EMBARQUE = l.NOME_CODIGO
+              AND CPF_CIDADAO > %s
+        ) v
+        GROUP BY v.CPF_CIDADAO
+        HAVING COUNT(*) = %s
+    ) completos
+    JOIN USUARIO_CIDADAO uc ON uc.CPF = completos.CPF_CIDADAO
+    ORDER BY uc.CPF
+    LIMIT %s
+"""
+
+# Nenhuma linha quando a empresa nao existe
+SQL_LINHAS_DA_EMPRESA = """
+    SELECT e.NOME, COUNT(l.NOME_CODIGO)
+    FROM EMPRESA_PUBLICA e
+    LEFT JOIN LINHA l ON l.CNPJ_EMPRESA_PUBLICA = e.CNPJ
+    WHERE e.CNPJ = %s
+    GROUP BY e.NOME
+"""
+
+SQL_CIDADAOS_PAGINA = """
+    SELECT CPF, EMAIL
+    FROM USUARIO_CIDADAO
+    WHERE CPF > %s
+    ORDER BY CPF
+    LIMIT %s
+"""
+
+# Consultas do relatorio (consultas.sql), parametrizadas
+SQL_CONSULTA_1_LINHAS_ACESSIVEIS = """
+    SELECT DISTINCT l.NOME_CODIGO, l.TARIFA, l.TEMPO_PERCURSO, e.NOME AS nome_empresa
+    FROM LINHA l
+    JOIN ONIBUS o ON o.NOME_CODIGO_LINHA = l.NOME_CODIGO
+    JOIN PONTO_PARADA p ON p.NOME_CODIGO_LINHA = l.NOME_CODIGO
+    JOIN EMPRESA_PUBLICA e ON l.CNPJ_EMPRESA_PUBLICA = e.CNPJ
+    WHERE o.ACESSIBILIDADE = 'S'
+      AND p.BAIRRO ILIKE %s
+      AND l.ATIVO = 'S'
+    ORDER BY l.NOME_CODIGO
+"""
+
+SQL_CONSULTA_2_HISTORICO_PERIODO = """
+    SELECT COUNT(*) AS quantidade_viagens,
+           COALESCE(SUM(CUSTO_TOTAL), 0) AS custo_total,
+           AVG(EXTRACT(EPOCH FROM (DATAHORA_FINAL - DATAHORA_INICIO)) / 60.0) AS tempo_medio_minutos
+    FROM VIAGEM
+    WHERE CPF_CIDADAO = %s
+      AND DATAHORA_INICIO >= %s
+      AND DATAHORA_INICIO < %s
+"""
+
+SQL_CONSULTA_3_LINHAS_DO_CIDADAO = """
+    SELECT v.NOME_CODIGO_LINHA_EMBARQUE AS linha, COUNT(*) AS qtd_viagens
+    FROM VIAGEM v
+    WHERE v.CPF_CIDADAO = %s
+    GROUP BY v.NOME_CODIGO_LINHA_EMBARQUE
+    ORDER BY qtd_viagens DESC, linha
+"""
+
+SQL_CONSULTA_4_ROTAS_ENTRE_BAIRROS = """
+    SELECT pe.BAIRRO AS bairro_origem, pd.BAIRRO AS bairro_destino, COUNT(*) AS qtd_viagens
+    FROM VIAGEM v
+    JOIN PONTO_PARADA pe ON v.NOME_CODIGO_LINHA_EMBARQUE = pe.NOME_CODIGO_LINHA
+     AND v.NRO_PARADA_EMBARQUE = pe.NRO_PARADA
+    JOIN PONTO_PARADA pd ON v.NOME_CODIGO_LINHA_DESEMBARQUE = pd.NOME_CODIGO_LINHA
+     AND v.NRO_PARADA_DESEMBARQUE = pd.NRO_PARADA
+    GROUP BY pe.BAIRRO, pd.BAIRRO
+    ORDER BY qtd_viagens DESC, bairro_origem, bairro_destino
+"""
+
+SQL_CONSULTA_5_TODAS_AS_LINHAS = """
+    SELECT uc.CPF, uc.EMAIL
+    FROM USUARIO_CIDADAO uc
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM LINHA l
+        WHERE l.CNPJ_EMPRESA_PUBLICA = %s
+          AND NOT EXISTS (
+              SELECT 1
+              FROM VIAGEM v
+              WHERE v.CPF_CIDADAO = uc.CPF
+                AND v.NOME_CODIGO_LINHA_EMBARQUE = l.NOME_CODIGO
+          )
+    )
+"""
+
+# Login: uma busca pelo indice unico de EMAIL; a senha e conferida no autenticacao.py
+SQL_CREDENCIAL_CIDADAO = "SELECT CPF, SENHA FROM USUARIO_CIDADAO WHERE EMAIL = %s"
+
+SQL_CREDENCIAL_GESTOR = "SELECT CPF, SENHA FROM USUARIO_GESTOR WHERE EMAIL = %s"
+
+# CONSULTAS CIDADAO
+def buscar_pagina_viagens(conn, cpf, antes_de=None, depois_de=None,
+                          limite=TAMANHO_PAGINA_VIAGENS):
+    # Busca uma linha a mais so para saber se existe outra pagina na mesma direcao
+    with conn.cursor() as cur:
+        if depois_de is not None:
+            preparadas.executar(cur, "SQL_VIAGENS_POR_CPF_ANTERIOR", (cpf, depois_de, limite + 1))
+            rows = cur.fetchall()
+            tem_mais = len(rows) > limite
+            return list(reversed(rows[:limite])), tem_mais
+
+        preparadas.executar(cur, "SQL_VIAGENS_POR_CPF_PROXIMA",
+                            (cpf, antes_de if antes_de is not None else "infinity", limite + 1, 0))
+        rows = cur.fetchall()
+        return rows[:limite], len(rows) > limite
+
+def iterar_viagens_por_cpf(conn, cpf, itersize=ITERSIZE_EXPORTACAO):
+    # Cursor nomeado (server-side): a memoria fica limitada a itersize linhas
+    with conn.cursor(name="viagens_por_cpf") as cur:
+        cur.itersize = itersize
+        cur.execute(SQL_VIAGENS_POR_CPF, (cpf,))
+        for row in cur:
+            yield row
+
+def buscar_total_gasto(conn, cpf):
+    with conn.cursor() as cur:
+        preparadas.executar(cur, "SQL_TOTAL_GASTO", (cpf,))
+        return cur.fetchone()
+
+def buscar_linhas_por_bairro(conn, bairro):
+    with conn.cursor() as cur:
+        preparadas.executar(cur, "SQL_LINHAS_POR_BAIRRO", (bairro,))
+        return cur.fetchall()
+
+def buscar_pontos_parada(conn, bairro, rua):
+    with conn.cursor() as cur:
+        preparadas.executar(cur, "SQL_PONTOS_PARADA", (bairro, rua))
+        return cur.fetchall()
+
+# CONSULTAS GESTOR
+def buscar_linhas_ativas(conn):
+    with conn.cursor() as cur:
+        cur.execute(SQL_LINHAS_ATIVAS)
+        return cur.fetchall()
+
+def buscar_viagens_por_linha(conn):
+    with conn.cursor() as cur:
+        cur.execute(SQL_VIAGENS_POR_LINHA)
+        return cur.fetchall()
+
+def buscar_rotas_mais_utilizadas(conn, limite=10):
+    with conn.cursor() as cur:
+        cur.execute(SQL_ROTAS_MAIS_UTILIZADAS, (limite,))
+        return cur.fetchall()
+
+def buscar_horarios_de_pico(conn, inicio=None, fim=None):
+    # Sem periodo le o rollup (historico inteiro)
+    with conn.cursor() as cur:
+        if inicio is None and fim is None:
+            cur.execute(SQL_HORARIOS_DE_PICO)
+        else:
+            cur.execute(SQL_HORARIOS_DE_PICO_PERIODO, (inicio or "-infinity", fim or "infinity"))
+        return cur.fetchall()
+
+def buscar_cidadaos_todas_as_linhas(conn, cnpj, depois_de="", limite=TAMANHO_PAGINA_CIDADAOS):
+    # Devolve (nome da empresa, pagina, tem_mais), ou None se o CNPJ nao existe
+    with conn.cursor() as cur:
+        cur.execute(SQL_LINHAS_DA_EMPRESA, (cnpj,))
+        empresa = cur.fetchone()
+        if empresa is None:
+            return None
+
+        nome, total_linhas = empresa
+        if total_linhas == 0:
+            # Empresa sem linhas: todo cidadao "usou todas", como na Consulta 5 original
+            cur.execute(SQL_CIDADAOS_PAGINA, (depois_de, limite + 1))
+        else:
+            cur.execute(SQL_CIDADAOS_TODAS_AS_LINHAS, (cnpj, depois_de, total_linhas, limite + 1))
+        rows = cur.fetchall()
+    return nome, rows[:limite], len(rows) > limite
+
+# LOGIN
+def buscar_credencial_cidadao(conn, email):
+    with conn.cursor() as cur:
+        preparadas.executar(cur, "SQL_CREDENCIAL_CIDADAO", (email,))
+        return cur.fetchone()
+
+def buscar_credencial_gestor(conn, email):
+    with conn.cursor() as cur:
+        preparadas.executar(cur, "SQL_CREDENCIAL_GESTOR", (email,))
+        return cur.fetchone()
+
+def atualizar_senha_cidadao(conn, cpf, senha_hash):
+    with conn.cursor() as cur:
+        cur.execute("UPDATE USUARIO_CIDADAO SET SENHA = %s WHERE CPF = %s", (senha_hash, cpf))
+
+def atualizar_senha_gestor(conn, cpf, senha_hash):
+    with conn.cursor() as cur:
+        cur.execute("UPDATE USUARIO_GESTOR SET SENHA = %s WHERE CPF = %s", (senha_hash, cpf))
+
+# CADASTRO
+def inserir_cidadao(conn, cpf, rua, bairro, numero, cep, email, senha, status='A'):
+    with conn.cursor() as cur:
+        cur.execute("INSERT INTO USUARIO (CPF, TIPO) VALUES (%s, 'C')", (cpf,))
+        cur.execute(
+            """INSERT INTO USUARIO_CIDADAO
+               (CPF, RUA, BAIRRO, NUMERO, CEP, STATUS, EMAIL, SENHA)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+            (cpf, rua, bairro, numero, cep, status, email, senha)
+        )
+
+def inserir_gestor(conn, cpf, rua, bairro, numero, cep, cargo, email, senha, cnpj_orgao):
+    with conn.cursor() as cur:
+        cur.execute("INSERT INTO USUARIO (CPF, TIPO) VALUES (%s, 'G')", (cpf,))
+        cur.execute(
+            """INSERT INTO USUARIO_GESTOR
+               (CPF, RUA, BAIRRO, NUMERO, CEP, CARGO, EMAIL, SENHA, CNPJ_ORGAO_PUBLICO)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+            (cpf, rua, bairro, numero, cep, cargo, email, senha, cnpj_orgao)
+        )
+
+# DEBUG
+# Listagens paginadas por keyset em EMAIL (indices unicos da migracao 0001), com filtro
+# por trecho do email ou do CPF; parametros: (filtro, filtro, depois_de, limite, offset)
+SQL_DEBUG_CIDADAOS = """
+    SELECT uc.EMAIL, uc.SENHA, uc.CPF, uc.STATUS
+    FROM USUARIO_CIDADAO uc
+    WHERE (uc.EMAIL ILIKE %s OR uc.CPF LIKE %s)
+      AND uc.EMAIL > %s
+    ORDER BY uc.EMAIL
+    LIMIT %s OFFSET %s
+"""
+
+SQL_DEBUG_GESTORES = """
+    SELECT ug.EMAIL, ug.SENHA, ug.CPF, ug.CARGO
+    FROM USUARIO_GESTOR ug
+    WHERE (ug.EMAIL ILIKE %s OR ug.CPF LIKE %s)
+      AND ug.EMAIL > %s
+    ORDER BY ug.EMAIL
+    LIMIT %s OFFSET %s
+"""
+
+# Tudo numa ida ao banco. As estimativas vem das estatisticas do planejador (reltuples,
+# atualizado por ANALYZE/autovacuum; -1 se a tabela nunca foi analisada) e nao leem as
+# tabelas; VIAGEM soma as particoes. LINHA e pequena e e contada sempre.
+SQL_ESTATISTICAS_EXATAS = """
+    SELECT (SELECT COUNT(*) FROM USUARIO_CIDADAO),
+           (SELECT COUNT(*) FROM USUARIO_GESTOR),
+           (SELECT COUNT(*) FROM VIAGEM),
+           (SELECT COUNT(*) FROM LINHA WHERE ATIVO = 'S')
+"""
+
+SQL_ESTATISTICAS_ESTIMADAS = """
+    SELECT (SELECT NULLIF(GREATEST(reltuples, -1), -1)::BIGINT
+            FROM pg_class WHERE oid = 'usuario_cidadao'::regclass),
+           (SELECT NULLIF(GREATEST(reltuples, -1), -1)::BIGINT
+            FROM pg_class WHERE oid = 'usuario_gestor'::regclass),
+           (SELECT (SUM(c.reltuples) FILTER (WHERE c.reltuples >= 0))::BIGINT
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'viagem'::regclass),
+           (SELECT COUNT(*) FROM LINHA WHERE ATIVO = 'S')
+"""
+
+def buscar_linhas_e_bairros(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT DISTINCT l.NOME_CODIGO, p.BAIRRO
+            FROM LINHA l
+            JOIN PONTO_PARADA p ON l.NOME_CODIGO = p.NOME_CODIGO_LINHA
+            WHERE l.ATIVO = 'S' AND p.BAIRRO IS NOT NULL
+            ORDER BY l.NOME_CODIGO, p.BAIRRO
+        """)
+        return cur.fetchall()
+
+def buscar_estatisticas(conn, exatas=True):
+    # (cidadaos, gestores, viagens, linhas ativas); estimativas podem vir None
+    with conn.cursor() as cur:
+        cur.execute(SQL_ESTATISTICAS_EXATAS if exatas else SQL_ESTATISTICAS_ESTIMADAS)
+        return cur.fetchone()
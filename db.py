@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2 import pool as pg_pool
+
+import instrumentacao
+
+POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX = int(os.getenv("DB_POOL_MAX", "5"))
+ESPERA_CHECKOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+TIMEOUT_CONSULTA_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+TIMEOUT_CONEXAO = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+TENTATIVAS_RECONEXAO = int(os.getenv("DB_RECONNECT_TRIES", "5"))
+BACKOFF_INICIAL = float(os.getenv("DB_RECONNECT_BACKOFF", "0.2"))
+BACKOFF_MAXIMO = 5.0
+# Prazo total para o banco ficar pronto na inicializacao (substitui esperas fixas)
+ESPERA_INICIO = float(os.getenv("DB_STARTUP_WAIT", "30"))
+INTERVALO_PRONTIDAO = 0.2
+# Conexoes paradas ha mais tempo que isso recebem um SELECT 1 antes de serem emprestadas
+INTERVALO_HEALTHCHECK = float(os.getenv("DB_HEALTHCHECK_IDLE", "30"))
+# plan_cache_mode das conexoes, so se definido. O padrao do Postgres (auto) vale para tudo,
+# inclusive triggers e cargas; force_generic_plan e opcional para as consultas preparadas
+# (ver preparadas.py), onde poupa o replanejamento de SQL_TOTAL_GASTO a cada EXECUTE
+MODO_PLANO = os.getenv("DB_PLAN_CACHE_MODE")
+
+ERROS_CONEXAO = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+class PoolIndisponivel(Exception):
+    pass
+
+_pool = None
+_vagas = None
+_ultimo_uso = {}
+_lock = threading.Lock()
+
+def parametros_conexao():
+    opcoes = f"-c statement_timeout={TIMEOUT_CONSULTA_MS}"
+    if MODO_PLANO:
+        opcoes += f" -c plan_cache_mode={MODO_PLANO}"
+    return {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "port": int(os.getenv("DB_PORT", "5433")),
+        "database": os.getenv("DB_NAME", "sistemaonibus"),
+        "user": os.getenv("DB_USER", "app_user"),
+        "password": os.getenv("DB_PASSWORD", "trabalhobd"),
+        "connect_timeout": TIMEOUT_CONEXAO,
+        "options": opcoes,
+    }
+
+def com_backoff(funcao, tentativas=None):
+    tentativas = TENTATIVAS_RECONEXAO if tentativas is None else tentativas
+    espera = BACKOFF_INICIAL
+
+    for tentativa in range(1, tentativas + 1):
+        try:
+            return funcao()
+        except psycopg2.OperationalError:
+            if tentativa == tentativas:
+                raise
+            time.sleep(espera)
+            espera = min(espera * 2, BACKOFF_MAXIMO)
+
+def aguardar_banco(prazo=ESPERA_INICIO):
+    # Tenta conexoes baratas ate o banco aceitar uma ou o prazo acabar; devolve os segundos esperados
+    inicio = time.monotonic()
+    limite = inicio + prazo
+
+    while True:
+        try:
+            psycopg2.connect(**parametros_conexao()).close()
+            return time.monotonic() - inicio
+        except psycopg2.OperationalError:
+            if time.monotonic() + INTERVALO_PRONTIDAO >= limite:
+                raise
+            time.sleep(INTERVALO_PRONTIDAO)
+
+def iniciar_pool(minimo=POOL_MIN, maximo=POOL_MAX):
+    global _pool, _vagas
+
+    with _lock:
+        if _pool is not None:
+            return _pool
+
+        maximo = max(maximo, 1)
+        minimo = min(max(minimo, 0), maximo)
+        # Cursores do pool medem cada consulta (ver instrumentacao.py)
+        _pool = com_backoff(
+            lambda: pg_pool.ThreadedConnectionPool(
+                minimo, maximo, cursor_factory=instrumentacao.CursorInstrumentado,
+                **parametros_conexao())
+        )
+        _vagas = threading.BoundedSemaphore(maximo)
+        _ultimo_uso.clear()
+        return _pool
+
+def fechar_pool():
+    global _pool, _vagas
+
+    with _lock:
+        if _pool is not None:
+            _pool.closeall()
+        _pool = None
+        _vagas = None
+        _ultimo_uso.clear()
+
+def _conexao_saudavel(conn):
+    if conn.closed:
+        return False
+
+    status = conn.get_transaction_status()
+    if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+
+    if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except ERROS_CONEXAO:
+            return False
+
+    ociosa = time.monotonic() - _ultimo_uso.get(id(conn), 0)
+    if ociosa < INTERVALO_HEALTHCHECK:
+        return True
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except ERROS_CONEXAO:
+        return False
+
+def _descartar(conn):
+    _ultimo_uso.pop(id(conn), None)
+    try:
+        _pool.putconn(conn, close=True)
+    except pg_pool.PoolError:
+        pass
+
+def _emprestar():
+    while True:
+        conn = com_backoff(_pool.getconn)
+        if _conexao_saudavel(conn):
+            return conn
+        _descartar(conn)
+
+def _devolver(conn, descartar):
+    if not descartar and not conn.closed:
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except ERROS_CONEXAO:
+            descartar = True
+
+    if descartar or conn.closed:
+        _descartar(conn)
+        return
+
+    _ultimo_uso[id(conn)] = time.monotonic()
+    _pool.putconn(conn)
+
+@contextmanager
+def conexao(timeout_ms=None):
+    if _pool is None:
+        iniciar_pool()
+
+    vagas = _vagas
+    if not vagas.acquire(timeout=ESPERA_CHECKOUT):
+        raise PoolIndisponivel(
+            f"Nenhuma conexao livre apos {ESPERA_CHECKOUT:.0f}s (pool com {POOL_MAX} conexoes)"
+        )
+
+    conn = None
+    descartar = False
+    try:
+        conn = _emprestar()
+        if timeout_ms is not None:
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL statement_timeout = %s", (int(timeout_ms),))
+        yield conn
+    except ERROS_CONEXAO:
+        descartar = True
+        raise
+    finally:
+        if conn is not None:
+            _devolver(conn, descartar)
+        vagas.release()
@@ -0,0 +1,251 @@
+import argparse
+import datetime
+import gzip
+import lzma
+import os
+import sys
+import threading
+import time
+
+import cli
+import consultas
+import db
+
+FORMATOS = ("csv", "jsonl", "parquet")
+# Compressao dos arquivos de texto; o Parquet comprime por coluna com o codec dele
+COMPRESSOES_TEXTO = {"gzip": (gzip.open, ".gz"), "xz": (lzma.open, ".xz")}
+COMPRESSOES_PARQUET = ("snappy", "gzip", "zstd")
+# Bytes lidos por vez do COPY quando o destino e o Parquet
+BLOCO_PARQUET = int(os.getenv("EXPORT_PARQUET_BLOCK", str(8 * 2**20)))
+INTERVALO_PROGRESSO = 0.5
+
+COLUNAS_VIAGEM = [
+    "cpf_cidadao", "placa_onibus", "datahora_inicio", "datahora_final", "custo_total",
+    "linha_embarque", "parada_embarque", "linha_desembarque", "parada_desembarque",
+]
+
+# Cada exportacao: SQL, parametros (na ordem dos %s) e nomes das colunas no arquivo
+EXPORTACOES = {
+    "viagens": (consultas.SQL_EXPORTAR_VIAGENS, ["de", "ate"], COLUNAS_VIAGEM),
+    "linhas-ativas": (consultas.SQL_LINHAS_ATIVAS, [], cli.RELATORIOS["linhas-ativas"][2]),
+    "viagens-linha": (consultas.SQL_VIAGENS_POR_LINHA, [], cli.RELATORIOS["viagens-linha"][2]),
+    "rotas": (consultas.SQL_ROTAS_MAIS_UTILIZADAS, ["limite"], cli.RELATORIOS["rotas"][2]),
+    "picos": (consultas.SQL_HORARIOS_DE_PICO, [], cli.RELATORIOS["picos"][2]),
+    "picos-periodo": (consultas.SQL_HORARIOS_DE_PICO_PERIODO, ["de", "ate"],
+                      cli.RELATORIOS["picos"][2]),
+}
+
+# Periodo aberto nas pontas, como em consultas.buscar_horarios_de_pico
+PADROES = {"de": "-infinity", "ate": "infinity", "limite": None}
+
+# Tipos do Postgres (OID) para o Parquet; o resto vira texto
+TIPOS_PARQUET = {
+    16: "bool_",
+    20: "int64",
+    21: "int16",
+    23: "int32",
+    700: "float32",
+    701: "float64",
+    1700: "float64",
+    1082: "date32",
+    1114: "timestamp",
+}
+
+class ExportacaoInvalida(Exception):
+    pass
+
+class Progresso:
+    # Contadores simples atualizados por quem escreve; a tela le quando quiser, sem lock
+    def __init__(self):
+        self.linhas = 0
+        self.bytes = 0
+        self.inicio = time.monotonic()
+        self.fim = None
+
+    def segundos(self):
+        return (self.fim or time.monotonic()) - self.inicio
+
+    def texto(self):
+        segundos = max(self.segundos(), 1e-9)
+        return (f"{self.linhas:,} linhas  {self.bytes / 2**20:,.1f} MB  "
+                f"{self.linhas / segundos:,.0f} linhas/s")
+
+class _Saida:
+    # Destino do copy_expert: o psycopg2 chama write uma vez por linha do COPY
+    def __init__(self, arquivo, progresso):
+        self.arquivo = arquivo
+        self.progresso = progresso
+
+    def write(self, dados):
+        self.arquivo.write(dados)
+        self.progresso.linhas += 1
+        self.progresso.bytes += len(dados)
+
+def caminho_padrao(nome, formato, compressao=None):
+    extensao = COMPRESSOES_TEXTO[compressao][1] if formato != "parquet" and compressao else ""
+    return f"{nome}.{formato}{extensao}"
+
+def _consulta(cur, nome, parametros):
+    sql, argumentos, colunas = EXPORTACOES[nome]
+    valores = [PADROES[arg] if parametros.get(arg) is None else parametros[arg]
+               for arg in argumentos]
+    # A lista de aliases da o nome das colunas no cabecalho e nas chaves do JSON
+    sql = f"SELECT * FROM ({sql}) AS t({', '.join(colunas)})"
+    return cur.mogrify(sql, valores).decode(), colunas
+
+def _comando_copy(sql, formato):
+    if formato == "csv":
+        return f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)"
+    # row_to_json escapa controles como \u0001, entao com QUOTE e DELIMITER nesses bytes o
+    # CSV nunca cita nada e cada linha sai como o JSON puro
+    return (f"COPY (SELECT row_to_json(t) FROM ({sql}) t) TO STDOUT "
+            f"WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')")
+
+def _abrir(caminho, compressao):
+    if compressao is None:
+        return open(caminho, "wb")
+    return COMPRESSOES_TEXTO[compressao][0](caminho, "wb")
+
+def _exportar_texto(cur, sql, formato, caminho, compressao, progresso):
+    with _abrir(caminho, compressao) as arquivo:
+        cur.copy_expert(_comando_copy(sql, formato), _Saida(arquivo, progresso))
+    if formato == "csv":
+        progresso.linhas -= 1
+
+def _esquema_parquet(pa, cur, sql, colunas):
+    cur.execute(f"SELECT * FROM ({sql}) t LIMIT 0")
+    campos = []
+    for nome, coluna in zip(colunas, cur.description):
+        tipo = TIPOS_PARQUET.get(coluna.type_code)
+        if tipo is None:
+            campos.append(pa.field(nome, pa.string()))
+        elif tipo == "timestamp":
+            campos.append(pa.field(nome, pa.timestamp("us")))
+        elif coluna.type_code == 1700 and coluna.scale is not None and coluna.scale >= 0:
+            # NUMERIC com escala declarada (tarifas, custos) fica exato
+            campos.append(pa.field(nome, pa.decimal128(coluna.precision, coluna.scale)))
+        else:
+            campos.append(pa.field(nome, getattr(pa, tipo)()))
+    return pa.schema(campos)
+
+def _exportar_parquet(cur, sql, colunas, caminho, compressao, progresso):
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportacaoInvalida("formato parquet precisa do pyarrow (pip install pyarrow)")
+
+    esquema = _esquema_parquet(pa, cur, sql, colunas)
+
+    # O COPY escreve CSV num pipe e o leitor do pyarrow converte bloco a bloco:
+    # a memoria fica em torno de BLOCO_PARQUET, qualquer que seja o tamanho da exportacao
+    leitura, escrita = os.pipe()
+    contagem = Progresso()
+    erros = []
+
+    def produzir():
+        try:
+            with os.fdopen(escrita, "wb") as arquivo:
+                cur.copy_expert(_comando_copy(sql, "csv"), _Saida(arquivo, contagem))
+        except Exception as e:
+            erros.append(e)
+
+    produtor = threading.Thread(target=produzir, name="exportacao-copy", daemon=True)
+    produtor.start()
+    try:
+        with os.fdopen(leitura, "rb") as entrada:
+            leitor = pa_csv.open_csv(
+                entrada,
+                read_options=pa_csv.ReadOptions(block_size=BLOCO_PARQUET),
+                convert_options=pa_csv.ConvertOptions(
+                    column_types=esquema,
+                    strings_can_be_null=True,
+                    quoted_strings_can_be_null=False,
+                ),
+            )
+            with pq.ParquetWriter(caminho, esquema, compression=compressao or "none") as saida:
+                for lote in leitor:
+                    saida.write_batch(lote)
+                    progresso.linhas += lote.num_rows
+                    progresso.bytes = contagem.bytes
+    finally:
+        produtor.join()
+    if erros:
+        raise erros[0]
+
+def validar(nome, formato, compressao=None):
+    if nome not in EXPORTACOES:
+        raise ExportacaoInvalida(f"exportacao desconhecida: {nome}")
+    if formato not in FORMATOS:
+        raise ExportacaoInvalida(f"formato deve ser um de {', '.join(FORMATOS)}")
+    validas = COMPRESSOES_PARQUET if formato == "parquet" else tuple(COMPRESSOES_TEXTO)
+    if compressao is not None and compressao not in validas:
+        raise ExportacaoInvalida(f"compressao de {formato} deve ser uma de {', '.join(validas)}")
+
+def exportar(nome, caminho, formato="csv", parametros=None, compressao=None, progresso=None):
+    # Devolve o Progresso final (linhas e bytes lidos do COPY)
+    validar(nome, formato, compressao)
+    progresso = progresso or Progresso()
+    # Sem statement_timeout: exportar dezenas de milhoes de linhas leva minutos
+    with db.conexao(timeout_ms=0) as conn:
+        with conn.cursor() as cur:
+            sql, colunas = _consulta(cur, nome, parametros or {})
+            if formato == "parquet":
+                _exportar_parquet(cur, sql, colunas, caminho, compressao, progresso)
+            else:
+                _exportar_texto(cur, sql, formato, caminho, compressao, progresso)
+        conn.rollback()
+    progresso.fim = time.monotonic()
+    return progresso
+
+def _data(valor):
+    try:
+        return datetime.date.fromisoformat(valor)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data invalida: {valor} (use AAAA-MM-DD)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Exporta relatorios ou VIAGEM (por periodo) via COPY TO STDOUT")
+    parser.add_argument("nome", choices=list(EXPORTACOES))
+    parser.add_argument("--formato", choices=FORMATOS, default="csv")
+    parser.add_argument("--compressao",
+                        choices=sorted(set(COMPRESSOES_TEXTO) | set(COMPRESSOES_PARQUET)))
+    parser.add_argument("--saida", help="arquivo de destino (padrao: <nome>.<formato>)")
+    parser.add_argument("--de", type=_data, help="inicio do periodo (inclusive)")
+    parser.add_argument("--ate", type=_data, help="fim do periodo (exclusivo)")
+    parser.add_argument("--limite", type=int)
+    parser.add_argument("--silencioso", action="store_true", help="sem progresso no stderr")
+    args = parser.parse_args(argv)
+
+    try:
+        validar(args.nome, args.formato, args.compressao)
+    except ExportacaoInvalida as e:
+        parser.error(str(e))
+
+    caminho = args.saida or caminho_padrao(args.nome, args.formato, args.compressao)
+    parametros = {"de": args.de, "ate": args.ate, "limite": args.limite}
+    progresso = Progresso()
+    terminou = threading.Event()
+
+    def mostrar():
+        while not terminou.wait(INTERVALO_PROGRESSO):
+            print(f"\r{progresso.texto()}", end="", file=sys.stderr, flush=True)
+
+    if not args.silencioso:
+        threading.Thread(target=mostrar, name="exportacao-progresso", daemon=True).start()
+    try:
+        exportar(args.nome, caminho, args.formato, parametros, args.compressao, progresso)
+    except (ExportacaoInvalida, OSError) as e:
+        print(f"\nerro: {e}", file=sys.stderr)
+        return 1
+    finally:
+        terminou.set()
+        db.fechar_pool()
+
+    print(f"\r{progresso.texto()}  em {progresso.segundos():.1f} s -> {caminho}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
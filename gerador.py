@@ -0,0 +1,376 @@
+import argparse
+import datetime
+import itertools
+import random
+import sys
+import time
+
+import autenticacao
+import db
+
+# Volume por unidade de escala (--escala 1); VIAGEM cresce linearmente com a escala
+CIDADAOS_POR_ESCALA = 10_000
+VIAGENS_POR_ESCALA = 1_000_000
+
+# Prefixos das chaves geradas: nao colidem com dados_completos.sql e permitem --limpar
+PREFIXO_CPF_CIDADAO = "60"
+PREFIXO_CPF_GESTOR = "61"
+PREFIXO_CNPJ_ORGAO = "600"
+PREFIXO_CNPJ_EMPRESA = "610"
+PREFIXO_LINHA = "G"
+PREFIXO_PLACA = "G"
+
+# Senhas dos usuarios gerados. O hash e calculado uma vez so e repetido em todas as
+# linhas (mesmo salt), o que basta para dados de teste e nao custa um PBKDF2 por usuario
+SENHA_CIDADAO = "senha123"
+SENHA_GESTOR = "gestor123"
+
+BAIRROS = [
+    "Centro", "Sé", "República", "Bela Vista", "Consolação", "Liberdade", "Cambuci",
+    "Jardins", "Pinheiros", "Vila Mariana", "Moema", "Itaim Bibi", "Morumbi", "Butantã",
+    "Lapa", "Perdizes", "Barra Funda", "Santana", "Tucuruvi", "Casa Verde", "Freguesia do Ó",
+    "Brasilândia", "Pirituba", "Mooca", "Tatuapé", "Penha", "Vila Prudente", "Ipiranga",
+    "Sacomã", "Jabaquara", "Saúde", "Santo Amaro", "Campo Limpo", "Capão Redondo",
+    "Grajaú", "Itaquera", "Guaianases", "São Mateus", "Cidade Tiradentes", "Ermelino Matarazzo",
+]
+# Bairros centrais recebem mais viagens (destino de manha, origem a tarde)
+BAIRROS_CENTRAIS = BAIRROS[:8]
+
+RUAS = [
+    "Rua das Flores", "Avenida Paulista", "Rua Augusta", "Rua da Consolação", "Avenida Brasil",
+    "Rua Vergueiro", "Avenida Rebouças", "Rua Teodoro Sampaio", "Avenida Ipiranga",
+    "Rua XV de Novembro", "Rua Direita", "Avenida São João", "Rua Domingos de Morais",
+    "Avenida Santo Amaro", "Rua Voluntários da Pátria", "Avenida Celso Garcia",
+    "Rua Tuiuti", "Avenida Jabaquara", "Rua Cardeal Arcoverde", "Avenida Sapopemba",
+]
+
+# Peso relativo das horas do dia, com picos as 7h e as 18h
+PESOS_HORA = [
+    1, 1, 1, 1, 3, 12, 35, 60, 45, 20, 14, 15,
+    18, 16, 14, 16, 28, 55, 62, 40, 22, 12, 6, 3,
+]
+
+COLUNAS = {
+    "ORGAO_PUBLICO": ["CNPJ", "RAZAO_SOCIAL", "NOME", "RUA", "BAIRRO", "NUMERO", "CEP"],
+    "EMPRESA_PUBLICA": ["CNPJ", "RAZAO_SOCIAL", "NOME", "CNPJ_ORGAO_PUBLICO"],
+    "LINHA": ["NOME_CODIGO", "TARIFA", "TEMPO_PERCURSO", "ATIVO", "CNPJ_EMPRESA_PUBLICA"],
+    "PONTO_PARADA": ["NOME_CODIGO_LINHA", "NRO_PARADA", "RUA", "BAIRRO", "NUMERO", "CEP",
+                     "PRESENCA_COBERTURA", "EH_ORIGEM", "EH_DESTINO"],
+    "ONIBUS": ["PLACA", "NRO_PASSAGEIROS", "ANO_FABRICACAO", "ACESSIBILIDADE",
+               "NOME_CODIGO_LINHA", "HORARIO_INICIO", "HORARIO_FINAL"],
+    "USUARIO": ["CPF", "TIPO"],
+    "USUARIO_CIDADAO": ["CPF", "RUA", "BAIRRO", "NUMERO", "CEP", "STATUS", "EMAIL", "SENHA"],
+    "USUARIO_GESTOR": ["CPF", "RUA", "BAIRRO", "NUMERO", "CEP", "CARGO", "EMAIL", "SENHA",
+                       "CNPJ_ORGAO_PUBLICO"],
+    "VIAGEM": ["CPF_CIDADAO", "PLACA_ONIBUS", "DATAHORA_INICIO", "DATAHORA_FINAL", "CUSTO_TOTAL",
+               "NOME_CODIGO_LINHA_EMBARQUE", "NRO_PARADA_EMBARQUE",
+               "NOME_CODIGO_LINHA_DESEMBARQUE", "NRO_PARADA_DESEMBARQUE"],
+}
+
+class FluxoCopy:
+    # Arquivo somente-leitura sobre um gerador de linhas, para o COPY FROM STDIN
+    # consumir os dados conforme sao gerados sem montar tudo em memoria
+    def __init__(self, linhas):
+        self._linhas = iter(linhas)
+        self._buffer = ""
+
+    def read(self, tamanho=-1):
+        partes = [self._buffer]
+        acumulado = len(self._buffer)
+        while tamanho < 0 or acumulado < tamanho:
+            linha = next(self._linhas, None)
+            if linha is None:
+                break
+            partes.append(linha)
+            acumulado += len(linha)
+        dados = "".join(partes)
+        if tamanho < 0:
+            self._buffer = ""
+            return dados
+        self._buffer = dados[tamanho:]
+        return dados[:tamanho]
+
+    readline = read
+
+def linha_copy(valores):
+    return "\t".join("\\N" if v is None else str(v) for v in valores) + "\n"
+
+def copiar(cur, tabela, rows):
+    colunas = ", ".join(COLUNAS[tabela])
+    cur.copy_expert(f"COPY {tabela} ({colunas}) FROM STDIN", FluxoCopy(map(linha_copy, rows)))
+    return cur.rowcount
+
+def placa(indice):
+    digitos = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    sufixo = ""
+    for _ in range(6):
+        indice, resto = divmod(indice, 36)
+        sufixo = digitos[resto] + sufixo
+    return PREFIXO_PLACA + sufixo
+
+def cep(rnd):
+    return f"{rnd.randint(1000000, 8499999):08d}"
+
+def pesos_zipf(n, expoente=1.1):
+    return list(itertools.accumulate(1 / (i + 1) ** expoente for i in range(n)))
+
+def gerar_cidade(escala, rnd, inicio, senha_gestor):
+    cidade = {}
+
+    qtd_orgaos = max(2, round(2 * escala))
+    qtd_empresas = max(3, round(5 * escala))
+    qtd_linhas = max(10, round(40 * escala))
+    qtd_gestores = max(2, round(20 * escala))
+
+    cidade["ORGAO_PUBLICO"] = [
+        (f"{PREFIXO_CNPJ_ORGAO}{i:011d}", f"Orgao Gerado {i} de Transportes", f"Orgao {i}",
+         rnd.choice(RUAS), rnd.choice(BAIRROS_CENTRAIS), rnd.randint(1, 3000), cep(rnd))
+        for i in range(qtd_orgaos)
+    ]
+    cidade["EMPRESA_PUBLICA"] = [
+        (f"{PREFIXO_CNPJ_EMPRESA}{i:011d}", f"Viacao Gerada {i} LTDA", f"Viacao {i}",
+         cidade["ORGAO_PUBLICO"][i % qtd_orgaos][0])
+        for i in range(qtd_empresas)
+    ]
+
+    linhas = []
+    paradas = []
+    onibus = []
+    for i in range(qtd_linhas):
+        codigo = f"{PREFIXO_LINHA}{i:05d}-10"
+        tarifa = rnd.choice(["4.40", "4.80", "5.00", "5.50", "6.00"])
+        tempo = rnd.randint(30, 120)
+        ativo = "S" if rnd.random() < 0.95 else "N"
+        linhas.append((codigo, tarifa, tempo, ativo, cidade["EMPRESA_PUBLICA"][i % qtd_empresas][0]))
+
+        # Cada linha sai de um bairro periferico e termina num bairro central
+        n_paradas = rnd.randint(8, 25)
+        bairros_linha = rnd.sample(BAIRROS[8:], 3) + [rnd.choice(BAIRROS_CENTRAIS)]
+        for nro in range(1, n_paradas + 1):
+            trecho = min((nro - 1) * len(bairros_linha) // n_paradas, len(bairros_linha) - 1)
+            paradas.append((
+                codigo, nro, rnd.choice(RUAS), bairros_linha[trecho], rnd.randint(1, 5000), cep(rnd),
+                "S" if rnd.random() < 0.4 else "N",
+                "S" if nro == 1 else "N",
+                "S" if nro == n_paradas else "N",
+            ))
+
+        for _ in range(rnd.randint(3, 8)):
+            onibus.append((
+                placa(len(onibus)), rnd.choice([40, 60, 80, 120]), rnd.randint(2008, 2025),
+                "S" if rnd.random() < 0.7 else "N", codigo,
+                f"{inicio:%Y-%m-%d} 05:00:00", f"{inicio:%Y-%m-%d} 23:59:00",
+            ))
+
+    cidade["LINHA"] = linhas
+    cidade["PONTO_PARADA"] = paradas
+    cidade["ONIBUS"] = onibus
+    cidade["GESTORES"] = [
+        (f"{PREFIXO_CPF_GESTOR}{i:09d}", rnd.choice(RUAS), rnd.choice(BAIRROS), rnd.randint(1, 3000),
+         cep(rnd), "Analista de Transportes", f"gestor{i}@gerado.test", senha_gestor,
+         cidade["ORGAO_PUBLICO"][i % qtd_orgaos][0])
+        for i in range(qtd_gestores)
+    ]
+    return cidade
+
+def gerar_cidadaos(qtd, rnd, senha):
+    for i in range(qtd):
+        yield (f"{PREFIXO_CPF_CIDADAO}{i:09d}", rnd.choice(RUAS), rnd.choice(BAIRROS),
+               rnd.randint(1, 5000), cep(rnd), "A" if rnd.random() < 0.97 else "I",
+               f"cidadao{i}@gerado.test", senha)
+
+def viagens_por_cidadao(qtd_cidadaos, qtd_viagens, rnd):
+    # Poucos passageiros frequentes concentram muitas viagens (distribuicao exponencial)
+    pesos = [rnd.expovariate(1.0) for _ in range(qtd_cidadaos)]
+    total = sum(pesos)
+    quantidades = [int(qtd_viagens * p / total) for p in pesos]
+    for i in range(qtd_viagens - sum(quantidades)):
+        quantidades[i % qtd_cidadaos] += 1
+    return quantidades
+
+def gerar_viagens(cidade, qtd_cidadaos, qtd_viagens, rnd, inicio, dias):
+    linhas_ativas = [l for l in cidade["LINHA"] if l[3] == "S"]
+    rnd.shuffle(linhas_ativas)
+    acumulado_linhas = pesos_zipf(len(linhas_ativas))
+
+    qtd_paradas = {}
+    for parada in cidade["PONTO_PARADA"]:
+        qtd_paradas[parada[0]] = max(qtd_paradas.get(parada[0], 0), parada[1])
+    onibus_por_linha = {}
+    for bus in cidade["ONIBUS"]:
+        onibus_por_linha.setdefault(bus[4], []).append(bus[0])
+
+    acumulado_horas = list(itertools.accumulate(PESOS_HORA))
+    base = datetime.datetime.combine(inicio, datetime.time())
+    quantidades = viagens_por_cidadao(qtd_cidadaos, qtd_viagens, rnd)
+
+    for indice, quantidade in enumerate(quantidades):
+        if not quantidade:
+            continue
+        cpf = f"{PREFIXO_CPF_CIDADAO}{indice:09d}"
+        linha_casa = rnd.choices(linhas_ativas, cum_weights=acumulado_linhas)[0]
+        usados = set()
+
+        for _ in range(quantidade):
+            # 70% das viagens na linha de casa, o resto em qualquer linha (com popularidade zipf)
+            if rnd.random() < 0.7:
+                linha = linha_casa
+            else:
+                linha = rnd.choices(linhas_ativas, cum_weights=acumulado_linhas)[0]
+            codigo, tarifa, tempo_percurso = linha[0], linha[1], linha[2]
+            n_paradas = qtd_paradas[codigo]
+
+            while True:
+                hora = rnd.choices(range(24), cum_weights=acumulado_horas)[0]
+                segundos = rnd.randrange(dias) * 86400 + hora * 3600 + rnd.randrange(3600)
+                if segundos not in usados:
+                    usados.add(segundos)
+                    break
+
+            # De manha o fluxo vai para o centro (fim da linha); a tarde volta
+            a, b = sorted(rnd.sample(range(1, n_paradas + 1), 2))
+            embarque, desembarque = (a, b) if hora < 12 else (b, a)
+            trecho = abs(desembarque - embarque) / max(n_paradas - 1, 1)
+            duracao = max(180, int(tempo_percurso * 60 * trecho * rnd.uniform(0.8, 1.3)))
+
+            datahora_inicio = base + datetime.timedelta(seconds=segundos)
+            yield (
+                cpf, rnd.choice(onibus_por_linha[codigo]),
+                datahora_inicio, datahora_inicio + datetime.timedelta(seconds=duracao), tarifa,
+                codigo, embarque, codigo, desembarque,
+            )
+
+def desmontar_indices(cur, tabela):
+    # Remove PK, FKs e indices da tabela e devolve o DDL para recria-los depois da carga
+    cur.execute(
+        """SELECT conname, contype, pg_get_constraintdef(oid)
+           FROM pg_constraint
+           WHERE conrelid = %s::regclass AND contype IN ('p', 'f')""",
+        (tabela,)
+    )
+    restricoes = cur.fetchall()
+    cur.execute(
+        """SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+           FROM pg_index i
+           WHERE i.indrelid = %s::regclass
+             AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)""",
+        (tabela,)
+    )
+    indices = cur.fetchall()
+
+    for nome, tipo, _ in sorted(restricoes, key=lambda r: r[1] != "f"):
+        cur.execute(f"ALTER TABLE {tabela} DROP CONSTRAINT {nome}")
+    for nome, _ in indices:
+        cur.execute(f"DROP INDEX {nome}")
+
+    # Recria na ordem: PK, indices, FKs (a validacao das FKs aproveita os indices prontos)
+    ddl = [f"ALTER TABLE {tabela} ADD CONSTRAINT {nome} {definicao}"
+           for nome, tipo, definicao in restricoes if tipo == "p"]
+    # Em tabela particionada o pg_get_indexdef diz "ON ONLY", que criaria o indice so na pai
+    ddl += [definicao.replace(" ON ONLY ", " ON ", 1) for _, definicao in indices]
+    ddl += [f"ALTER TABLE {tabela} ADD CONSTRAINT {nome} {definicao}"
+            for nome, tipo, definicao in restricoes if tipo == "f"]
+    return ddl
+
+def limpar(cur):
+    cur.execute("DELETE FROM VIAGEM WHERE CPF_CIDADAO LIKE %s", (PREFIXO_CPF_CIDADAO + "%",))
+    cur.execute("DELETE FROM USUARIO_CIDADAO WHERE CPF LIKE %s", (PREFIXO_CPF_CIDADAO + "%",))
+    cur.execute("DELETE FROM USUARIO_GESTOR WHERE CPF LIKE %s", (PREFIXO_CPF_GESTOR + "%",))
+    cur.execute("DELETE FROM USUARIO WHERE CPF LIKE %s OR CPF LIKE %s",
+                (PREFIXO_CPF_CIDADAO + "%", PREFIXO_CPF_GESTOR + "%"))
+    cur.execute("DELETE FROM ONIBUS WHERE NOME_CODIGO_LINHA LIKE %s", (PREFIXO_LINHA + "%",))
+    cur.execute("DELETE FROM PONTO_PARADA WHERE NOME_CODIGO_LINHA LIKE %s", (PREFIXO_LINHA + "%",))
+    cur.execute("DELETE FROM LINHA WHERE NOME_CODIGO LIKE %s", (PREFIXO_LINHA + "%",))
+    cur.execute("DELETE FROM EMPRESA_PUBLICA WHERE CNPJ LIKE %s", (PREFIXO_CNPJ_EMPRESA + "%",))
+    cur.execute("DELETE FROM ORGAO_PUBLICO WHERE CNPJ LIKE %s", (PREFIXO_CNPJ_ORGAO + "%",))
+
+def log(mensagem, inicio):
+    print(f"[{time.perf_counter() - inicio:8.1f}s] {mensagem}", file=sys.stderr)
+
+def carregar(conn, escala, semente=42, dias=365, fim=None, limpar_antes=False):
+    rnd = random.Random(semente)
+    fim = fim or datetime.date.today()
+    inicio_periodo = fim - datetime.timedelta(days=dias)
+    qtd_cidadaos = max(10, round(CIDADAOS_POR_ESCALA * escala))
+    qtd_viagens = round(VIAGENS_POR_ESCALA * escala)
+    t0 = time.perf_counter()
+
+    with conn.cursor() as cur:
+        # Tudo numa transacao so: se algo falhar, o DDL da carga tambem e desfeito
+        cur.execute("SET LOCAL statement_timeout = 0")
+        cur.execute("SET LOCAL synchronous_commit = off")
+        cur.execute("SET LOCAL maintenance_work_mem = '512MB'")
+
+        if limpar_antes:
+            cur.execute("ALTER TABLE VIAGEM DISABLE TRIGGER USER")
+            limpar(cur)
+            cur.execute("ALTER TABLE VIAGEM ENABLE TRIGGER USER")
+            log("dados gerados anteriormente removidos", t0)
+
+        cidade = gerar_cidade(escala, rnd, inicio_periodo, autenticacao.gerar_hash(SENHA_GESTOR))
+        for tabela in ["ORGAO_PUBLICO", "EMPRESA_PUBLICA", "LINHA", "PONTO_PARADA", "ONIBUS"]:
+            log(f"{tabela}: {copiar(cur, tabela, cidade[tabela])} linhas", t0)
+
+        gestores = cidade["GESTORES"]
+        copiar(cur, "USUARIO", ((g[0], "G") for g in gestores))
+        copiar(cur, "USUARIO", ((f"{PREFIXO_CPF_CIDADAO}{i:09d}", "C") for i in range(qtd_cidadaos)))
+        log(f"USUARIO_GESTOR: {copiar(cur, 'USUARIO_GESTOR', gestores)} linhas", t0)
+        cidadaos = gerar_cidadaos(qtd_cidadaos, rnd, autenticacao.gerar_hash(SENHA_CIDADAO))
+        log(f"USUARIO_CIDADAO: {copiar(cur, 'USUARIO_CIDADAO', cidadaos)} linhas", t0)
+
+        # VIAGEM: sem indices, constraints nem triggers durante o COPY; tudo e refeito no final
+        ddl = desmontar_indices(cur, "VIAGEM")
+        cur.execute("SELECT criar_particoes_viagem(%s, %s)", (inicio_periodo, fim))
+        log(f"particoes novas de VIAGEM: {len(cur.fetchall())}", t0)
+        cur.execute("ALTER TABLE VIAGEM DISABLE TRIGGER USER")
+        t_viagens = time.perf_counter()
+        viagens = gerar_viagens(cidade, qtd_cidadaos, qtd_viagens, rnd, inicio_periodo, dias)
+        total = copiar(cur, "VIAGEM", viagens)
+        taxa = total / max(time.perf_counter() - t_viagens, 1e-9)
+        log(f"VIAGEM: {total} linhas ({taxa:,.0f} linhas/s)", t0)
+
+        for comando in ddl:
+            cur.execute(comando)
+            log(comando.split(" USING ")[0][:90], t0)
+        cur.execute("ALTER TABLE VIAGEM ENABLE TRIGGER USER")
+
+        cur.execute("SELECT reconstruir_rollups()")
+        log("rollups recalculados", t0)
+
+    conn.commit()
+
+    # VACUUM marca as paginas copiadas no visibility map: sem ele o planner ve cada
+    # index-only scan como um index scan comum e escolhe indices diferentes dos de producao
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET statement_timeout = 0")
+            for tabela in COLUNAS:
+                cur.execute(f"VACUUM ANALYZE {tabela}")
+            cur.execute("RESET statement_timeout")
+    finally:
+        conn.autocommit = False
+    log("VACUUM ANALYZE concluido", t0)
+
+    return total
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera uma cidade sintetica e carrega via COPY")
+    parser.add_argument("--escala", type=float, default=1.0,
+                        help=f"fator de escala (1 = {CIDADAOS_POR_ESCALA} cidadaos, "
+                             f"{VIAGENS_POR_ESCALA} viagens)")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--dias", type=int, default=365, help="periodo coberto pelas viagens")
+    parser.add_argument("--limpar", action="store_true",
+                        help="remove os dados gerados por uma execucao anterior")
+    args = parser.parse_args(argv)
+
+    try:
+        with db.conexao() as conn:
+            carregar(conn, args.escala, args.semente, args.dias, limpar_antes=args.limpar)
+    finally:
+        db.fechar_pool()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import autenticacao
+import db
+from gerador import FluxoCopy
+from validacao import validar_cpf, validar_cep, validar_email, validar_numero_casa
+
+# Colunas do CSV por tipo de usuario; STATUS e opcional para cidadaos (padrao 'A')
+CAMPOS = {
+    "cidadaos": ["cpf", "rua", "bairro", "numero", "cep", "email", "senha"],
+    "gestores": ["cpf", "rua", "bairro", "numero", "cep", "cargo", "email", "senha", "cnpj_orgao"],
+}
+
+# Limites do esquema, checados antes do COPY para que uma linha longa nao derrube o lote
+TAMANHO_MAXIMO = {"rua": 100, "bairro": 100, "cargo": 100, "email": 100}
+NUMERO_MAXIMO = 2**31 - 1
+# O PBKDF2 libera o GIL, entao os hashes de cada bloco sao calculados em paralelo
+BLOCO_HASH = 256
+
+SQL_STAGING = {
+    "cidadaos": """
+        CREATE TEMP TABLE STAGING_USUARIO (
+            LINHA  INTEGER NOT NULL,
+            CPF    CHAR(11),
+            RUA    VARCHAR(100),
+            BAIRRO VARCHAR(100),
+            NUMERO INTEGER,
+            CEP    CHAR(8),
+            STATUS CHAR(1),
+            EMAIL  VARCHAR(100),
+            SENHA  VARCHAR(255)
+        ) ON COMMIT DROP
+    """,
+    "gestores": """
+        CREATE TEMP TABLE STAGING_USUARIO (
+            LINHA              INTEGER NOT NULL,
+            CPF                CHAR(11),
+            RUA                VARCHAR(100),
+            BAIRRO             VARCHAR(100),
+            NUMERO             INTEGER,
+            CEP                CHAR(8),
+            CARGO              VARCHAR(100),
+            EMAIL              VARCHAR(100),
+            SENHA              VARCHAR(255),
+            CNPJ_ORGAO_PUBLICO CHAR(14)
+        ) ON COMMIT DROP
+    """,
+}
+
+COLUNAS_STAGING = {
+    "cidadaos": ["LINHA", "CPF", "RUA", "BAIRRO", "NUMERO", "CEP", "STATUS", "EMAIL", "SENHA"],
+    "gestores": ["LINHA", "CPF", "RUA", "BAIRRO", "NUMERO", "CEP", "CARGO", "EMAIL", "SENHA",
+                 "CNPJ_ORGAO_PUBLICO"],
+}
+
+# Regras que dependem do banco: cada uma remove da staging as linhas que violam e devolve o motivo
+REJEICOES_BANCO = {
+    "cidadaos": [
+        ("CPF ja cadastrado",
+         "DELETE FROM STAGING_USUARIO s USING USUARIO u WHERE u.CPF = s.CPF "
+         "RETURNING s.LINHA, s.CPF, s.EMAIL"),
+        ("Email ja cadastrado",
+         "DELETE FROM STAGING_USUARIO s USING USUARIO_CIDADAO c WHERE c.EMAIL = s.EMAIL "
+         "RETURNING s.LINHA, s.CPF, s.EMAIL"),
+    ],
+    "gestores": [
+        ("CPF ja cadastrado",
+         "DELETE FROM STAGING_USUARIO s USING USUARIO u WHERE u.CPF = s.CPF "
+         "RETURNING s.LINHA, s.CPF, s.EMAIL"),
+        ("Email ja cadastrado",
+         "DELETE FROM STAGING_USUARIO s USING USUARIO_GESTOR g WHERE g.EMAIL = s.EMAIL "
+         "RETURNING s.LINHA, s.CPF, s.EMAIL"),
+        ("Orgao publico inexistente",
+         "DELETE FROM STAGING_USUARIO s WHERE NOT EXISTS "
+         "(SELECT 1 FROM ORGAO_PUBLICO o WHERE o.CNPJ = s.CNPJ_ORGAO_PUBLICO) "
+         "RETURNING s.LINHA, s.CPF, s.EMAIL"),
+    ],
+}
+
+# USUARIO e a tabela filha entram no mesmo comando; a FK e conferida no fim do comando
+SQL_INSERIR = {
+    "cidadaos": """
+        WITH usuarios AS (
+            INSERT INTO USUARIO (CPF, TIPO)
+            SELECT CPF, 'C' FROM STAGING_USUARIO
+        )
+        INSERT INTO USUARIO_CIDADAO (CPF, RUA, BAIRRO, NUMERO, CEP, STATUS, EMAIL, SENHA)
+        SELECT CPF, RUA, BAIRRO, NUMERO, CEP, STATUS, EMAIL, SENHA
+        FROM STAGING_USUARIO
+    """,
+    "gestores": """
+        WITH usuarios AS (
+            INSERT INTO USUARIO (CPF, TIPO)
+            SELECT CPF, 'G' FROM STAGING_USUARIO
+        )
+        INSERT INTO USUARIO_GESTOR
+            (CPF, RUA, BAIRRO, NUMERO, CEP, CARGO, EMAIL, SENHA, CNPJ_ORGAO_PUBLICO)
+        SELECT CPF, RUA, BAIRRO, NUMERO, CEP, CARGO, EMAIL, SENHA, CNPJ_ORGAO_PUBLICO
+        FROM STAGING_USUARIO
+    """,
+}
+
+def escapar_copy(valor):
+    if valor is None:
+        return "\\N"
+    return (str(valor).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+def validar_registro(tipo, registro):
+    erros = []
+    valores = {campo: (registro.get(campo) or "").strip() for campo in CAMPOS[tipo]}
+
+    for validador, campo in [(validar_cpf, "cpf"), (validar_cep, "cep"),
+                             (validar_email, "email"), (validar_numero_casa, "numero")]:
+        valido, mensagem = validador(valores[campo])
+        if not valido:
+            erros.append(mensagem)
+
+    if valores["numero"].isdigit() and int(valores["numero"]) > NUMERO_MAXIMO:
+        erros.append("Número da casa muito grande")
+
+    if not valores["senha"]:
+        erros.append("Senha não pode estar vazia")
+
+    for campo, limite in TAMANHO_MAXIMO.items():
+        if campo in valores and len(valores[campo]) > limite:
+            erros.append(f"{campo} excede {limite} caracteres")
+
+    if tipo == "cidadaos":
+        valores["status"] = (registro.get("status") or "A").strip().upper()
+        if valores["status"] not in ("A", "I"):
+            erros.append("Status deve ser A ou I")
+    elif not (valores["cnpj_orgao"].isdigit() and len(valores["cnpj_orgao"]) == 14):
+        erros.append("CNPJ do orgao deve conter exatamente 14 digitos")
+
+    return valores, erros
+
+def linhas_validas(tipo, leitor, rejeitados):
+    # Valida em streaming; duplicatas dentro do proprio arquivo tambem sao rejeitadas
+    cpfs, emails = set(), set()
+    for registro in leitor:
+        linha = leitor.line_num
+        valores, erros = validar_registro(tipo, registro)
+        if not erros and valores["cpf"] in cpfs:
+            erros.append("CPF repetido no arquivo")
+        if not erros and valores["email"] in emails:
+            erros.append("Email repetido no arquivo")
+        if erros:
+            rejeitados.append((linha, valores["cpf"], valores["email"], "; ".join(erros)))
+            continue
+
+        cpfs.add(valores["cpf"])
+        emails.add(valores["email"])
+        numero = int(valores["numero"]) if valores["numero"] else None
+        if tipo == "cidadaos":
+            campos = [valores["cpf"], valores["rua"] or None, valores["bairro"] or None, numero,
+                      valores["cep"], valores["status"], valores["email"], valores["senha"]]
+        else:
+            campos = [valores["cpf"], valores["rua"] or None, valores["bairro"] or None, numero,
+                      valores["cep"], valores["cargo"] or None, valores["email"], valores["senha"],
+                      valores["cnpj_orgao"]]
+        yield [linha] + campos
+
+def com_senha_hash(registros, indice_senha):
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for bloco in iter(lambda: list(itertools.islice(registros, BLOCO_HASH)), []):
+            hashes = executor.map(autenticacao.gerar_hash, [r[indice_senha] for r in bloco])
+            for registro, senha_hash in zip(bloco, hashes):
+                registro[indice_senha] = senha_hash
+                yield "\t".join(escapar_copy(v) for v in registro) + "\n"
+
+def importar(conn, tipo, arquivo, delimitador=","):
+    rejeitados = []
+    leitor = csv.DictReader(arquivo, delimiter=delimitador)
+    faltando = set(CAMPOS[tipo]) - set(leitor.fieldnames or [])
+    if faltando:
+        raise ValueError(f"Colunas ausentes no CSV: {', '.join(sorted(faltando))}")
+
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL statement_timeout = 0")
+        cur.execute(SQL_STAGING[tipo])
+        colunas = ", ".join(COLUNAS_STAGING[tipo])
+        cur.copy_expert(f"COPY STAGING_USUARIO ({colunas}) FROM STDIN",
+                        FluxoCopy(com_senha_hash(linhas_validas(tipo, leitor, rejeitados),
+                                                 COLUNAS_STAGING[tipo].index("SENHA"))))
+
+        # Impede que um cadastro concorrente use o mesmo CPF entre a checagem e o INSERT
+        cur.execute("LOCK TABLE USUARIO IN SHARE ROW EXCLUSIVE MODE")
+        for motivo, sql in REJEICOES_BANCO[tipo]:
+            cur.execute(sql)
+            rejeitados.extend((linha, cpf, email, motivo) for linha, cpf, email in cur.fetchall())
+
+        cur.execute(SQL_INSERIR[tipo])
+        importados = cur.rowcount
+
+    conn.commit()
+    rejeitados.sort()
+    return importados, rejeitados
+
+def escrever_rejeitados(rejeitados, saida):
+    writer = csv.writer(saida)
+    writer.writerow(["linha", "cpf", "email", "motivo"])
+    writer.writerows(rejeitados)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa cidadaos ou gestores em lote a partir de CSV")
+    parser.add_argument("tipo", choices=sorted(CAMPOS))
+    parser.add_argument("arquivo", help="CSV com cabecalho (use - para stdin)")
+    parser.add_argument("--delimitador", default=",")
+    parser.add_argument("--rejeitados", help="grava as linhas rejeitadas neste CSV (padrao: stderr)")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    arquivo = sys.stdin if args.arquivo == "-" else open(args.arquivo, newline="", encoding="utf-8-sig")
+    try:
+        with db.conexao() as conn:
+            importados, rejeitados = importar(conn, args.tipo, arquivo, args.delimitador)
+    except Exception as e:
+        print(json.dumps({"erro": str(e)}, ensure_ascii=False), file=sys.stderr)
+        return 1
+    finally:
+        if arquivo is not sys.stdin:
+            arquivo.close()
+        db.fechar_pool()
+
+    if rejeitados:
+        if args.rejeitados:
+            with open(args.rejeitados, "w", newline="", encoding="utf-8") as f:
+                escrever_rejeitados(rejeitados, f)
+        else:
+            escrever_rejeitados(rejeitados, sys.stderr)
+
+    resumo = {
+        "tipo": args.tipo,
+        "importados": importados,
+        "rejeitados": len(rejeitados),
+        "segundos": round(time.perf_counter() - inicio, 3),
+    }
+    print(json.dumps(resumo, ensure_ascii=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
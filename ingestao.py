@@ -0,0 +1,320 @@
+import argparse
+import datetime
+import decimal
+import json
+import os
+import queue
+import socketserver
+import sys
+import threading
+import time
+
+import psycopg2
+
+import db
+from gerador import FluxoCopy, linha_copy
+
+TAMANHO_LOTE = int(os.getenv("INGESTAO_LOTE", "2000"))
+# Um lote incompleto e gravado depois desse tempo, para o evento nao ficar parado na fila
+ESPERA_LOTE = float(os.getenv("INGESTAO_ESPERA", "0.5"))
+# Fila cheia bloqueia os leitores: o arquivo para de ser lido e o socket para de ser drenado
+CAPACIDADE_FILA = int(os.getenv("INGESTAO_FILA", "20000"))
+# Chave desconhecida recarrega o cache, no maximo uma vez nesse intervalo
+INTERVALO_RECARGA = float(os.getenv("INGESTAO_RECARGA", "30"))
+
+FIM = object()
+
+SQL_STAGING = """
+    CREATE TEMP TABLE IF NOT EXISTS STAGING_VIAGEM (
+        CPF_CIDADAO                   CHAR(11),
+        PLACA_ONIBUS                  VARCHAR(7),
+        DATAHORA_INICIO               TIMESTAMP,
+        DATAHORA_FINAL                TIMESTAMP,
+        CUSTO_TOTAL                   NUMERIC(8,2),
+        NOME_CODIGO_LINHA_EMBARQUE    VARCHAR(20),
+        NRO_PARADA_EMBARQUE           INTEGER,
+        NOME_CODIGO_LINHA_DESEMBARQUE VARCHAR(20),
+        NRO_PARADA_DESEMBARQUE        INTEGER
+    ) ON COMMIT DELETE ROWS
+"""
+
+COLUNAS = ["CPF_CIDADAO", "PLACA_ONIBUS", "DATAHORA_INICIO", "DATAHORA_FINAL", "CUSTO_TOTAL",
+           "NOME_CODIGO_LINHA_EMBARQUE", "NRO_PARADA_EMBARQUE",
+           "NOME_CODIGO_LINHA_DESEMBARQUE", "NRO_PARADA_DESEMBARQUE"]
+
+# Reenvio do mesmo evento (mesmo CPF e DATAHORA_INICIO) nao gera erro nem linha nova
+SQL_GRAVAR = f"""
+    INSERT INTO VIAGEM ({", ".join(COLUNAS)})
+    SELECT {", ".join("s." + c for c in COLUNAS)}
+    FROM STAGING_VIAGEM s
+    JOIN USUARIO_CIDADAO c ON c.CPF = s.CPF_CIDADAO
+    ON CONFLICT (CPF_CIDADAO, DATAHORA_INICIO) DO NOTHING
+"""
+
+SQL_SEM_CIDADAO = """
+    SELECT s.CPF_CIDADAO, s.DATAHORA_INICIO
+    FROM STAGING_VIAGEM s
+    WHERE NOT EXISTS (SELECT 1 FROM USUARIO_CIDADAO c WHERE c.CPF = s.CPF_CIDADAO)
+"""
+
+class CacheChaves:
+    def __init__(self):
+        self.paradas = set()
+        self.placas = set()
+        self.tarifas = {}
+        self.carregado_em = 0.0
+
+    def carregar(self, conn):
+        with conn.cursor() as cur:
+            cur.execute("SELECT NOME_CODIGO_LINHA, NRO_PARADA FROM PONTO_PARADA")
+            self.paradas = set(cur.fetchall())
+            cur.execute("SELECT PLACA FROM ONIBUS")
+            self.placas = {placa for (placa,) in cur.fetchall()}
+            cur.execute("SELECT NOME_CODIGO, TARIFA FROM LINHA")
+            self.tarifas = dict(cur.fetchall())
+        conn.rollback()
+        self.carregado_em = time.monotonic()
+
+    def pode_recarregar(self):
+        return time.monotonic() - self.carregado_em >= INTERVALO_RECARGA
+
+class Metricas:
+    def __init__(self):
+        self.inicio = time.monotonic()
+        self.recebidos = 0
+        self.gravados = 0
+        self.duplicados = 0
+        self.rejeitados = 0
+        self.lotes = 0
+
+    def resumo(self, fila):
+        decorrido = max(time.monotonic() - self.inicio, 1e-9)
+        return {
+            "recebidos": self.recebidos,
+            "gravados": self.gravados,
+            "duplicados": self.duplicados,
+            "rejeitados": self.rejeitados,
+            "lotes": self.lotes,
+            "fila": fila.qsize(),
+            "segundos": round(decorrido, 1),
+            "linhas_por_segundo": round(self.gravados / decorrido, 1),
+        }
+
+def data_hora(valor):
+    if not valor:
+        return None
+    return datetime.datetime.fromisoformat(valor)
+
+def normalizar_evento(evento, cache):
+    # Devolve a linha pronta para o COPY; ValueError/LookupError trazem o motivo da rejeicao
+    cpf = str(evento.get("cpf", ""))
+    if not (cpf.isdigit() and len(cpf) == 11):
+        raise ValueError("CPF invalido")
+
+    placa = evento.get("placa")
+    if placa not in cache.placas:
+        raise LookupError(f"onibus {placa} desconhecido")
+
+    embarque = (evento.get("linha_embarque"), int(evento.get("parada_embarque", -1)))
+    desembarque = (evento.get("linha_desembarque"), int(evento.get("parada_desembarque", -1)))
+    for parada in (embarque, desembarque):
+        if parada not in cache.paradas:
+            raise LookupError(f"ponto {parada[0]}/{parada[1]} desconhecido")
+
+    inicio = data_hora(evento.get("inicio"))
+    if inicio is None:
+        raise ValueError("inicio ausente")
+    fim = data_hora(evento.get("fim"))
+    if fim is not None and fim <= inicio:
+        raise ValueError("fim anterior ao inicio")
+
+    custo = evento.get("custo")
+    custo = cache.tarifas[embarque[0]] if custo in (None, "") else decimal.Decimal(str(custo))
+    if custo < 0:
+        raise ValueError("custo negativo")
+
+    return (cpf, placa, inicio.isoformat(), fim.isoformat() if fim else None, custo,
+            embarque[0], embarque[1], desembarque[0], desembarque[1])
+
+def ler_linhas(arquivo, fila):
+    for linha in arquivo:
+        if linha.strip():
+            fila.put(linha)
+
+class EventosHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for linha in self.rfile:
+            linha = linha.decode("utf-8", errors="replace")
+            if linha.strip():
+                self.server.fila.put(linha)
+
+def iniciar_socket(caminho, fila):
+    if os.path.exists(caminho):
+        os.unlink(caminho)
+    servidor = socketserver.ThreadingUnixStreamServer(caminho, EventosHandler)
+    servidor.daemon_threads = True
+    servidor.fila = fila
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+def proximo_lote(fila, tamanho, espera):
+    # Junta ate `tamanho` eventos, esperando no maximo `espera` depois do primeiro
+    primeiro = fila.get()
+    if primeiro is FIM:
+        return [], True
+
+    lote = [primeiro]
+    limite = time.monotonic() + espera
+    while len(lote) < tamanho:
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            break
+        try:
+            item = fila.get(timeout=restante)
+        except queue.Empty:
+            break
+        if item is FIM:
+            return lote, True
+        lote.append(item)
+    return lote, False
+
+def rejeitar(rejeitados, metricas, linha, motivo):
+    metricas.rejeitados += 1
+    if rejeitados is not None:
+        rejeitados.write(json.dumps({"evento": linha.strip(), "motivo": motivo},
+                                    ensure_ascii=False) + "\n")
+
+def gravar_lote(conn, linhas, cache, metricas, rejeitados):
+    validas = []
+    for linha in linhas:
+        try:
+            evento = json.loads(linha)
+            if not isinstance(evento, dict):
+                rejeitar(rejeitados, metricas, linha, "evento deve ser um objeto JSON")
+                continue
+            try:
+                validas.append(normalizar_evento(evento, cache))
+            except LookupError:
+                if not cache.pode_recarregar():
+                    raise
+                cache.carregar(conn)
+                validas.append(normalizar_evento(evento, cache))
+        except (ValueError, LookupError, TypeError, KeyError, decimal.InvalidOperation) as e:
+            rejeitar(rejeitados, metricas, linha, str(e))
+
+    if not validas:
+        return
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SQL_STAGING)
+            cur.copy_expert(f"COPY STAGING_VIAGEM ({', '.join(COLUNAS)}) FROM STDIN",
+                            FluxoCopy(map(linha_copy, validas)))
+            cur.execute(SQL_GRAVAR)
+            gravados = cur.rowcount
+            cur.execute(SQL_SEM_CIDADAO)
+            sem_cidadao = cur.fetchall()
+        conn.commit()
+    except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+        conn.rollback()
+        for valores in validas:
+            rejeitar(rejeitados, metricas, linha_copy(valores), f"lote recusado pelo banco: {e}")
+        return
+
+    for cpf, inicio in sem_cidadao:
+        rejeitar(rejeitados, metricas, json.dumps({"cpf": cpf, "inicio": inicio.isoformat()}),
+                 "cidadao desconhecido")
+    metricas.gravados += gravados
+    metricas.duplicados += len(validas) - gravados - len(sem_cidadao)
+    metricas.lotes += 1
+
+def drenar(fila):
+    lote = []
+    while True:
+        try:
+            item = fila.get_nowait()
+        except queue.Empty:
+            return lote
+        if item is not FIM:
+            lote.append(item)
+
+def consumir(conn, fila, cache, metricas, rejeitados, tamanho_lote, espera_lote,
+             intervalo_metricas, saida=sys.stderr):
+    proximo_relatorio = time.monotonic() + intervalo_metricas
+    terminou = False
+    while not terminou:
+        lote, terminou = proximo_lote(fila, tamanho_lote, espera_lote)
+        metricas.recebidos += len(lote)
+        gravar_lote(conn, lote, cache, metricas, rejeitados)
+        if time.monotonic() >= proximo_relatorio:
+            print(json.dumps(metricas.resumo(fila)), file=saida, flush=True)
+            proximo_relatorio = time.monotonic() + intervalo_metricas
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Ingestao continua de viagens (JSON por linha) em micro-lotes via COPY"
+    )
+    origem = parser.add_mutually_exclusive_group(required=True)
+    origem.add_argument("--arquivo", help="arquivo de eventos (use - para ler de um pipe/stdin)")
+    origem.add_argument("--socket", help="caminho do socket unix que recebe os eventos")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE)
+    parser.add_argument("--espera", type=float, default=ESPERA_LOTE,
+                        help="segundos maximos ate gravar um lote incompleto")
+    parser.add_argument("--fila", type=int, default=CAPACIDADE_FILA,
+                        help="eventos em memoria antes de bloquear os leitores")
+    parser.add_argument("--rejeitados", help="grava os eventos rejeitados (JSON por linha)")
+    parser.add_argument("--metricas", type=float, default=5.0,
+                        help="intervalo em segundos entre as metricas no stderr")
+    args = parser.parse_args(argv)
+
+    fila = queue.Queue(maxsize=max(args.fila, args.lote))
+    metricas = Metricas()
+    cache = CacheChaves()
+    rejeitados = open(args.rejeitados, "a", encoding="utf-8") if args.rejeitados else None
+    servidor = None
+
+    try:
+        with db.conexao() as conn:
+            cache.carregar(conn)
+
+            if args.socket:
+                servidor = iniciar_socket(args.socket, fila)
+                print(f"ouvindo em {args.socket}", file=sys.stderr)
+            else:
+                arquivo = sys.stdin if args.arquivo == "-" else open(args.arquivo, encoding="utf-8")
+
+                def leitor():
+                    try:
+                        ler_linhas(arquivo, fila)
+                    finally:
+                        fila.put(FIM)
+
+                threading.Thread(target=leitor, daemon=True).start()
+
+            try:
+                consumir(conn, fila, cache, metricas, rejeitados, args.lote, args.espera,
+                         args.metricas)
+            except KeyboardInterrupt:
+                # Grava o que ja estava na fila antes de sair
+                if servidor is not None:
+                    servidor.shutdown()
+                pendentes = drenar(fila)
+                metricas.recebidos += len(pendentes)
+                for i in range(0, len(pendentes), args.lote):
+                    gravar_lote(conn, pendentes[i:i + args.lote], cache, metricas, rejeitados)
+    except Exception as e:
+        print(json.dumps({"erro": str(e)}, ensure_ascii=False), file=sys.stderr)
+        return 1
+    finally:
+        if servidor is not None:
+            servidor.server_close()
+            os.unlink(args.socket)
+        if rejeitados is not None:
+            rejeitados.close()
+        db.fechar_pool()
+
+    print(json.dumps(metricas.resumo(fila)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
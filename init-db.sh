@@ -9,6 +9,19 @@ psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-E
     GRANT ALL PRIVILEGES ON ALL SEQUENCES IN SCHEMA public TO app_user;
     ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT ALL ON TABLES TO app_user;
     ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT ALL ON SEQUENCES TO app_user;
+
+    -- A aplicacao aplica migracoes (indices, tabelas auxiliares) ao iniciar,
+    -- entao precisa criar objetos no schema e ser dona das tabelas
+    GRANT ALL ON SCHEMA public TO app_user;
+    DO \$\$
+    DECLARE
+        t RECORD;
+    BEGIN
+        FOR t IN SELECT tablename FROM pg_tables WHERE schemaname = 'public' LOOP
+            EXECUTE format('ALTER TABLE public.%I OWNER TO app_user', t.tablename);
+        END LOOP;
+    END
+    \$\$;
 EOSQL
 
 echo "Database initialization completed successfully!"
@@ -0,0 +1,191 @@
+import datetime
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+# Consultas acima disso vao para o log de lentas, com o plano do EXPLAIN
+LIMIAR_LENTA_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+ARQUIVO_LENTAS = os.getenv("DB_SLOW_QUERY_LOG", "consultas_lentas.jsonl")
+ARQUIVO_METRICAS = os.getenv("DB_METRICS_FILE", "desempenho.json")
+# Limites superiores (ms) das faixas do histograma; a ultima faixa e aberta
+FAIXAS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+# So estes comandos tem plano; DDL, SET e afins sao medidos mas nao explicados
+COMANDOS_EXPLICAVEIS = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "EXECUTE")
+
+class Estatistica:
+    def __init__(self):
+        self.chamadas = 0
+        self.erros = 0
+        self.lentas = 0
+        self.linhas = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.faixas = [0] * (len(FAIXAS_MS) + 1)
+
+    def registrar(self, ms, linhas, erro):
+        self.chamadas += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.linhas += max(linhas, 0)
+        if erro:
+            self.erros += 1
+        for i, limite in enumerate(FAIXAS_MS):
+            if ms <= limite:
+                self.faixas[i] += 1
+                break
+        else:
+            self.faixas[-1] += 1
+
+    def percentil(self, p):
+        # Aproximado pelo limite superior da faixa; na faixa aberta usa o maximo observado
+        alvo = p / 100 * self.chamadas
+        acumulado = 0
+        for i, quantidade in enumerate(self.faixas):
+            acumulado += quantidade
+            if quantidade and acumulado >= alvo:
+                return min(FAIXAS_MS[i], self.max_ms) if i < len(FAIXAS_MS) else self.max_ms
+        return self.max_ms
+
+    def resumo(self):
+        return {
+            "chamadas": self.chamadas,
+            "erros": self.erros,
+            "lentas": self.lentas,
+            "linhas": self.linhas,
+            "linhas_por_chamada": round(self.linhas / self.chamadas, 1) if self.chamadas else 0,
+            "total_ms": round(self.total_ms, 3),
+            "media_ms": round(self.total_ms / self.chamadas, 3) if self.chamadas else 0,
+            "p50_ms": round(self.percentil(50), 3),
+            "p95_ms": round(self.percentil(95), 3),
+            "p99_ms": round(self.percentil(99), 3),
+            "max_ms": round(self.max_ms, 3),
+            "histograma": dict(zip([f"<={limite}" for limite in FAIXAS_MS] + [f">{FAIXAS_MS[-1]}"],
+                                   self.faixas)),
+        }
+
+_estatisticas = {}
+_lock = threading.Lock()
+_lock_log = threading.Lock()
+_nomes_sql = None
+_inicio = time.time()
+
+def _normalizar(sql):
+    return re.sub(r"\s+", " ", sql).strip()
+
+def _nomes_conhecidos():
+    # SQL_* de consultas.py pelo texto; montado na primeira consulta para evitar import circular
+    global _nomes_sql
+    if _nomes_sql is None:
+        import consultas
+        _nomes_sql = {_normalizar(valor): nome for nome, valor in vars(consultas).items()
+                      if nome.startswith("SQL_") and isinstance(valor, str)}
+    return _nomes_sql
+
+def _nome_consulta(sql):
+    normalizado = _normalizar(sql)
+    nome = _nomes_conhecidos().get(normalizado)
+    if nome is not None:
+        return nome
+
+    # EXECUTE de uma consulta preparada (ver preparadas.py) conta junto com a constante
+    preparada = re.match(r"EXECUTE (sql_\w+)", normalizado)
+    if preparada is not None:
+        return preparada.group(1).upper()
+
+    # Sem constante: usa a funcao que chamou o execute (ex.: consultas.buscar_estatisticas)
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_globals.get("__name__") in (__name__, "contextlib"):
+        frame = frame.f_back
+    if frame is None:
+        return _normalizar(sql)[:60]
+    return f"{frame.f_globals.get('__name__')}.{frame.f_code.co_name}"
+
+def _texto(sql):
+    return sql.decode("utf-8", "replace") if isinstance(sql, bytes) else str(sql)
+
+class CursorInstrumentado(psycopg2.extensions.cursor):
+    # Mede cada execute; usado como cursor_factory das conexoes do pool
+    def execute(self, query, vars=None):
+        inicio = time.perf_counter()
+        erro = True
+        try:
+            resultado = super().execute(query, vars)
+            erro = False
+            return resultado
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000
+            sql = _texto(query)
+            nome = _nome_consulta(sql)
+            with _lock:
+                estatistica = _estatisticas.get(nome)
+                if estatistica is None:
+                    estatistica = _estatisticas[nome] = Estatistica()
+                estatistica.registrar(ms, self.rowcount, erro)
+                if not erro and ms >= LIMIAR_LENTA_MS:
+                    estatistica.lentas += 1
+            if not erro and ms >= LIMIAR_LENTA_MS:
+                _registrar_lenta(self, nome, sql, vars, ms)
+
+def _explicar(cursor, sql, vars):
+    # Cursor comum (sem instrumentacao) para o EXPLAIN nao se medir; savepoint para que
+    # uma falha do EXPLAIN nao aborte a transacao de quem chamou
+    if cursor.name is not None or not sql.lstrip().upper().startswith(COMANDOS_EXPLICAVEIS):
+        return None
+    conn = cursor.connection
+    em_transacao = not conn.autocommit
+    with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+        try:
+            if em_transacao:
+                cur.execute("SAVEPOINT instrumentacao_explain")
+            cur.execute("EXPLAIN " + sql, vars)
+            plano = "\n".join(row[0] for row in cur.fetchall())
+            if em_transacao:
+                cur.execute("RELEASE SAVEPOINT instrumentacao_explain")
+            return plano
+        except psycopg2.Error as e:
+            if em_transacao:
+                cur.execute("ROLLBACK TO SAVEPOINT instrumentacao_explain")
+            return f"(EXPLAIN falhou: {e})"
+
+def _registrar_lenta(cursor, nome, sql, vars, ms):
+    # Parametros nao vao para o log (podem ter e-mails e hashes de senha)
+    registro = {
+        "quando": datetime.datetime.now().isoformat(timespec="seconds"),
+        "consulta": nome,
+        "ms": round(ms, 3),
+        "linhas": cursor.rowcount,
+        "sql": _normalizar(sql),
+        "plano": _explicar(cursor, sql, vars),
+    }
+    with _lock_log:
+        with open(ARQUIVO_LENTAS, "a", encoding="utf-8") as arquivo:
+            arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+def resumo():
+    # Mais tempo acumulado primeiro: e onde otimizar rende mais
+    with _lock:
+        consultas = sorted(((nome, e.resumo()) for nome, e in _estatisticas.items()),
+                           key=lambda item: -item[1]["total_ms"])
+    return {
+        "gerado_em": datetime.datetime.now().isoformat(timespec="seconds"),
+        "desde": datetime.datetime.fromtimestamp(_inicio).isoformat(timespec="seconds"),
+        "limiar_lenta_ms": LIMIAR_LENTA_MS,
+        "consultas": dict(consultas),
+    }
+
+def salvar(caminho=ARQUIVO_METRICAS):
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        json.dump(resumo(), arquivo, ensure_ascii=False, indent=2)
+    return caminho
+
+def zerar():
+    global _inicio
+    with _lock:
+        _estatisticas.clear()
+        _inicio = time.time()
@@ -0,0 +1,16 @@
+-- Indices para o login e para as buscas por bairro/rua das telas do cidadao
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- entrar_como_cidadao / entrar_como_gestor filtram por EMAIL
+CREATE UNIQUE INDEX IF NOT EXISTS UQ_CIDADAO_EMAIL ON USUARIO_CIDADAO (EMAIL);
+CREATE UNIQUE INDEX IF NOT EXISTS UQ_GESTOR_EMAIL ON USUARIO_GESTOR (EMAIL);
+
+-- consultar_linhas_disponiveis / consultar_pontos_parada usam BAIRRO ILIKE e RUA ILIKE,
+-- que so conseguem usar indice trigram (btree nao atende ILIKE)
+CREATE INDEX IF NOT EXISTS IX_PONTO_BAIRRO_TRGM ON PONTO_PARADA USING GIN (BAIRRO gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS IX_PONTO_RUA_TRGM ON PONTO_PARADA USING GIN (RUA gin_trgm_ops);
+
+ANALYZE USUARIO_CIDADAO;
+ANALYZE USUARIO_GESTOR;
+ANALYZE PONTO_PARADA;
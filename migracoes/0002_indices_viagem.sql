@@ -0,0 +1,15 @@
+-- Indices de VIAGEM para as telas do gestor e para as chaves estrangeiras
+
+-- Lado da FK para PONTO_PARADA; a primeira coluna tambem atende viagens_por_linha
+CREATE INDEX IF NOT EXISTS IX_VIAGEM_EMBARQUE
+    ON VIAGEM (NOME_CODIGO_LINHA_EMBARQUE, NRO_PARADA_EMBARQUE);
+CREATE INDEX IF NOT EXISTS IX_VIAGEM_DESEMBARQUE
+    ON VIAGEM (NOME_CODIGO_LINHA_DESEMBARQUE, NRO_PARADA_DESEMBARQUE);
+
+-- Lado da FK para ONIBUS
+CREATE INDEX IF NOT EXISTS IX_VIAGEM_ONIBUS ON VIAGEM (PLACA_ONIBUS);
+
+-- horarios_de_pico e filtros por periodo
+CREATE INDEX IF NOT EXISTS IX_VIAGEM_DATAHORA ON VIAGEM (DATAHORA_INICIO);
+
+ANALYZE VIAGEM;
@@ -0,0 +1,155 @@
+-- Tabelas pre-agregadas para as telas do gestor (viagens_por_linha,
+-- rotas_mais_utilizadas e horarios_de_pico), mantidas por triggers em VIAGEM.
+-- Os triggers sao por comando e usam transition tables, entao um COPY/INSERT
+-- de milhares de linhas atualiza cada rollup com um unico upsert agregado.
+
+LOCK TABLE VIAGEM IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE TABLE ROLLUP_VIAGENS_LINHA (
+    NOME_CODIGO_LINHA VARCHAR(20) NOT NULL,
+    QTD               BIGINT      NOT NULL,
+
+    CONSTRAINT PK_ROLLUP_VIAGENS_LINHA PRIMARY KEY (NOME_CODIGO_LINHA)
+);
+
+CREATE TABLE ROLLUP_ROTAS_BAIRRO (
+    BAIRRO_ORIGEM  VARCHAR(100) NOT NULL,
+    BAIRRO_DESTINO VARCHAR(100) NOT NULL,
+    QTD            BIGINT       NOT NULL,
+
+    CONSTRAINT PK_ROLLUP_ROTAS_BAIRRO PRIMARY KEY (BAIRRO_ORIGEM, BAIRRO_DESTINO)
+);
+
+CREATE TABLE ROLLUP_VIAGENS_HORA (
+    HORA SMALLINT NOT NULL,
+    QTD  BIGINT   NOT NULL,
+
+    CONSTRAINT PK_ROLLUP_VIAGENS_HORA PRIMARY KEY (HORA),
+    CONSTRAINT CK_ROLLUP_HORA CHECK (HORA BETWEEN 0 AND 23)
+);
+
+-- Soma as viagens novas e subtrai as antigas. As transition tables so sao
+-- visiveis dentro da propria funcao de trigger, por isso o SQL dinamico aqui.
+CREATE OR REPLACE FUNCTION trg_rollups_viagem() RETURNS TRIGGER AS $$
+DECLARE
+    origem TEXT;
+    sinal  INTEGER;
+BEGIN
+    FOR origem, sinal IN
+        SELECT t.origem, t.sinal
+        FROM (VALUES ('viagens_antigas', -1), ('viagens_novas', 1)) AS t(origem, sinal)
+        WHERE (t.sinal < 0 AND TG_OP IN ('DELETE', 'UPDATE'))
+           OR (t.sinal > 0 AND TG_OP IN ('INSERT', 'UPDATE'))
+    LOOP
+        EXECUTE format($sql$
+            INSERT INTO ROLLUP_VIAGENS_LINHA AS r (NOME_CODIGO_LINHA, QTD)
+            SELECT NOME_CODIGO_LINHA_EMBARQUE, $1 * COUNT(*)
+            FROM %I
+            GROUP BY NOME_CODIGO_LINHA_EMBARQUE
+            ON CONFLICT (NOME_CODIGO_LINHA) DO UPDATE SET QTD = r.QTD + EXCLUDED.QTD
+        $sql$, origem) USING sinal;
+
+        EXECUTE format($sql$
+            INSERT INTO ROLLUP_ROTAS_BAIRRO AS r (BAIRRO_ORIGEM, BAIRRO_DESTINO, QTD)
+            SELECT pe.BAIRRO, pd.BAIRRO, $1 * COUNT(*)
+            FROM %I v
+            JOIN PONTO_PARADA pe ON v.NOME_CODIGO_LINHA_EMBARQUE = pe.NOME_CODIGO_LINHA
+                AND v.NRO_PARADA_EMBARQUE = pe.NRO_PARADA
+            JOIN PONTO_PARADA pd ON v.NOME_CODIGO_LINHA_DESEMBARQUE = pd.NOME_CODIGO_LINHA
+                AND v.NRO_PARADA_DESEMBARQUE = pd.NRO_PARADA
+            WHERE pe.BAIRRO IS NOT NULL AND pd.BAIRRO IS NOT NULL
+            GROUP BY pe.BAIRRO, pd.BAIRRO
+            ON CONFLICT (BAIRRO_ORIGEM, BAIRRO_DESTINO) DO UPDATE SET QTD = r.QTD + EXCLUDED.QTD
+        $sql$, origem) USING sinal;
+
+        EXECUTE format($sql$
+            INSERT INTO ROLLUP_VIAGENS_HORA AS r (HORA, QTD)
+            SELECT EXTRACT(HOUR FROM DATAHORA_INICIO)::SMALLINT, $1 * COUNT(*)
+            FROM %I
+            GROUP BY 1
+            ON CONFLICT (HORA) DO UPDATE SET QTD = r.QTD + EXCLUDED.QTD
+        $sql$, origem) USING sinal;
+    END LOOP;
+
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        DELETE FROM ROLLUP_VIAGENS_LINHA WHERE QTD <= 0;
+        DELETE FROM ROLLUP_ROTAS_BAIRRO WHERE QTD <= 0;
+        DELETE FROM ROLLUP_VIAGENS_HORA WHERE QTD <= 0;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER TRG_ROLLUPS_VIAGEM_INSERT
+    AFTER INSERT ON VIAGEM
+    REFERENCING NEW TABLE AS viagens_novas
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_rollups_viagem();
+
+CREATE TRIGGER TRG_ROLLUPS_VIAGEM_UPDATE
+    AFTER UPDATE ON VIAGEM
+    REFERENCING OLD TABLE AS viagens_antigas NEW TABLE AS viagens_novas
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_rollups_viagem();
+
+CREATE TRIGGER TRG_ROLLUPS_VIAGEM_DELETE
+    AFTER DELETE ON VIAGEM
+    REFERENCING OLD TABLE AS viagens_antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_rollups_viagem();
+
+-- Recalcula tudo a partir de VIAGEM (carga inicial e reparo manual)
+CREATE OR REPLACE FUNCTION reconstruir_rollups() RETURNS VOID AS $$
+BEGIN
+    DELETE FROM ROLLUP_VIAGENS_LINHA;
+    DELETE FROM ROLLUP_ROTAS_BAIRRO;
+    DELETE FROM ROLLUP_VIAGENS_HORA;
+
+    INSERT INTO ROLLUP_VIAGENS_LINHA (NOME_CODIGO_LINHA, QTD)
+    SELECT NOME_CODIGO_LINHA_EMBARQUE, COUNT(*)
+    FROM VIAGEM
+    GROUP BY NOME_CODIGO_LINHA_EMBARQUE;
+
+    INSERT INTO ROLLUP_ROTAS_BAIRRO (BAIRRO_ORIGEM, BAIRRO_DESTINO, QTD)
+    SELECT pe.BAIRRO, pd.BAIRRO, COUNT(*)
+    FROM VIAGEM v
+    JOIN PONTO_PARADA pe ON v.NOME_CODIGO_LINHA_EMBARQUE = pe.NOME_CODIGO_LINHA
+        AND v.NRO_PARADA_EMBARQUE = pe.NRO_PARADA
+    JOIN PONTO_PARADA pd ON v.NOME_CODIGO_LINHA_DESEMBARQUE = pd.NOME_CODIGO_LINHA
+        AND v.NRO_PARADA_DESEMBARQUE = pd.NRO_PARADA
+    WHERE pe.BAIRRO IS NOT NULL AND pd.BAIRRO IS NOT NULL
+    GROUP BY pe.BAIRRO, pd.BAIRRO;
+
+    INSERT INTO ROLLUP_VIAGENS_HORA (HORA, QTD)
+    SELECT EXTRACT(HOUR FROM DATAHORA_INICIO)::SMALLINT, COUNT(*)
+    FROM VIAGEM
+    GROUP BY 1;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Trocar o bairro de uma parada muda o par origem/destino de viagens antigas
+CREATE OR REPLACE FUNCTION trg_rollups_ponto_bairro() RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM ROLLUP_ROTAS_BAIRRO;
+
+    INSERT INTO ROLLUP_ROTAS_BAIRRO (BAIRRO_ORIGEM, BAIRRO_DESTINO, QTD)
+    SELECT pe.BAIRRO, pd.BAIRRO, COUNT(*)
+    FROM VIAGEM v
+    JOIN PONTO_PARADA pe ON v.NOME_CODIGO_LINHA_EMBARQUE = pe.NOME_CODIGO_LINHA
+        AND v.NRO_PARADA_EMBARQUE = pe.NRO_PARADA
+    JOIN PONTO_PARADA pd ON v.NOME_CODIGO_LINHA_DESEMBARQUE = pd.NOME_CODIGO_LINHA
+        AND v.NRO_PARADA_DESEMBARQUE = pd.NRO_PARADA
+    WHERE pe.BAIRRO IS NOT NULL AND pd.BAIRRO IS NOT NULL
+    GROUP BY pe.BAIRRO, pd.BAIRRO;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER TRG_ROLLUPS_PONTO_BAIRRO
+    AFTER UPDATE OF BAIRRO ON PONTO_PARADA
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_rollups_ponto_bairro();
+
+SELECT reconstruir_rollups();
+
+ANALYZE ROLLUP_VIAGENS_LINHA;
+ANALYZE ROLLUP_ROTAS_BAIRRO;
+ANALYZE ROLLUP_VIAGENS_HORA;
@@ -0,0 +1,27 @@
+-- Avisa os processos com cache de dados de referencia (referencia.py) quando
+-- LINHA, EMPRESA_PUBLICA, PONTO_PARADA ou ONIBUS mudam. O payload e o nome da
+-- tabela, e o NOTIFY so e entregue no commit, entao o cache nunca ve uma
+-- alteracao que depois sofreu rollback.
+
+CREATE OR REPLACE FUNCTION trg_notificar_referencia() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('referencia', upper(TG_TABLE_NAME));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER TRG_REFERENCIA_LINHA
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON LINHA
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_notificar_referencia();
+
+CREATE TRIGGER TRG_REFERENCIA_EMPRESA_PUBLICA
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON EMPRESA_PUBLICA
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_notificar_referencia();
+
+CREATE TRIGGER TRG_REFERENCIA_PONTO_PARADA
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON PONTO_PARADA
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_notificar_referencia();
+
+CREATE TRIGGER TRG_REFERENCIA_ONIBUS
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON ONIBUS
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_notificar_referencia();
@@ -0,0 +1,7 @@
+-- As senhas passam a ser gravadas como hash PBKDF2 (autenticacao.py), no formato
+-- pbkdf2_sha256$<iteracoes>$<salt>$<hash>, que nao cabe com folga em VARCHAR(100).
+-- Senhas antigas em texto puro continuam validas e sao trocadas pelo hash no
+-- primeiro login. Aumentar o VARCHAR nao reescreve a tabela.
+
+ALTER TABLE USUARIO_CIDADAO ALTER COLUMN SENHA TYPE VARCHAR(255);
+ALTER TABLE USUARIO_GESTOR ALTER COLUMN SENHA TYPE VARCHAR(255);
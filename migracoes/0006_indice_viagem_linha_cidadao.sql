@@ -0,0 +1,8 @@
+-- Indice para "cidadaos que usaram todas as linhas de uma empresa" (Consulta 5):
+-- para cada linha da empresa, um index-only scan devolve os CPFs que embarcaram nela
+-- ja na ordem de (linha, cpf), sem ler o heap de VIAGEM
+
+CREATE INDEX IF NOT EXISTS IX_VIAGEM_LINHA_CIDADAO
+    ON VIAGEM (NOME_CODIGO_LINHA_EMBARQUE, CPF_CIDADAO);
+
+ANALYZE VIAGEM;
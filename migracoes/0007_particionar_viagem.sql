@@ -0,0 +1,201 @@
+-- VIAGEM passa a ser particionada por mes de DATAHORA_INICIO (viagem_AAAA_MM).
+-- Consultas com filtro de periodo so leem as particoes do intervalo, e apagar
+-- historico antigo vira DETACH/DROP de particao em vez de um DELETE gigante.
+-- A PK (CPF_CIDADAO, DATAHORA_INICIO) ja contem a chave de particao, entao o
+-- ON CONFLICT da ingestao continua valendo. Os triggers de rollup sao por comando
+-- e ficam na tabela pai, que aceita transition tables.
+
+LOCK TABLE VIAGEM IN ACCESS EXCLUSIVE MODE;
+
+-- PK e indices da tabela antiga saem antes para liberar os nomes
+DROP INDEX IX_VIAGEM_EMBARQUE, IX_VIAGEM_DESEMBARQUE, IX_VIAGEM_ONIBUS,
+           IX_VIAGEM_DATAHORA, IX_VIAGEM_LINHA_CIDADAO;
+ALTER TABLE VIAGEM DROP CONSTRAINT PK_VIAGEM;
+ALTER TABLE VIAGEM RENAME TO VIAGEM_ANTIGA;
+
+CREATE TABLE VIAGEM (
+    CPF_CIDADAO                    CHAR(11)      NOT NULL,
+    PLACA_ONIBUS                   VARCHAR(7)    NOT NULL,
+    DATAHORA_INICIO                TIMESTAMP     NOT NULL,
+    DATAHORA_FINAL                 TIMESTAMP,
+    CUSTO_TOTAL                    NUMERIC(8,2),
+    NOME_CODIGO_LINHA_EMBARQUE     VARCHAR(20)   NOT NULL,
+    NRO_PARADA_EMBARQUE            INTEGER       NOT NULL,
+    NOME_CODIGO_LINHA_DESEMBARQUE  VARCHAR(20)   NOT NULL,
+    NRO_PARADA_DESEMBARQUE         INTEGER       NOT NULL,
+
+    CONSTRAINT CK_VIAGEM_DATAS
+        CHECK (DATAHORA_FINAL IS NULL OR DATAHORA_FINAL > DATAHORA_INICIO),
+
+    CONSTRAINT CK_VIAGEM_CUSTO
+        CHECK (CUSTO_TOTAL IS NULL OR CUSTO_TOTAL >= 0)
+) PARTITION BY RANGE (DATAHORA_INICIO);
+
+-- Recebe viagens de meses ainda sem particao; criar_particao_viagem move essas
+-- linhas para a particao do mes quando ela e criada
+CREATE TABLE VIAGEM_PADRAO PARTITION OF VIAGEM DEFAULT;
+
+-- Cria a particao do mes (se ainda nao existir) e devolve o nome dela.
+-- CREATE + ATTACH em vez de PARTITION OF: o ATTACH segura a tabela pai com um lock
+-- mais fraco, entao a manutencao roda sem parar as leituras.
+CREATE OR REPLACE FUNCTION criar_particao_viagem(mes DATE) RETURNS TEXT AS $$
+DECLARE
+    inicio DATE := date_trunc('month', mes)::date;
+    fim    DATE := (date_trunc('month', mes) + INTERVAL '1 month')::date;
+    nome   TEXT := 'viagem_' || to_char(date_trunc('month', mes), 'YYYY_MM');
+BEGIN
+    IF to_regclass(nome) IS NOT NULL THEN
+        RETURN NULL;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE VIAGEM INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', nome);
+    -- Mover direto entre particoes nao dispara os triggers de rollup da tabela pai,
+    -- o que e o certo: as viagens ja estao contadas
+    EXECUTE format($sql$
+        WITH movidas AS (
+            DELETE FROM VIAGEM_PADRAO
+            WHERE DATAHORA_INICIO >= %L AND DATAHORA_INICIO < %L
+            RETURNING *
+        )
+        INSERT INTO %I SELECT * FROM movidas
+    $sql$, inicio, fim, nome);
+    EXECUTE format('ALTER TABLE VIAGEM ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   nome, inicio, fim);
+    RETURN nome;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Uma particao por mes de "de" ate "ate" (inclusive); devolve as criadas
+CREATE OR REPLACE FUNCTION criar_particoes_viagem(de DATE, ate DATE) RETURNS SETOF TEXT AS $$
+DECLARE
+    mes  DATE := date_trunc('month', de)::date;
+    nome TEXT;
+BEGIN
+    WHILE mes <= ate LOOP
+        nome := criar_particao_viagem(mes);
+        IF nome IS NOT NULL THEN
+            RETURN NEXT nome;
+        END IF;
+        mes := (mes + INTERVAL '1 month')::date;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Tira as viagens de uma particao dos rollups (mesmas agregacoes do trigger da 0003)
+CREATE OR REPLACE FUNCTION descontar_rollups_viagem(particao TEXT) RETURNS VOID AS $$
+BEGIN
+    EXECUTE format($sql$
+        INSERT INTO ROLLUP_VIAGENS_LINHA AS r (NOME_CODIGO_LINHA, QTD)
+        SELECT NOME_CODIGO_LINHA_EMBARQUE, -COUNT(*)
+        FROM %I
+        GROUP BY NOME_CODIGO_LINHA_EMBARQUE
+        ON CONFLICT (NOME_CODIGO_LINHA) DO UPDATE SET QTD = r.QTD + EXCLUDED.QTD
+    $sql$, particao);
+
+    EXECUTE format($sql$
+        INSERT INTO ROLLUP_ROTAS_BAIRRO AS r (BAIRRO_ORIGEM, BAIRRO_DESTINO, QTD)
+        SELECT pe.BAIRRO, pd.BAIRRO, -COUNT(*)
+        FROM %I v
+        JOIN PONTO_PARADA pe ON v.NOME_CODIGO_LINHA_EMBARQUE = pe.NOME_CODIGO_LINHA
+            AND v.NRO_PARADA_EMBARQUE = pe.NRO_PARADA
+        JOIN PONTO_PARADA pd ON v.NOME_CODIGO_LINHA_DESEMBARQUE = pd.NOME_CODIGO_LINHA
+            AND v.NRO_PARADA_DESEMBARQUE = pd.NRO_PARADA
+        WHERE pe.BAIRRO IS NOT NULL AND pd.BAIRRO IS NOT NULL
+        GROUP BY pe.BAIRRO, pd.BAIRRO
+        ON CONFLICT (BAIRRO_ORIGEM, BAIRRO_DESTINO) DO UPDATE SET QTD = r.QTD + EXCLUDED.QTD
+    $sql$, particao);
+
+    EXECUTE format($sql$
+        INSERT INTO ROLLUP_VIAGENS_HORA AS r (HORA, QTD)
+        SELECT EXTRACT(HOUR FROM DATAHORA_INICIO)::SMALLINT, -COUNT(*)
+        FROM %I
+        GROUP BY 1
+        ON CONFLICT (HORA) DO UPDATE SET QTD = r.QTD + EXCLUDED.QTD
+    $sql$, particao);
+
+    DELETE FROM ROLLUP_VIAGENS_LINHA WHERE QTD <= 0;
+    DELETE FROM ROLLUP_ROTAS_BAIRRO WHERE QTD <= 0;
+    DELETE FROM ROLLUP_VIAGENS_HORA WHERE QTD <= 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Desanexa as particoes mensais que terminam ate "antes_de" e devolve os nomes.
+-- As tabelas continuam existindo (arquivo); os rollups deixam de conta-las.
+CREATE OR REPLACE FUNCTION desanexar_particoes_viagem(antes_de DATE) RETURNS SETOF TEXT AS $$
+DECLARE
+    particao TEXT;
+BEGIN
+    FOR particao IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'viagem'::regclass
+          AND c.relname ~ '^viagem_[0-9]{4}_[0-9]{2}$'
+          AND to_date(substr(c.relname, 8), 'YYYY_MM') + INTERVAL '1 month' <= antes_de
+        ORDER BY c.relname
+    LOOP
+        -- Sem escritas na particao entre o desconto nos rollups e o DETACH
+        EXECUTE format('LOCK TABLE %I IN ACCESS EXCLUSIVE MODE', particao);
+        PERFORM descontar_rollups_viagem(particao);
+        EXECUTE format('ALTER TABLE VIAGEM DETACH PARTITION %I', particao);
+        RETURN NEXT particao;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Particoes do primeiro mes com viagens ate 3 meses a frente; depois disso o
+-- particoes.py (na inicializacao do app ou agendado) mantem a folga
+SELECT criar_particoes_viagem(
+    COALESCE((SELECT min(DATAHORA_INICIO) FROM VIAGEM_ANTIGA)::date, CURRENT_DATE),
+    (CURRENT_DATE + INTERVAL '3 months')::date
+);
+
+-- Copia sem PK, indices nem triggers (os rollups ja contam essas viagens)
+INSERT INTO VIAGEM SELECT * FROM VIAGEM_ANTIGA;
+DROP TABLE VIAGEM_ANTIGA;
+
+-- Criados na tabela pai, valem para as particoes atuais e futuras
+ALTER TABLE VIAGEM ADD CONSTRAINT PK_VIAGEM
+    PRIMARY KEY (CPF_CIDADAO, DATAHORA_INICIO);
+
+CREATE INDEX IX_VIAGEM_EMBARQUE
+    ON VIAGEM (NOME_CODIGO_LINHA_EMBARQUE, NRO_PARADA_EMBARQUE);
+CREATE INDEX IX_VIAGEM_DESEMBARQUE
+    ON VIAGEM (NOME_CODIGO_LINHA_DESEMBARQUE, NRO_PARADA_DESEMBARQUE);
+CREATE INDEX IX_VIAGEM_ONIBUS ON VIAGEM (PLACA_ONIBUS);
+CREATE INDEX IX_VIAGEM_DATAHORA ON VIAGEM (DATAHORA_INICIO);
+CREATE INDEX IX_VIAGEM_LINHA_CIDADAO
+    ON VIAGEM (NOME_CODIGO_LINHA_EMBARQUE, CPF_CIDADAO);
+
+ALTER TABLE VIAGEM ADD CONSTRAINT FK_VIAGEM_CIDADAO
+    FOREIGN KEY (CPF_CIDADAO)
+    REFERENCES USUARIO_CIDADAO (CPF);
+
+ALTER TABLE VIAGEM ADD CONSTRAINT FK_VIAGEM_ONIBUS
+    FOREIGN KEY (PLACA_ONIBUS)
+    REFERENCES ONIBUS (PLACA);
+
+ALTER TABLE VIAGEM ADD CONSTRAINT FK_VIAGEM_PONTO_EMBARQUE
+    FOREIGN KEY (NOME_CODIGO_LINHA_EMBARQUE, NRO_PARADA_EMBARQUE)
+    REFERENCES PONTO_PARADA (NOME_CODIGO_LINHA, NRO_PARADA);
+
+ALTER TABLE VIAGEM ADD CONSTRAINT FK_VIAGEM_PONTO_DESEMBARQUE
+    FOREIGN KEY (NOME_CODIGO_LINHA_DESEMBARQUE, NRO_PARADA_DESEMBARQUE)
+    REFERENCES PONTO_PARADA (NOME_CODIGO_LINHA, NRO_PARADA);
+
+CREATE TRIGGER TRG_ROLLUPS_VIAGEM_INSERT
+    AFTER INSERT ON VIAGEM
+    REFERENCING NEW TABLE AS viagens_novas
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_rollups_viagem();
+
+CREATE TRIGGER TRG_ROLLUPS_VIAGEM_UPDATE
+    AFTER UPDATE ON VIAGEM
+    REFERENCING OLD TABLE AS viagens_antigas NEW TABLE AS viagens_novas
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_rollups_viagem();
+
+CREATE TRIGGER TRG_ROLLUPS_VIAGEM_DELETE
+    AFTER DELETE ON VIAGEM
+    REFERENCING OLD TABLE AS viagens_antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_rollups_viagem();
+
+ANALYZE VIAGEM;
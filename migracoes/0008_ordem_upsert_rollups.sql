@@ -0,0 +1,98 @@
+-- Os upserts dos rollups travam as linhas na ordem em que o SELECT as entrega. Sem ORDER BY
+-- essa e a ordem do HashAggregate, e dois escritores concorrentes (dois lotes da ingestao,
+-- ou ingestao e gerador) podiam travar as mesmas linhas em ordens opostas e entrar em
+-- deadlock. Ordenando pela chave do ON CONFLICT, todos travam na mesma ordem.
+
+CREATE OR REPLACE FUNCTION trg_rollups_viagem() RETURNS TRIGGER AS $$
+DECLARE
+    origem TEXT;
+    sinal  INTEGER;
+BEGIN
+    FOR origem, sinal IN
+        SELECT t.origem, t.sinal
+        FROM (VALUES ('viagens_antigas', -1), ('viagens_novas', 1)) AS t(origem, sinal)
+        WHERE (t.sinal < 0 AND TG_OP IN ('DELETE', 'UPDATE'))
+           OR (t.sinal > 0 AND TG_OP IN ('INSERT', 'UPDATE'))
+    LOOP
+        EXECUTE format($sql$
+            INSERT INTO ROLLUP_VIAGENS_LINHA AS r (NOME_CODIGO_LINHA, QTD)
+            SELECT NOME_CODIGO_LINHA_EMBARQUE, $1 * COUNT(*)
+            FROM %I
+            GROUP BY NOME_CODIGO_LINHA_EMBARQUE
+            ORDER BY NOME_CODIGO_LINHA_EMBARQUE
+            ON CONFLICT (NOME_CODIGO_LINHA) DO UPDATE SET QTD = r.QTD + EXCLUDED.QTD
+        $sql$, origem) USING sinal;
+
+        EXECUTE format($sql$
+            INSERT INTO ROLLUP_ROTAS_BAIRRO AS r (BAIRRO_ORIGEM, BAIRRO_DESTINO, QTD)
+            SELECT pe.BAIRRO, pd.BAIRRO, $1 * COUNT(*)
+            FROM %I v
+            JOIN PONTO_PARADA pe ON v.NOME_CODIGO_LINHA_EMBARQUE = pe.NOME_CODIGO_LINHA
+                AND v.NRO_PARADA_EMBARQUE = pe.NRO_PARADA
+            JOIN PONTO_PARADA pd ON v.NOME_CODIGO_LINHA_DESEMBARQUE = pd.NOME_CODIGO_LINHA
+                AND v.NRO_PARADA_DESEMBARQUE = pd.NRO_PARADA
+            WHERE pe.BAIRRO IS NOT NULL AND pd.BAIRRO IS NOT NULL
+            GROUP BY pe.BAIRRO, pd.BAIRRO
+            ORDER BY pe.BAIRRO, pd.BAIRRO
+            ON CONFLICT (BAIRRO_ORIGEM, BAIRRO_DESTINO) DO UPDATE SET QTD = r.QTD + EXCLUDED.QTD
+        $sql$, origem) USING sinal;
+
+        EXECUTE format($sql$
+            INSERT INTO ROLLUP_VIAGENS_HORA AS r (HORA, QTD)
+            SELECT EXTRACT(HOUR FROM DATAHORA_INICIO)::SMALLINT, $1 * COUNT(*)
+            FROM %I
+            GROUP BY 1
+            ORDER BY 1
+            ON CONFLICT (HORA) DO UPDATE SET QTD = r.QTD + EXCLUDED.QTD
+        $sql$, origem) USING sinal;
+    END LOOP;
+
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        DELETE FROM ROLLUP_VIAGENS_LINHA WHERE QTD <= 0;
+        DELETE FROM ROLLUP_ROTAS_BAIRRO WHERE QTD <= 0;
+        DELETE FROM ROLLUP_VIAGENS_HORA WHERE QTD <= 0;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION descontar_rollups_viagem(particao TEXT) RETURNS VOID AS $$
+BEGIN
+    EXECUTE format($sql$
+        INSERT INTO ROLLUP_VIAGENS_LINHA AS r (NOME_CODIGO_LINHA, QTD)
+        SELECT NOME_CODIGO_LINHA_EMBARQUE, -COUNT(*)
+        FROM %I
+        GROUP BY NOME_CODIGO_LINHA_EMBARQUE
+        ORDER BY NOME_CODIGO_LINHA_EMBARQUE
+        ON CONFLICT (NOME_CODIGO_LINHA) DO UPDATE SET QTD = r.QTD + EXCLUDED.QTD
+    $sql$, particao);
+
+    EXECUTE format($sql$
+        INSERT INTO ROLLUP_ROTAS_BAIRRO AS r (BAIRRO_ORIGEM, BAIRRO_DESTINO, QTD)
+        SELECT pe.BAIRRO, pd.BAIRRO, -COUNT(*)
+        FROM %I v
+        JOIN PONTO_PARADA pe ON v.NOME_CODIGO_LINHA_EMBARQUE = pe.NOME_CODIGO_LINHA
+            AND v.NRO_PARADA_EMBARQUE = pe.NRO_PARADA
+        JOIN PONTO_PARADA pd ON v.NOME_CODIGO_LINHA_DESEMBARQUE = pd.NOME_CODIGO_LINHA
+            AND v.NRO_PARADA_DESEMBARQUE = pd.NRO_PARADA
+        WHERE pe.BAIRRO IS NOT NULL AND pd.BAIRRO IS NOT NULL
+        GROUP BY pe.BAIRRO, pd.BAIRRO
+        ORDER BY pe.BAIRRO, pd.BAIRRO
+        ON CONFLICT (BAIRRO_ORIGEM, BAIRRO_DESTINO) DO UPDATE SET QTD = r.QTD + EXCLUDED.QTD
+    $sql$, particao);
+
+    EXECUTE format($sql$
+        INSERT INTO ROLLUP_VIAGENS_HORA AS r (HORA, QTD)
+        SELECT EXTRACT(HOUR FROM DATAHORA_INICIO)::SMALLINT, -COUNT(*)
+        FROM %I
+        GROUP BY 1
+        ORDER BY 1
+        ON CONFLICT (HORA) DO UPDATE SET QTD = r.QTD + EXCLUDED.QTD
+    $sql$, particao);
+
+    DELETE FROM ROLLUP_VIAGENS_LINHA WHERE QTD <= 0;
+    DELETE FROM ROLLUP_ROTAS_BAIRRO WHERE QTD <= 0;
+    DELETE FROM ROLLUP_VIAGENS_HORA WHERE QTD <= 0;
+END;
+$$ LANGUAGE plpgsql;
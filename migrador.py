@@ -0,0 +1,224 @@
+import hashlib
+import os
+import re
+import sys
+
+import consultas
+import db
+
+DIRETORIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migracoes")
+# Chave do advisory lock que impede duas instancias de aplicarem migracoes ao mesmo tempo
+CHAVE_LOCK = 7314001
+
+SQL_TABELA_MIGRACOES = """
+    CREATE TABLE IF NOT EXISTS SCHEMA_MIGRACOES (
+        VERSAO      INTEGER      NOT NULL,
+        NOME        VARCHAR(200) NOT NULL,
+        CHECKSUM    CHAR(32)     NOT NULL,
+        APLICADA_EM TIMESTAMP    NOT NULL DEFAULT now(),
+
+        CONSTRAINT PK_SCHEMA_MIGRACOES PRIMARY KEY (VERSAO)
+    )
+"""
+
+# Cada tela e o indice (ou indices) que o plano dela precisa usar
+VERIFICACOES = [
+    ("entrar_como_cidadao", consultas.SQL_CREDENCIAL_CIDADAO,
+     ("ana.silva@example.com",), ["uq_cidadao_email"]),
+    ("entrar_como_gestor", consultas.SQL_CREDENCIAL_GESTOR,
+     ("ricardo.mendes@test.com",), ["uq_gestor_email"]),
+    ("consultar_linhas_disponiveis", consultas.SQL_LINHAS_POR_BAIRRO,
+     ("Centro",), ["ix_ponto_bairro_trgm"]),
+    ("consultar_pontos_parada", consultas.SQL_PONTOS_PARADA,
+     ("Centro", "Rua XV de Novembro"), ["ix_ponto_bairro_trgm", "ix_ponto_rua_trgm"]),
+    ("listar_viagens_por_cpf", consultas.SQL_VIAGENS_POR_CPF,
+     ("11111111111",), ["pk_viagem"]),
+    ("listar_viagens_por_cpf (pagina)", consultas.SQL_VIAGENS_POR_CPF_PROXIMA,
+     ("11111111111", "infinity", 16, 0), ["pk_viagem"]),
+    ("total_gasto_por_cidadao", consultas.SQL_TOTAL_GASTO,
+     ("11111111111",), ["pk_viagem"]),
+    ("viagens_por_linha (direto)", consultas.SQL_VIAGENS_POR_LINHA_DIRETO,
+     (), ["ix_viagem_linha_cidadao"]),
+    ("rotas_mais_utilizadas (direto)", consultas.SQL_ROTAS_MAIS_UTILIZADAS_DIRETO,
+     (10,), ["ix_viagem_embarque", "ix_viagem_desembarque"]),
+    ("horarios_de_pico (direto)", consultas.SQL_HORARIOS_DE_PICO_DIRETO,
+     (), ["ix_viagem_datahora"]),
+    ("cidadaos_todas_as_linhas", consultas.SQL_CIDADAOS_TODAS_AS_LINHAS,
+     ("10101010000110", "", 3, 21), ["ix_viagem_linha_cidadao"]),
+]
+
+# Rollup lido pela tela e a agregacao equivalente sobre VIAGEM
+ROLLUPS = [
+    ("viagens_por_linha", consultas.SQL_VIAGENS_POR_LINHA,
+     consultas.SQL_VIAGENS_POR_LINHA_DIRETO, ()),
+    ("rotas_mais_utilizadas", consultas.SQL_ROTAS_MAIS_UTILIZADAS,
+     consultas.SQL_ROTAS_MAIS_UTILIZADAS_DIRETO, (2 ** 31 - 1,)),
+    ("horarios_de_pico", consultas.SQL_HORARIOS_DE_PICO,
+     consultas.SQL_HORARIOS_DE_PICO_DIRETO, ()),
+]
+
+def listar_migracoes(diretorio=DIRETORIO):
+    migracoes = []
+    for arquivo in sorted(os.listdir(diretorio)):
+        m = re.match(r"^(\d+)_(.+)\.sql$", arquivo)
+        if m:
+            migracoes.append((int(m.group(1)), m.group(2), os.path.join(diretorio, arquivo)))
+    return migracoes
+
+def ler_migracao(caminho):
+    with open(caminho, encoding="utf-8") as f:
+        sql = f.read()
+    return sql, hashlib.md5(sql.encode("utf-8")).hexdigest()
+
+def versoes_aplicadas(conn):
+    with conn.cursor() as cur:
+        cur.execute(SQL_TABELA_MIGRACOES)
+        cur.execute("SELECT VERSAO, CHECKSUM FROM SCHEMA_MIGRACOES")
+        aplicadas = dict(cur.fetchall())
+    conn.commit()
+    return aplicadas
+
+def aplicar(conn, diretorio=DIRETORIO):
+    aplicadas = versoes_aplicadas(conn)
+    novas = []
+
+    for versao, nome, caminho in listar_migracoes(diretorio):
+        if versao in aplicadas:
+            continue
+
+        sql, checksum = ler_migracao(caminho)
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(%s)", (CHAVE_LOCK,))
+                # Outra instancia pode ter aplicado enquanto esperavamos o lock
+                cur.execute("SELECT 1 FROM SCHEMA_MIGRACOES WHERE VERSAO = %s", (versao,))
+                if cur.fetchone():
+                    conn.rollback()
+                    continue
+
+                cur.execute(sql)
+                cur.execute(
+                    "INSERT INTO SCHEMA_MIGRACOES (VERSAO, NOME, CHECKSUM) VALUES (%s, %s, %s)",
+                    (versao, nome, checksum)
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        novas.append(f"{versao:04d}_{nome}")
+
+    return novas
+
+def status(conn, diretorio=DIRETORIO):
+    aplicadas = versoes_aplicadas(conn)
+    resultado = []
+    for versao, nome, caminho in listar_migracoes(diretorio):
+        _, checksum = ler_migracao(caminho)
+        aplicada = versao in aplicadas
+        alterada = aplicada and aplicadas[versao].strip() != checksum
+        resultado.append((versao, nome, aplicada, alterada))
+    return resultado
+
+def indices_do_plano(plano):
+    indices = set()
+    if "Index Name" in plano:
+        indices.add(plano["Index Name"])
+    for filho in plano.get("Plans", []):
+        indices |= indices_do_plano(filho)
+    return indices
+
+def indice_raiz(cur, nome):
+    # Em VIAGEM (particionada) o plano cita o indice de cada particao; o nome que
+    # interessa e o do indice da tabela pai
+    cur.execute(
+        """SELECT i.inhparent::regclass::text FROM pg_inherits i
+           WHERE i.inhrelid = to_regclass(%s)""",
+        (nome,)
+    )
+    row = cur.fetchone()
+    return indice_raiz(cur, row[0]) if row else nome
+
+def verificar_indices(conn):
+    resultado = []
+    with conn.cursor() as cur:
+        # Em bases pequenas o planner prefere seq scan; desligando-o vemos se o indice atende a consulta
+        cur.execute("SET LOCAL enable_seqscan = off")
+        for tela, sql, params, esperados in VERIFICACOES:
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plano = cur.fetchone()[0][0]["Plan"]
+            usados = {indice_raiz(cur, nome) for nome in indices_do_plano(plano)}
+            resultado.append((tela, esperados, sorted(usados), bool(usados & set(esperados))))
+    conn.rollback()
+    return resultado
+
+def normalizar(rows):
+    # EXTRACT devolve numeric e o rollup guarda smallint; a tela mostra os dois como int
+    return [tuple(v if isinstance(v, str) else int(v) for v in row) for row in rows]
+
+def conferir_rollups(conn):
+    resultado = []
+    with conn.cursor() as cur:
+        for tela, sql_rollup, sql_direto, params in ROLLUPS:
+            cur.execute(sql_rollup, params)
+            rollup = normalizar(cur.fetchall())
+            cur.execute(sql_direto, params)
+            direto = normalizar(cur.fetchall())
+            resultado.append((tela, rollup == direto, len(rollup), len(direto)))
+    conn.rollback()
+    return resultado
+
+def reconstruir_rollups(conn):
+    with conn.cursor() as cur:
+        cur.execute("LOCK TABLE VIAGEM IN SHARE ROW EXCLUSIVE MODE")
+        cur.execute("SELECT reconstruir_rollups()")
+    conn.commit()
+
+def executar_comando(conn, comando):
+    if comando == "aplicar":
+        novas = aplicar(conn)
+        for nome in novas:
+            print(f"aplicada: {nome}")
+        if not novas:
+            print("nenhuma migracao pendente")
+    elif comando == "status":
+        for versao, nome, aplicada, alterada in status(conn):
+            situacao = "aplicada" if aplicada else "pendente"
+            if alterada:
+                situacao += " (arquivo alterado depois de aplicado!)"
+            print(f"{versao:04d}_{nome}: {situacao}")
+    elif comando == "verificar":
+        falhas = 0
+        for tela, esperados, usados, ok in verificar_indices(conn):
+            print(f"{'OK   ' if ok else 'FALHA'} {tela}: esperado {'/'.join(esperados)}, "
+                  f"plano usa {', '.join(usados) or 'nenhum indice'}")
+            falhas += not ok
+        return 1 if falhas else 0
+    elif comando == "conferir-rollups":
+        falhas = 0
+        for tela, ok, linhas_rollup, linhas_direto in conferir_rollups(conn):
+            print(f"{'OK   ' if ok else 'FALHA'} {tela}: rollup {linhas_rollup} linhas, "
+                  f"VIAGEM {linhas_direto} linhas")
+            falhas += not ok
+        return 1 if falhas else 0
+    elif comando == "reconstruir-rollups":
+        reconstruir_rollups(conn)
+        print("rollups recalculados a partir de VIAGEM")
+    else:
+        print("uso: python3 migrador.py "
+              "[aplicar|status|verificar|conferir-rollups|reconstruir-rollups]")
+        return 2
+
+    return 0
+
+def main(argv):
+    comando = argv[0] if argv else "aplicar"
+
+    try:
+        with db.conexao() as conn:
+            return executar_comando(conn, comando)
+    finally:
+        db.fechar_pool()
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
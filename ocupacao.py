@@ -0,0 +1,171 @@
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from collections import defaultdict, namedtuple
+
+import consultas
+import db
+
+# Fracao da capacidade a partir da qual o onibus conta como cheio
+LIMIAR = float(os.getenv("OCUPACAO_LIMIAR", "0.8"))
+# Eventos trazidos por ida ao servidor no cursor nomeado
+ITERSIZE = 20000
+
+Onibus = namedtuple("Onibus", ["placa", "linha", "capacidade", "pico", "pico_em",
+                               "segundos_acima", "passageiros_medio"])
+Linha = namedtuple("Linha", ["linha", "onibus", "capacidade", "pico", "pico_em"])
+Hora = namedtuple("Hora", ["hora", "passageiros_medio", "utilizacao"])
+Relatorio = namedtuple("Relatorio", ["onibus", "linhas", "horas", "viagens", "limiar",
+                                     "inicio", "fim", "segundos"])
+
+def _distribuir(por_hora, inicio, fim, peso):
+    # Soma peso * segundos em cada hora do dia coberta por [inicio, fim)
+    while inicio < fim:
+        trecho = min(fim, (inicio // 3600 + 1) * 3600) - inicio
+        por_hora[inicio // 3600 % 24] += peso * trecho
+        inicio += trecho
+
+def _data_hora(segundos):
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=segundos)
+
+def calcular(conn, de=None, ate=None, limiar=LIMIAR):
+    # Um sweep sobre os eventos ja ordenados pelo banco (O(n log n) no ORDER BY, O(n) aqui):
+    # a cada evento so mudam os contadores do onibus, da linha dele e da frota
+    inicio_calculo = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute(consultas.SQL_CAPACIDADE_ONIBUS)
+        frota = {placa: (linha, capacidade) for placa, linha, capacidade in cur.fetchall()}
+
+    a_bordo = defaultdict(int)
+    ultimo = {}
+    pico = defaultdict(int)
+    pico_em = {}
+    acima = defaultdict(int)
+    passageiro_segundos = defaultdict(int)
+    primeiro = {}
+
+    a_bordo_linha = defaultdict(int)
+    pico_linha = defaultdict(int)
+    pico_linha_em = {}
+
+    a_bordo_frota = 0
+    ultimo_frota = None
+    inicio_frota = None
+    por_hora = [0] * 24
+    viagens = 0
+
+    with conn.cursor(name="eventos_ocupacao") as cur:
+        cur.itersize = ITERSIZE
+        cur.execute(consultas.SQL_EVENTOS_OCUPACAO,
+                    {"de": de or "-infinity", "ate": ate or "infinity"})
+        for instante, delta, placa in cur:
+            linha, capacidade = frota[placa]
+
+            anterior = ultimo.get(placa)
+            if anterior is None:
+                primeiro[placa] = instante
+            elif a_bordo[placa]:
+                decorrido = instante - anterior
+                passageiro_segundos[placa] += a_bordo[placa] * decorrido
+                if capacidade and a_bordo[placa] >= limiar * capacidade:
+                    acima[placa] += decorrido
+            ultimo[placa] = instante
+
+            if ultimo_frota is None:
+                inicio_frota = instante
+            elif a_bordo_frota:
+                _distribuir(por_hora, ultimo_frota, instante, a_bordo_frota)
+            ultimo_frota = instante
+
+            a_bordo[placa] += delta
+            a_bordo_linha[linha] += delta
+            a_bordo_frota += delta
+            if delta > 0:
+                viagens += 1
+                if a_bordo[placa] > pico[placa]:
+                    pico[placa] = a_bordo[placa]
+                    pico_em[placa] = instante
+                if a_bordo_linha[linha] > pico_linha[linha]:
+                    pico_linha[linha] = a_bordo_linha[linha]
+                    pico_linha_em[linha] = instante
+    conn.rollback()
+
+    onibus = []
+    for placa, maximo in pico.items():
+        linha, capacidade = frota[placa]
+        ativo = ultimo[placa] - primeiro[placa]
+        onibus.append(Onibus(placa, linha, capacidade, maximo, _data_hora(pico_em[placa]),
+                             acima[placa],
+                             passageiro_segundos[placa] / ativo if ativo else 0.0))
+    onibus.sort(key=lambda o: (-(o.pico / o.capacidade if o.capacidade else 0), o.placa))
+
+    capacidade_linha = defaultdict(int)
+    onibus_linha = defaultdict(int)
+    for placa, (linha, capacidade) in frota.items():
+        capacidade_linha[linha] += capacidade
+        onibus_linha[linha] += 1
+    linhas = sorted((Linha(linha, onibus_linha[linha], capacidade_linha[linha], maximo,
+                           _data_hora(pico_linha_em[linha]))
+                     for linha, maximo in pico_linha.items()),
+                    key=lambda l: (-l.pico, l.linha))
+
+    # Curva por hora do dia: media de passageiros a bordo na frota toda, e essa media sobre
+    # a capacidade somada dos onibus que aparecem no periodo
+    horas = []
+    if inicio_frota is not None:
+        segundos_por_hora = [0] * 24
+        _distribuir(segundos_por_hora, inicio_frota, ultimo_frota, 1)
+        capacidade_frota = sum(frota[o.placa][1] for o in onibus)
+        for hora in range(24):
+            media = por_hora[hora] / segundos_por_hora[hora] if segundos_por_hora[hora] else 0.0
+            horas.append(Hora(hora, media, media / capacidade_frota if capacidade_frota else 0.0))
+
+    return Relatorio(
+        onibus, linhas, horas, viagens, limiar,
+        _data_hora(inicio_frota) if inicio_frota is not None else None,
+        _data_hora(ultimo_frota) if ultimo_frota is not None else None,
+        time.perf_counter() - inicio_calculo,
+    )
+
+def para_json(relatorio):
+    return {
+        "viagens": relatorio.viagens,
+        "limiar": relatorio.limiar,
+        "inicio": relatorio.inicio.isoformat() if relatorio.inicio else None,
+        "fim": relatorio.fim.isoformat() if relatorio.fim else None,
+        "segundos": round(relatorio.segundos, 3),
+        "onibus": [dict(o._asdict(), pico_em=o.pico_em.isoformat(),
+                        passageiros_medio=round(o.passageiros_medio, 3))
+                   for o in relatorio.onibus],
+        "linhas": [dict(l._asdict(), pico_em=l.pico_em.isoformat()) for l in relatorio.linhas],
+        "horas": [{"hora": h.hora, "passageiros_medio": round(h.passageiros_medio, 3),
+                   "utilizacao": round(h.utilizacao, 5)} for h in relatorio.horas],
+    }
+
+def _data(valor):
+    try:
+        return datetime.date.fromisoformat(valor)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data invalida: {valor} (use AAAA-MM-DD)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ocupacao da frota (sweep sobre as viagens)")
+    parser.add_argument("--de", type=_data, help="inicio do periodo (inclusive)")
+    parser.add_argument("--ate", type=_data, help="fim do periodo (exclusivo)")
+    parser.add_argument("--limiar", type=float, default=LIMIAR,
+                        help="fracao da capacidade considerada cheia (padrao 0.8)")
+    args = parser.parse_args(argv)
+
+    try:
+        with db.conexao(timeout_ms=0) as conn:
+            relatorio = calcular(conn, args.de, args.ate, args.limiar)
+    finally:
+        db.fechar_pool()
+    print(json.dumps(para_json(relatorio), ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import readchar
+from rich import box
+from rich.table import Table
+
+import consultas
+import db
+import preparadas
+
+# Linhas da tela que nao sao da tabela: titulo, cabecalho, bordas e rodape
+LINHAS_FIXAS = 9
+# Linhas lidas por vez ao procurar um texto fora da janela visivel
+BLOCO_BUSCA = 500
+
+class FonteLista:
+    # Linhas que ja estao em memoria (ex.: cache de referencia)
+    def __init__(self, rows):
+        self.rows = rows
+
+    def total(self):
+        return len(self.rows)
+
+    def janela(self, inicio, quantidade):
+        return self.rows[inicio:inicio + quantidade]
+
+    def fechar(self):
+        pass
+
+class FonteKeyset:
+    # Paginas por keyset: constante e o nome da consulta em consultas.py, que recebe
+    # params + (depois_de, limite, offset) e ordena pela primeira coluna, unica (crescente ou
+    # decrescente, conforme a comparacao com depois_de); as registradas em preparadas.py vao
+    # por EXECUTE. Abrir nao le a tabela inteira; a chave de cada BLOCO_BUSCA-esima linha fica
+    # guardada, entao qualquer janela custa no maximo um OFFSET menor que BLOCO_BUSCA.
+    # Cada leitura pega uma conexao do pool e a devolve antes de a tela esperar a tecla.
+    def __init__(self, constante, params=(), inicio=""):
+        self.constante = constante
+        self.params = tuple(params)
+        self.marcos = {0: inicio}
+        self._total = None
+
+    def total(self):
+        return self._total
+
+    def _ler(self, posicao, quantidade):
+        base = max(m for m in self.marcos if m <= posicao)
+        parametros = self.params + (self.marcos[base], quantidade, posicao - base)
+        with db.conexao() as conn, conn.cursor() as cur:
+            if self.constante in preparadas.CONSULTAS:
+                preparadas.executar(cur, self.constante, parametros)
+            else:
+                cur.execute(getattr(consultas, self.constante), parametros)
+            rows = cur.fetchall()
+        for i, row in enumerate(rows):
+            if (posicao + i + 1) % BLOCO_BUSCA == 0:
+                self.marcos[posicao + i + 1] = row[0]
+        if len(rows) < quantidade:
+            self._total = posicao + len(rows)
+        return rows
+
+    def janela(self, inicio, quantidade):
+        # Avanca de bloco em bloco ate o marco mais proximo antes de inicio
+        while max(self.marcos) + BLOCO_BUSCA <= inicio and self._total is None:
+            base = max(self.marcos)
+            if not self._ler(base, BLOCO_BUSCA):
+                break
+        if self._total is not None and inicio >= self._total:
+            return []
+        return self._ler(inicio, quantidade)
+
+    def fechar(self):
+        pass
+
+class Paginador:
+    # colunas: lista de (titulo, opcoes do add_column); formatar: row -> celulas da tabela
+    def __init__(self, console, titulo, colunas, fonte, formatar=None, estilo="cyan"):
+        self.console = console
+        self.titulo = titulo
+        self.colunas = colunas
+        self.fonte = fonte
+        self.formatar = formatar or (lambda row: [str(v) for v in row])
+        self.estilo = estilo
+        self.inicio = 0
+        self.rows = []
+        self.termo = None
+        self.destaque = None
+        self.mensagem = None
+
+    def altura(self):
+        return max(3, self.console.size.height - LINHAS_FIXAS)
+
+    def carregar(self, inicio):
+        total = self.fonte.total()
+        if total is not None:
+            inicio = min(inicio, max(0, total - self.altura()))
+        inicio = max(0, inicio)
+        rows = self.fonte.janela(inicio, self.altura())
+        if rows or inicio == 0:
+            self.inicio, self.rows = inicio, rows
+        return bool(rows)
+
+    def texto_da_linha(self, row):
+        return " ".join(str(v) for v in self.formatar(row)).lower()
+
+    def buscar(self, termo, a_partir_de):
+        # Le em blocos da posicao ate o fim e depois do inicio ate a posicao; devolve o indice
+        termo = termo.lower()
+        for inicio, fim in ((a_partir_de, None), (0, a_partir_de)):
+            posicao = inicio
+            while fim is None or posicao < fim:
+                quantidade = BLOCO_BUSCA if fim is None else min(BLOCO_BUSCA, fim - posicao)
+                bloco = self.fonte.janela(posicao, quantidade)
+                for i, row in enumerate(bloco):
+                    if termo in self.texto_da_linha(row):
+                        return posicao + i
+                if len(bloco) < quantidade:
+                    break
+                posicao += len(bloco)
+        return None
+
+    def ir_para_resultado(self, termo, a_partir_de):
+        encontrado = self.buscar(termo, a_partir_de)
+        if encontrado is None:
+            self.mensagem = f"[yellow]'{termo}' nao encontrado[/yellow]"
+            return
+        self.termo = termo
+        self.destaque = encontrado
+        if not self.inicio <= encontrado < self.inicio + len(self.rows):
+            self.carregar(encontrado)
+
+    def montar(self):
+        total = self.fonte.total()
+        fim = self.inicio + len(self.rows)
+        contagem = f"{self.inicio + 1}-{fim} de {total if total is not None else '?'}" \
+            if self.rows else "vazio"
+        table = Table(title=f"{self.titulo}  [dim]({contagem})[/dim]",
+                    title_style=f"bold {self.estilo}",
+                    box=box.ROUNDED,
+                    border_style=self.estilo)
+        for titulo, opcoes in self.colunas:
+            table.add_column(titulo, **opcoes)
+        for i, row in enumerate(self.rows):
+            estilo = "black on cyan" if self.inicio + i == self.destaque else None
+            table.add_row(*self.formatar(row), style=estilo)
+        return table
+
+    def desenhar(self):
+        self.console.clear()
+        self.console.print(self.montar())
+        if self.mensagem:
+            self.console.print(self.mensagem)
+            self.mensagem = None
+        self.console.print("[dim]setas rolam    PgUp/PgDn ou <-/-> pagina    Home/End inicio/fim    "
+                           "/ busca    n proxima    : ir para linha    Enter volta[/dim]")
+
+    def perguntar(self, rotulo):
+        return self.console.input(f"[cyan]{rotulo}[/cyan] ").strip()
+
+    def exibir(self):
+        try:
+            self.carregar(0)
+            while True:
+                self.desenhar()
+                key = readchar.readkey()
+                passo = max(1, len(self.rows))
+
+                if key == readchar.key.DOWN:
+                    self.carregar(self.inicio + 1)
+                elif key == readchar.key.UP:
+                    self.carregar(self.inicio - 1)
+                elif key in (readchar.key.PAGE_DOWN, readchar.key.RIGHT, ' '):
+                    self.carregar(self.inicio + passo)
+                elif key in (readchar.key.PAGE_UP, readchar.key.LEFT):
+                    self.carregar(self.inicio - passo)
+                elif key in (readchar.key.HOME, 'g'):
+                    self.carregar(0)
+                elif key in (readchar.key.END, 'G'):
+                    self.ir_para_fim()
+                elif key == '/':
+                    termo = self.perguntar("Buscar:")
+                    if termo:
+                        self.ir_para_resultado(termo, self.inicio)
+                elif key == 'n' and self.termo:
+                    inicio = self.destaque + 1 if self.destaque is not None else self.inicio
+                    self.ir_para_resultado(self.termo, inicio)
+                elif key == ':':
+                    numero = self.perguntar("Ir para a linha:")
+                    if numero.isdigit():
+                        self.destaque = int(numero) - 1
+                        self.carregar(self.destaque)
+                elif key in (readchar.key.ENTER, '\r', '\n', 'q'):
+                    break
+        finally:
+            self.fonte.fechar()
+
+    def ir_para_fim(self):
+        total = self.fonte.total()
+        if total is not None:
+            self.carregar(total - self.altura())
+            return
+        # Fonte sem total conhecido: le em blocos de BLOCO_BUSCA ate a fonte descobrir o fim
+        posicao = self.inicio
+        while self.fonte.total() is None and self.fonte.janela(posicao, BLOCO_BUSCA):
+            posicao += BLOCO_BUSCA
+        self.carregar((self.fonte.total() or 0) - self.altura())
+
+def paginar(console, titulo, colunas, fonte, formatar=None, estilo="cyan"):
+    Paginador(console, titulo, colunas, fonte, formatar, estilo).exibir()
@@ -0,0 +1,121 @@
+import argparse
+import datetime
+import os
+import sys
+
+import consultas
+import db
+
+# Meses a frente que ja devem ter particao (o resto cai em VIAGEM_PADRAO)
+MESES_FUTUROS = int(os.getenv("VIAGEM_MESES_FUTUROS", "3"))
+# Meses de historico mantidos anexados; 0 mantem tudo
+MESES_RETIDOS = int(os.getenv("VIAGEM_MESES_RETIDOS", "0"))
+
+SQL_PARTICOES = """
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::BIGINT,
+           pg_total_relation_size(c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'viagem'::regclass
+    ORDER BY c.relname
+"""
+
+# Telas com filtro de periodo: o plano de um mes so pode ler a particao desse mes
+VERIFICACOES_PODA = [
+    ("consulta2_historico_periodo", consultas.SQL_CONSULTA_2_HISTORICO_PERIODO,
+     lambda inicio, fim: ("11111111111", inicio, fim)),
+    ("horarios_de_pico (periodo)", consultas.SQL_HORARIOS_DE_PICO_PERIODO,
+     lambda inicio, fim: (inicio, fim)),
+]
+
+def inicio_do_mes(data, deslocamento=0):
+    mes = data.year * 12 + data.month - 1 + deslocamento
+    return datetime.date(mes // 12, mes % 12 + 1, 1)
+
+def criar_particoes(conn, de, ate):
+    with conn.cursor() as cur:
+        cur.execute("SELECT criar_particoes_viagem(%s, %s)", (de, ate))
+        criadas = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    return criadas
+
+def garantir_futuras(conn, meses=MESES_FUTUROS, hoje=None):
+    hoje = hoje or datetime.date.today()
+    return criar_particoes(conn, inicio_do_mes(hoje), inicio_do_mes(hoje, meses))
+
+def desanexar_antigas(conn, meses_retidos, apagar=False, hoje=None):
+    # Mantem o mes atual e os meses_retidos anteriores; o resto sai de VIAGEM
+    hoje = hoje or datetime.date.today()
+    limite = inicio_do_mes(hoje, -meses_retidos)
+    with conn.cursor() as cur:
+        cur.execute("SELECT desanexar_particoes_viagem(%s)", (limite,))
+        desanexadas = [row[0] for row in cur.fetchall()]
+        if apagar:
+            for nome in desanexadas:
+                cur.execute(f'DROP TABLE "{nome}"')
+    conn.commit()
+    return desanexadas
+
+def listar(conn):
+    with conn.cursor() as cur:
+        cur.execute(SQL_PARTICOES)
+        return cur.fetchall()
+
+def particoes_do_plano(plano):
+    lidas = set()
+    if plano.get("Relation Name", "").startswith("viagem_"):
+        lidas.add(plano["Relation Name"])
+    for filho in plano.get("Plans", []):
+        lidas |= particoes_do_plano(filho)
+    return lidas
+
+def verificar_poda(conn, hoje=None):
+    hoje = hoje or datetime.date.today()
+    inicio, fim = inicio_do_mes(hoje), inicio_do_mes(hoje, 1)
+    resultado = []
+    with conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM pg_inherits WHERE inhparent = 'viagem'::regclass")
+        total = cur.fetchone()[0]
+        for tela, sql, parametros in VERIFICACOES_PODA:
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, parametros(inicio, fim))
+            lidas = particoes_do_plano(cur.fetchone()[0][0]["Plan"])
+            resultado.append((tela, sorted(lidas), total, len(lidas) <= 1))
+    conn.rollback()
+    return resultado
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manutencao das particoes mensais de VIAGEM")
+    parser.add_argument("comando", nargs="?", default="manter",
+                        choices=["manter", "listar", "verificar"])
+    parser.add_argument("--meses-futuros", type=int, default=MESES_FUTUROS)
+    parser.add_argument("--reter-meses", type=int, default=MESES_RETIDOS,
+                        help="meses de historico mantidos em VIAGEM (0 = tudo)")
+    parser.add_argument("--apagar", action="store_true",
+                        help="apaga as particoes desanexadas em vez de guarda-las")
+    args = parser.parse_args(argv)
+
+    try:
+        with db.conexao() as conn:
+            if args.comando == "manter":
+                for nome in garantir_futuras(conn, args.meses_futuros):
+                    print(f"criada: {nome}")
+                if args.reter_meses > 0:
+                    for nome in desanexar_antigas(conn, args.reter_meses, args.apagar):
+                        print(f"{'apagada' if args.apagar else 'desanexada'}: {nome}")
+            elif args.comando == "listar":
+                for nome, limites, linhas, tamanho in listar(conn):
+                    print(f"{nome:18s} {limites:70s} ~{max(linhas, 0):>10} linhas "
+                          f"{tamanho / 2**20:9.1f} MB")
+            else:
+                falhas = 0
+                for tela, lidas, total, ok in verificar_poda(conn):
+                    print(f"{'OK   ' if ok else 'FALHA'} {tela}: le {len(lidas)} de {total} "
+                          f"particoes ({', '.join(lidas) or 'nenhuma'})")
+                    falhas += not ok
+                return 1 if falhas else 0
+    finally:
+        db.fechar_pool()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import os
+import re
+import threading
+import weakref
+from collections import namedtuple
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+# DB_PREPARED=0 desliga (ex.: PgBouncer em modo transaction, onde a sessao troca a cada
+# transacao); as consultas voltam a ir como texto, com o mesmo resultado
+ATIVO = os.getenv("DB_PREPARED", "1") != "0"
+
+# Consultas curtas das telas mais visitadas: o parse e o plano pesam tanto quanto a execucao.
+# O nome do PREPARE e o da constante em consultas.py em minusculas.
+CONSULTAS = (
+    "SQL_CREDENCIAL_CIDADAO",
+    "SQL_CREDENCIAL_GESTOR",
+    "SQL_VIAGENS_POR_CPF_PROXIMA",
+    "SQL_VIAGENS_POR_CPF_ANTERIOR",
+    "SQL_TOTAL_GASTO",
+    "SQL_LINHAS_POR_BAIRRO",
+    "SQL_PONTOS_PARADA",
+)
+
+Preparada = namedtuple("Preparada", ["nome", "sql", "prepare", "execute"])
+
+class Contagem:
+    def __init__(self):
+        self.acertos = 0
+        self.preparos = 0
+        self.perdidas = 0
+        self.texto = 0
+
+    def resumo(self):
+        usos = self.acertos + self.preparos
+        return {
+            "acertos": self.acertos,
+            "preparos": self.preparos,
+            "perdidas": self.perdidas,
+            "texto": self.texto,
+            "taxa_acerto": round(self.acertos / usos, 4) if usos else 0.0,
+        }
+
+_registro = None
+# Nomes ja preparados em cada conexao; conexao nova (reconexao do pool) comeca vazia
+_por_conexao = weakref.WeakKeyDictionary()
+_contagens = {}
+_lock = threading.Lock()
+
+def _posicional(sql):
+    # %s do psycopg2 -> $1, $2... do PREPARE
+    contador = iter(range(1, sql.count("%s") + 1))
+    return re.sub(r"%s", lambda _: f"${next(contador)}", sql), sql.count("%s")
+
+def registro():
+    # Montado no primeiro uso para evitar import circular com consultas.py
+    global _registro
+    if _registro is None:
+        import consultas
+        registro = {}
+        for constante in CONSULTAS:
+            original = getattr(consultas, constante)
+            sql, parametros = _posicional(original)
+            nome = constante.lower()
+            argumentos = f" ({', '.join(['%s'] * parametros)})" if parametros else ""
+            registro[constante] = Preparada(nome, original, f"PREPARE {nome} AS {sql}",
+                                            f"EXECUTE {nome}{argumentos}")
+        _registro = registro
+    return _registro
+
+def _contagem(constante):
+    contagem = _contagens.get(constante)
+    if contagem is None:
+        contagem = _contagens[constante] = Contagem()
+    return contagem
+
+def _preparar(cur, preparada):
+    cur.execute(preparada.prepare)
+    with _lock:
+        _por_conexao.setdefault(cur.connection, set()).add(preparada.nome)
+
+def executar(cur, constante, params=()):
+    # Executa a consulta registrada em cur como faria cur.execute(consultas.<constante>, params)
+    preparada = registro()[constante]
+    conn = cur.connection
+    if not ATIVO or cur.name is not None:
+        # Cursor nomeado vira DECLARE ... CURSOR FOR, que nao aceita EXECUTE
+        with _lock:
+            _contagem(constante).texto += 1
+        cur.execute(preparada.sql, params)
+        return
+
+    livre = conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    with _lock:
+        pronta = preparada.nome in _por_conexao.get(conn, ())
+        if pronta:
+            _contagem(constante).acertos += 1
+        else:
+            _contagem(constante).preparos += 1
+    if not pronta:
+        _preparar(cur, preparada)
+
+    try:
+        cur.execute(preparada.execute, params)
+    except psycopg2.errors.InvalidSqlStatementName:
+        # A sessao perdeu o PREPARE (DISCARD ALL, pooler trocou o backend). Sem transacao
+        # aberta antes do EXECUTE nada de quem chamou se perde: desfaz, prepara e repete.
+        with _lock:
+            _por_conexao.get(conn, set()).discard(preparada.nome)
+            contagem = _contagem(constante)
+            contagem.acertos -= 1
+            contagem.preparos += 1
+            contagem.perdidas += 1
+        if not livre:
+            raise
+        conn.rollback()
+        _preparar(cur, preparada)
+        cur.execute(preparada.execute, params)
+
+def resumo():
+    with _lock:
+        consultas = {constante: _contagem(constante).resumo() for constante in CONSULTAS}
+    acertos = sum(c["acertos"] for c in consultas.values())
+    usos = acertos + sum(c["preparos"] for c in consultas.values())
+    return {
+        "ativo": ATIVO,
+        "conexoes": len(_por_conexao),
+        "taxa_acerto": round(acertos / usos, 4) if usos else 0.0,
+        "consultas": consultas,
+    }
+
+def zerar():
+    with _lock:
+        _contagens.clear()
@@ -0,0 +1,271 @@
+import re
+import select
+import threading
+import time
+from collections import defaultdict
+
+import psycopg2
+
+import consultas
+import db
+
+CANAL = "referencia"
+# Espera curta depois do primeiro aviso para juntar rajadas (ex.: varios comandos numa carga)
+AGRUPAR_AVISOS = 0.05
+
+SQL_TABELAS = {
+    "LINHA": """
+        SELECT NOME_CODIGO, TARIFA, TEMPO_PERCURSO, ATIVO, CNPJ_EMPRESA_PUBLICA
+        FROM LINHA
+        ORDER BY NOME_CODIGO
+    """,
+    "EMPRESA_PUBLICA": "SELECT CNPJ, NOME FROM EMPRESA_PUBLICA",
+    "PONTO_PARADA": """
+        SELECT NOME_CODIGO_LINHA, NRO_PARADA, RUA, BAIRRO, NUMERO, CEP,
+               PRESENCA_COBERTURA, EH_ORIGEM, EH_DESTINO
+        FROM PONTO_PARADA
+        ORDER BY BAIRRO
+    """,
+    "ONIBUS": """
+        SELECT PLACA, NRO_PASSAGEIROS, ANO_FABRICACAO, ACESSIBILIDADE,
+               NOME_CODIGO_LINHA, HORARIO_INICIO, HORARIO_FINAL
+        FROM ONIBUS
+    """,
+}
+
+class Snapshot:
+    # Imutavel depois de montado: leitores pegam a referencia atual sem lock. A ordem das
+    # listagens vem do ORDER BY de SQL_TABELAS, na collation do banco (como as consultas
+    # que o cache substitui), e nao da ordem de codepoints do sorted() do Python.
+    def __init__(self, tabelas):
+        self.tabelas = tabelas
+        self.carregado_em = time.monotonic()
+
+        self.empresas = dict(tabelas["EMPRESA_PUBLICA"])
+        self.linhas = {row[0]: row for row in tabelas["LINHA"]}
+        self.ordem_linhas = {codigo: i for i, codigo in enumerate(self.linhas)}
+        self.ordem_bairros = {}
+        for row in tabelas["PONTO_PARADA"]:
+            if row[3] is not None:
+                self.ordem_bairros.setdefault(row[3], len(self.ordem_bairros))
+        self.onibus = {row[0]: row for row in tabelas["ONIBUS"]}
+
+        self.linhas_por_empresa = defaultdict(list)
+        for row in tabelas["LINHA"]:
+            self.linhas_por_empresa[row[4]].append(row[0])
+
+        self.onibus_por_linha = defaultdict(list)
+        for row in tabelas["ONIBUS"]:
+            self.onibus_por_linha[row[4]].append(row)
+
+        self.pontos_por_linha = defaultdict(list)
+        self.pontos_por_bairro = defaultdict(list)
+        self.pontos_por_rua = defaultdict(list)
+        for row in sorted(tabelas["PONTO_PARADA"], key=self.chave_ponto):
+            self.pontos_por_linha[row[0]].append(row)
+            if row[3] is not None:
+                self.pontos_por_bairro[row[3].lower()].append(row)
+            if row[2] is not None:
+                self.pontos_por_rua[row[2].lower()].append(row)
+
+    def chave_ponto(self, ponto):
+        # (linha, parada), como o ORDER BY NOME_CODIGO_LINHA, NRO_PARADA das consultas
+        return self.ordem_linhas.get(ponto[0], len(self.ordem_linhas)), ponto[1]
+
+    def linha_ativa(self, codigo):
+        linha = self.linhas.get(codigo)
+        if linha is None or linha[3] != 'S' or linha[4] not in self.empresas:
+            return None
+        return linha
+
+_snapshot = None
+_conexao = None
+_thread = None
+_parar = threading.Event()
+
+def _ler_tabelas(conn, nomes):
+    tabelas = {}
+    with conn.cursor() as cur:
+        for nome in nomes:
+            cur.execute(SQL_TABELAS[nome])
+            tabelas[nome] = cur.fetchall()
+    return tabelas
+
+def _conectar():
+    # Conexao propria e fora do pool: fica presa em LISTEN enquanto o processo viver
+    conn = db.com_backoff(lambda: psycopg2.connect(**db.parametros_conexao()))
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        # LISTEN antes da leitura: uma mudanca feita entre os dois ainda gera aviso
+        cur.execute(f"LISTEN {CANAL}")
+    return conn
+
+def ler_snapshot(conn):
+    # Todas as tabelas numa mesma foto, tanto na conexao do LISTEN (autocommit) quanto
+    # numa conexao do pool (transacao aberta pelo psycopg2 no primeiro comando)
+    with conn.cursor() as cur:
+        if conn.autocommit:
+            cur.execute("BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        else:
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+    try:
+        tabelas = _ler_tabelas(conn, SQL_TABELAS)
+    finally:
+        if conn.autocommit:
+            with conn.cursor() as cur:
+                cur.execute("COMMIT")
+        else:
+            conn.rollback()
+    return Snapshot(tabelas)
+
+def _carregar_tudo(conn):
+    global _snapshot
+    _snapshot = ler_snapshot(conn)
+
+def _recarregar(conn, nomes):
+    global _snapshot
+    tabelas = dict(_snapshot.tabelas)
+    tabelas.update(_ler_tabelas(conn, [n for n in nomes if n in SQL_TABELAS]))
+    _snapshot = Snapshot(tabelas)
+
+def _aguardar_avisos(conn):
+    if select.select([conn], [], [], 1.0) == ([], [], []):
+        return set()
+    conn.poll()
+    time.sleep(AGRUPAR_AVISOS)
+    conn.poll()
+    nomes = {aviso.payload for aviso in conn.notifies}
+    conn.notifies.clear()
+    return nomes
+
+def _escutar():
+    global _conexao, _snapshot
+    while not _parar.is_set():
+        try:
+            nomes = _aguardar_avisos(_conexao)
+            if nomes:
+                _recarregar(_conexao, nomes)
+        except psycopg2.Error:
+            # Sem LISTEN nao da para garantir consistencia: volta ao banco ate reconectar
+            _snapshot = None
+            try:
+                _conexao.close()
+            except psycopg2.Error:
+                pass
+            while not _parar.is_set():
+                try:
+                    _conexao = _conectar()
+                    _carregar_tudo(_conexao)
+                    break
+                except psycopg2.Error:
+                    _parar.wait(db.BACKOFF_MAXIMO)
+
+def iniciar():
+    global _conexao, _thread
+    if _thread is not None:
+        return
+    _parar.clear()
+    _conexao = _conectar()
+    _carregar_tudo(_conexao)
+    _thread = threading.Thread(target=_escutar, name="cache-referencia", daemon=True)
+    _thread.start()
+
+def parar():
+    global _conexao, _thread, _snapshot
+    _parar.set()
+    if _thread is not None:
+        _thread.join(timeout=2)
+    if _conexao is not None and not _conexao.closed:
+        _conexao.close()
+    _conexao = None
+    _thread = None
+    _snapshot = None
+
+def carregado():
+    return _snapshot is not None
+
+def atual():
+    # Snapshot em uso (None sem o cache); cada recarga troca o objeto inteiro
+    return _snapshot
+
+# Mesma semantica do ILIKE das consultas: sem curingas e so comparacao sem caixa
+def _chaves(indice, padrao):
+    if not any(c in padrao for c in "%_\\"):
+        return [padrao.lower()]
+
+    regex = []
+    escapado = False
+    for c in padrao:
+        if escapado:
+            regex.append(re.escape(c))
+            escapado = False
+        elif c == "\\":
+            escapado = True
+        elif c == "%":
+            regex.append(".*")
+        elif c == "_":
+            regex.append(".")
+        else:
+            regex.append(re.escape(c))
+    compilado = re.compile("".join(regex), re.IGNORECASE | re.DOTALL)
+    return [chave for chave in indice if compilado.fullmatch(chave)]
+
+def _pontos(indice, padrao):
+    pontos = []
+    for chave in _chaves(indice, padrao):
+        pontos.extend(indice.get(chave, ()))
+    return pontos
+
+def _do_banco(funcao, *args):
+    with db.conexao() as conn:
+        return funcao(conn, *args)
+
+def linhas_por_bairro(bairro):
+    snapshot = _snapshot
+    if snapshot is None:
+        return _do_banco(consultas.buscar_linhas_por_bairro, bairro)
+
+    rows = []
+    codigos = {p[0] for p in _pontos(snapshot.pontos_por_bairro, bairro)}
+    for codigo in sorted(codigos, key=lambda c: snapshot.ordem_linhas.get(c, -1)):
+        linha = snapshot.linha_ativa(codigo)
+        if linha is not None:
+            rows.append((codigo, linha[1], linha[2], snapshot.empresas[linha[4]]))
+    return rows
+
+def pontos_parada(bairro, rua):
+    snapshot = _snapshot
+    if snapshot is None:
+        return _do_banco(consultas.buscar_pontos_parada, bairro, rua)
+
+    ruas = set(_chaves(snapshot.pontos_por_rua, rua))
+    pontos = [p for p in _pontos(snapshot.pontos_por_bairro, bairro)
+              if p[2] is not None and p[2].lower() in ruas]
+    return sorted(pontos, key=snapshot.chave_ponto)
+
+def linhas_ativas():
+    snapshot = _snapshot
+    if snapshot is None:
+        return _do_banco(consultas.buscar_linhas_ativas)
+
+    rows = []
+    for codigo in snapshot.linhas:
+        linha = snapshot.linha_ativa(codigo)
+        if linha is not None:
+            rows.append((codigo, linha[1], linha[2], snapshot.empresas[linha[4]]))
+    return rows
+
+def linhas_e_bairros():
+    snapshot = _snapshot
+    if snapshot is None:
+        return _do_banco(consultas.buscar_linhas_e_bairros)
+
+    pares = set()
+    for codigo, linha in snapshot.linhas.items():
+        if linha[3] != 'S':
+            continue
+        for ponto in snapshot.pontos_por_linha.get(codigo, ()):
+            if ponto[3] is not None:
+                pares.add((codigo, ponto[3]))
+    return sorted(pares, key=lambda par: (snapshot.ordem_linhas[par[0]],
+                                          snapshot.ordem_bairros[par[1]]))
@@ -0,0 +1,200 @@
+import heapq
+import os
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+import db
+import referencia
+
+# Minutos para trocar de linha na mesma rua e andando ate outra rua do mesmo bairro
+TEMPO_BALDEACAO = float(os.getenv("ROTAS_TEMPO_BALDEACAO", "5"))
+TEMPO_BALDEACAO_BAIRRO = float(os.getenv("ROTAS_TEMPO_BALDEACAO_BAIRRO", "12"))
+# Linha sem TEMPO_PERCURSO: minutos entre uma parada e a seguinte
+MINUTOS_POR_PARADA = float(os.getenv("ROTAS_MINUTOS_POR_PARADA", "3"))
+# Sem o cache de referencia o grafo vem do banco e e reaproveitado por este prazo
+GRAFO_TTL = float(os.getenv("ROTAS_GRAFO_TTL", "60"))
+# Respostas guardadas por grafo; o grafo novo comeca vazio
+RESPOSTAS_MAX = 4096
+
+CRITERIOS = ("tempo", "tarifa")
+# Tabelas do cache de referencia que entram no grafo; recarga so de ONIBUS nao o refaz
+TABELAS = ("LINHA", "EMPRESA_PUBLICA", "PONTO_PARADA")
+
+Trecho = namedtuple("Trecho", ["linha", "embarque", "desembarque", "paradas", "minutos", "tarifa"])
+Rota = namedtuple("Rota", ["trechos", "minutos", "tarifa", "baldeacoes"])
+SEM_ROTA = Rota([], None, None, None)
+
+class Grafo:
+    # Vertices 0..n-1 sao paradas (estar dentro do onibus naquela parada); depois delas vem
+    # um vertice por rua e um por bairro, onde se desce para trocar de linha. Cada aresta
+    # e (destino, minutos, centavos); a tarifa e paga ao embarcar.
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.paradas = []
+        self.arestas = []
+        self.paradas_por_bairro = defaultdict(list)
+        self.nomes_bairros = {}
+        self._respostas = {}
+        self._lock = threading.Lock()
+
+        # Os onibus fazem o percurso nos dois sentidos: cada parada liga a anterior e a seguinte
+        tarifas = {}
+        for codigo, pontos in snapshot.pontos_por_linha.items():
+            linha = snapshot.linha_ativa(codigo)
+            if linha is None or not pontos:
+                continue
+            tarifas[codigo] = round(linha[1] * 100)
+            segmento = linha[2] / max(len(pontos) - 1, 1) if linha[2] else MINUTOS_POR_PARADA
+            for i, ponto in enumerate(pontos):
+                indice = len(self.paradas)
+                self.paradas.append(ponto)
+                vizinhas = []
+                if i > 0:
+                    vizinhas.append((indice - 1, segmento, 0))
+                if i + 1 < len(pontos):
+                    vizinhas.append((indice + 1, segmento, 0))
+                self.arestas.append(vizinhas)
+                if ponto[3] is not None:
+                    bairro = ponto[3].lower()
+                    self.paradas_por_bairro[bairro].append(indice)
+                    self.nomes_bairros.setdefault(bairro, ponto[3])
+
+        locais = {}
+        for indice, ponto in enumerate(self.paradas):
+            if ponto[3] is None:
+                continue
+            chaves = [(("bairro", ponto[3].lower()), TEMPO_BALDEACAO_BAIRRO)]
+            if ponto[2] is not None:
+                chaves.append((("rua", ponto[3].lower(), ponto[2].lower()), TEMPO_BALDEACAO))
+            for chave, minutos in chaves:
+                local = locais.get(chave)
+                if local is None:
+                    local = locais[chave] = len(self.arestas)
+                    self.arestas.append([])
+                self.arestas[indice].append((local, 0, 0))
+                self.arestas[local].append((indice, minutos, tarifas[ponto[0]]))
+        self.tarifas = tarifas
+
+    def bairros(self):
+        return sorted(self.nomes_bairros.values(), key=str.lower)
+
+    def planejar(self, origem, destino, criterio="tempo"):
+        # None se um dos bairros nao tem parada de linha ativa; SEM_ROTA se nao ha caminho
+        if criterio not in CRITERIOS:
+            raise ValueError(f"criterio deve ser um de {', '.join(CRITERIOS)}")
+        chave = (origem.lower(), destino.lower(), criterio)
+        with self._lock:
+            if chave in self._respostas:
+                return self._respostas[chave]
+
+        rota = self._dijkstra(*chave)
+        with self._lock:
+            if len(self._respostas) >= RESPOSTAS_MAX:
+                self._respostas.clear()
+            self._respostas[chave] = rota
+        return rota
+
+    def _dijkstra(self, origem, destino, criterio):
+        partidas = self.paradas_por_bairro.get(origem)
+        chegadas = set(self.paradas_por_bairro.get(destino, ()))
+        if not partidas or not chegadas:
+            return None
+        if origem == destino:
+            return Rota([], 0, 0, 0)
+
+        # Custo comparado como tupla: o criterio escolhido primeiro, o outro desempata
+        def custo(minutos, centavos):
+            return (minutos, centavos) if criterio == "tempo" else (centavos, minutos)
+
+        melhor = {}
+        anterior = {}
+        fila = []
+        for indice in partidas:
+            inicial = (0, self.tarifas[self.paradas[indice][0]])
+            melhor[indice] = inicial
+            anterior[indice] = None
+            heapq.heappush(fila, (custo(*inicial), indice))
+
+        while fila:
+            prioridade, vertice = heapq.heappop(fila)
+            minutos, centavos = melhor[vertice]
+            if prioridade != custo(minutos, centavos):
+                continue
+            if vertice in chegadas:
+                return self._montar(vertice, anterior, melhor)
+            for proximo, mais_minutos, mais_centavos in self.arestas[vertice]:
+                novo = (minutos + mais_minutos, centavos + mais_centavos)
+                conhecido = melhor.get(proximo)
+                if conhecido is None or custo(*novo) < custo(*conhecido):
+                    melhor[proximo] = novo
+                    anterior[proximo] = vertice
+                    heapq.heappush(fila, (custo(*novo), proximo))
+        return SEM_ROTA
+
+    def _montar(self, chegada, anterior, melhor):
+        # Volta pelo caminho so pelas paradas; cada sequencia na mesma linha vira um trecho
+        caminho = []
+        vertice = chegada
+        while vertice is not None:
+            if vertice < len(self.paradas):
+                caminho.append(vertice)
+            vertice = anterior[vertice]
+        caminho.reverse()
+
+        trechos = []
+        inicio = 0
+        for i in range(1, len(caminho) + 1):
+            if i < len(caminho) and abs(caminho[i] - caminho[i - 1]) == 1 \
+                    and self.paradas[caminho[i]][0] == self.paradas[caminho[i - 1]][0]:
+                continue
+            embarque, desembarque = caminho[inicio], caminho[i - 1]
+            linha = self.paradas[embarque][0]
+            trechos.append(Trecho(
+                linha,
+                self.paradas[embarque],
+                self.paradas[desembarque],
+                abs(desembarque - embarque),
+                melhor[desembarque][0] - melhor[embarque][0],
+                self.tarifas[linha] / 100,
+            ))
+            inicio = i
+
+        minutos, centavos = melhor[chegada]
+        return Rota(trechos, minutos, centavos / 100, len(trechos) - 1)
+
+_grafo = None
+_grafo_do_banco_em = 0.0
+_lock = threading.Lock()
+
+def _valido(candidato, snapshot):
+    if candidato is None:
+        return False
+    if snapshot is not None:
+        # A recarga troca so as listas das tabelas avisadas; as demais sao os mesmos objetos
+        return all(candidato.snapshot.tabelas[nome] is snapshot.tabelas[nome] for nome in TABELAS)
+    return time.monotonic() - _grafo_do_banco_em < GRAFO_TTL
+
+def grafo():
+    # Refeito so quando o cache de referencia recarrega uma das TABELAS
+    global _grafo, _grafo_do_banco_em
+    snapshot = referencia.atual()
+    atual = _grafo
+    if _valido(atual, snapshot):
+        return atual
+
+    with _lock:
+        if _valido(_grafo, snapshot):
+            return _grafo
+        if snapshot is None:
+            with db.conexao() as conn:
+                snapshot = referencia.ler_snapshot(conn)
+            _grafo_do_banco_em = time.monotonic()
+        _grafo = Grafo(snapshot)
+        return _grafo
+
+def planejar(origem, destino, criterio="tempo"):
+    return grafo().planejar(origem, destino, criterio)
+
+def bairros():
+    return grafo().bairros()
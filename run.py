@@ -1,9 +1,30 @@
+import os
 import subprocess
 import time
 import sys
 
+# Prazo para o banco aceitar conexoes; a espera termina assim que ele fica pronto
+ESPERA_BANCO = float(os.getenv("ESPERA_BANCO", "60"))
+INTERVALO = 0.2
+
+def banco_pronto():
+    # -h localhost testa o TCP, que so abre depois dos scripts de init-db terminarem
+    result = subprocess.run(['docker', 'exec', 'sistemaonibus_db',
+                             'pg_isready', '-q', '-h', 'localhost', '-d', 'sistemaonibus'],
+                            capture_output=True)
+    return result.returncode == 0
+
+def aguardar_banco():
+    limite = time.monotonic() + ESPERA_BANCO
+    while not banco_pronto():
+        if time.monotonic() >= limite:
+            return False
+        time.sleep(INTERVALO)
+    return True
 
 print("Iniciando Sistema de Onibus...")
+tempos = []
+inicio = time.perf_counter()
 
 result = subprocess.run(['docker', 'compose', 'up', '--build', '-d'],
                        capture_output=True, text=True)
@@ -11,7 +32,14 @@ result = subprocess.run(['docker', 'compose', 'up', '--build', '-d'],
 if result.returncode != 0:
     print(f"Erro: {result.stderr}")
     sys.exit(1)
+tempos.append(("docker compose up", time.perf_counter() - inicio))
+
+marca = time.perf_counter()
+if not aguardar_banco():
+    print(f"Erro: banco nao ficou pronto em {ESPERA_BANCO:.0f}s (veja 'docker compose logs postgres')")
+    sys.exit(1)
+tempos.append(("banco pronto", time.perf_counter() - marca))
 
-time.sleep(10)
+print("  ".join(f"{nome}: {segundos:.2f}s" for nome, segundos in tempos))
 
 subprocess.run(['docker', 'exec', '-it', 'sistemaonibus_app', 'python3', 'app.py'])
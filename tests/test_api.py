@@ -0,0 +1,33 @@
+import asyncio
+
+import pytest
+
+import api
+
+def ler(bruto):
+    async def ler_de_um_leitor():
+        reader = asyncio.StreamReader(limit=api.TAMANHO_MAXIMO_CABECALHO)
+        reader.feed_data(bruto)
+        reader.feed_eof()
+        return await api.ler_requisicao(reader), await reader.read()
+    return asyncio.run(ler_de_um_leitor())
+
+def test_corpo_pequeno_e_descartado_e_a_proxima_requisicao_fica_intacta():
+    requisicao, resto = ler(b"GET /saude HTTP/1.1\r\nContent-Length: 5\r\n\r\nabcdeGET /metricas")
+    assert requisicao[:3] == ("GET", "/saude", "HTTP/1.1")
+    assert resto == b"GET /metricas"
+
+def test_corpo_grande_demais_recebe_413_sem_ser_lido():
+    tamanho = api.TAMANHO_MAXIMO_CORPO + 1
+    with pytest.raises(api.ErroHttp) as erro:
+        ler(b"POST /saude HTTP/1.1\r\nContent-Length: %d\r\n\r\nabc" % tamanho)
+    assert erro.value.status == 413
+
+@pytest.mark.parametrize("tamanho", [b"-1", b"dez", b"1e9"])
+def test_content_length_invalido_recebe_400(tamanho):
+    with pytest.raises(api.ErroHttp) as erro:
+        ler(b"GET /saude HTTP/1.1\r\nContent-Length: " + tamanho + b"\r\n\r\n")
+    assert erro.value.status == 400
+
+def test_conexao_fechada_sem_requisicao():
+    assert ler(b"")[0] is None
@@ -0,0 +1,126 @@
+import pytest
+
+import autenticacao
+
+@pytest.fixture(autouse=True)
+def hash_barato(monkeypatch):
+    monkeypatch.setattr(autenticacao, "ITERACOES", 1000)
+
+@pytest.fixture
+def credenciais(monkeypatch, conexao_falsa, banco):
+    # email -> (cpf, senha armazenada) no lugar de USUARIO_CIDADAO; regravadas anota os rehash
+    usuarios = {}
+    regravadas = []
+    monkeypatch.setitem(autenticacao.BUSCAR_CREDENCIAL, "cidadao",
+                        lambda conn, email: usuarios.get(email))
+    monkeypatch.setitem(autenticacao.ATUALIZAR_SENHA, "cidadao",
+                        lambda conn, cpf, senha: regravadas.append((cpf, senha)))
+    conn = banco(conexao_falsa())
+    return usuarios, regravadas, conn
+
+@pytest.fixture
+def relogio(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(autenticacao.time, "monotonic", lambda: agora[0])
+    return agora
+
+def test_cache_despeja_o_usado_ha_mais_tempo(relogio):
+    cache = autenticacao.CacheTTL(2, 60)
+    cache.guardar("a", 1)
+    cache.guardar("b", 2)
+    assert cache.obter("a") == 1
+    cache.guardar("c", 3)
+    assert len(cache) == 2
+    assert cache.obter("b") is None
+    assert cache.obter("a") == 1
+    assert cache.obter("c") == 3
+
+def test_cache_regravar_atualiza_sem_crescer(relogio):
+    cache = autenticacao.CacheTTL(2, 60)
+    cache.guardar("a", 1)
+    cache.guardar("b", 2)
+    cache.guardar("a", 10)
+    cache.guardar("c", 3)
+    assert cache.obter("a") == 10
+    assert cache.obter("b") is None
+
+def test_cache_expira_pelo_ttl(relogio):
+    cache = autenticacao.CacheTTL(10, 60)
+    cache.guardar("a", 1)
+    relogio[0] += 59.9
+    assert cache.obter("a") == 1
+    relogio[0] += 0.1
+    assert cache.obter("a") is None
+    assert len(cache) == 0
+
+def test_cache_remover(relogio):
+    cache = autenticacao.CacheTTL(10, 60)
+    cache.guardar("a", 1)
+    cache.remover("a")
+    cache.remover("inexistente")
+    assert cache.obter("a") is None
+
+def test_hash_confere_so_com_a_senha_certa():
+    armazenada = autenticacao.gerar_hash("segredo")
+    assert armazenada.startswith("pbkdf2_sha256$1000$")
+    assert autenticacao.verificar_senha("segredo", armazenada) == (True, False)
+    assert autenticacao.verificar_senha("Segredo", armazenada) == (False, False)
+    assert autenticacao.gerar_hash("segredo") != armazenada
+
+def test_hash_com_outro_custo_pede_para_refazer():
+    armazenada = autenticacao.gerar_hash("segredo", iteracoes=500)
+    assert autenticacao.verificar_senha("segredo", armazenada) == (True, True)
+    assert autenticacao.verificar_senha("errada", armazenada) == (False, False)
+
+def test_senha_antiga_em_texto_puro():
+    assert autenticacao.verificar_senha("senha123", "senha123") == (True, True)
+    assert autenticacao.verificar_senha("senha12", "senha123") == (False, False)
+
+@pytest.mark.parametrize("armazenada", [
+    "pbkdf2_sha256$mil$c2FsdA==$x",
+    "pbkdf2_sha256$0$c2FsdA==$x",
+    "pbkdf2_sha256$1000$nao e base64!$x",
+])
+def test_hash_corrompido_nao_confere(armazenada):
+    assert autenticacao.verificar_senha("segredo", armazenada) == (False, False)
+
+def test_entrar_cria_sessao(credenciais):
+    usuarios, regravadas, conn = credenciais
+    usuarios["ana@example.com"] = ("11111111111", autenticacao.gerar_hash("segredo"))
+
+    token = autenticacao.entrar("cidadao", "ana@example.com", "segredo")
+
+    assert autenticacao.sessao(token) == ("cidadao", "11111111111", "ana@example.com")
+    assert regravadas == []
+    autenticacao.sair(token)
+    assert autenticacao.sessao(token) is None
+
+def test_entrar_recusa_senha_errada_e_email_desconhecido(credenciais):
+    usuarios, regravadas, conn = credenciais
+    usuarios["ana@example.com"] = ("11111111111", autenticacao.gerar_hash("segredo"))
+    assert autenticacao.entrar("cidadao", "ana@example.com", "errada") is None
+    assert autenticacao.entrar("cidadao", "ninguem@example.com", "segredo") is None
+
+def test_entrar_sempre_confere_no_banco(credenciais):
+    usuarios, regravadas, conn = credenciais
+    usuarios["ana@example.com"] = ("11111111111", autenticacao.gerar_hash("segredo"))
+    assert autenticacao.entrar("cidadao", "ana@example.com", "segredo")
+    # Senha trocada por outro processo: o login seguinte ja usa a nova
+    usuarios["ana@example.com"] = ("11111111111", autenticacao.gerar_hash("nova"))
+    assert autenticacao.entrar("cidadao", "ana@example.com", "segredo") is None
+    assert autenticacao.entrar("cidadao", "ana@example.com", "nova")
+    assert conn.emprestimos == 3
+
+def test_entrar_refaz_hash_de_senha_em_texto_puro(credenciais):
+    usuarios, regravadas, conn = credenciais
+    usuarios["ana@example.com"] = ("11111111111", "senha123")
+    assert autenticacao.entrar("cidadao", "ana@example.com", "senha123")
+    (cpf, nova), = regravadas
+    assert cpf == "11111111111"
+    assert autenticacao.verificar_senha("senha123", nova) == (True, False)
+    assert conn.commits == 1
+
+def test_entrar_com_hash_corrompido_nao_derruba_o_login(credenciais):
+    usuarios, regravadas, conn = credenciais
+    usuarios["ana@example.com"] = ("11111111111", "pbkdf2_sha256$0$c2FsdA==$x")
+    assert autenticacao.entrar("cidadao", "ana@example.com", "segredo") is None
@@ -0,0 +1,37 @@
+import decimal
+import io
+import json
+
+import ingestao
+
+def cache():
+    cache = ingestao.CacheChaves()
+    cache.placas = {"ABC1D23"}
+    cache.paradas = {("L1", 1), ("L1", 2)}
+    cache.tarifas = {"L1": decimal.Decimal("4.40")}
+    return cache
+
+def evento(minuto):
+    return json.dumps({
+        "cpf": "11111111111", "placa": "ABC1D23",
+        "inicio": f"2025-03-01T07:{minuto:02d}:00", "fim": f"2025-03-01T08:{minuto:02d}:00",
+        "linha_embarque": "L1", "parada_embarque": 1,
+        "linha_desembarque": "L1", "parada_desembarque": 2,
+    })
+
+def test_json_que_nao_e_objeto_e_rejeitado_sem_derrubar_o_lote(conexao_falsa):
+    # O INSERT ... SELECT da staging grava tudo o que o COPY recebeu
+    conn = conexao_falsa(lambda sql, params:
+                         len(conn.copiadas) if sql is ingestao.SQL_GRAVAR else [])
+    metricas = ingestao.Metricas()
+    rejeitados = io.StringIO()
+    linhas = [evento(m) for m in range(5)] + ['["a"]', "42", "null"]
+
+    ingestao.gravar_lote(conn, linhas, cache(), metricas, rejeitados)
+
+    assert len(conn.copiadas) == 5
+    assert metricas.gravados == 5
+    assert metricas.rejeitados == 3
+    assert conn.commits == 1
+    motivos = [json.loads(l)["motivo"] for l in rejeitados.getvalue().splitlines()]
+    assert motivos == ["evento deve ser um objeto JSON"] * 3
@@ -0,0 +1,83 @@
+import datetime
+import random
+
+import pytest
+
+import consultas
+import ocupacao
+
+@pytest.fixture
+def sweep(conexao_falsa):
+    # Mesmos eventos e mesma ordem de SQL_EVENTOS_OCUPACAO: descida antes de subida
+    def conexao(frota, viagens):
+        eventos = sorted([(inicio, 1, placa) for placa, inicio, _ in viagens] +
+                         [(fim, -1, placa) for placa, _, fim in viagens],
+                         key=lambda e: (e[0], e[1]))
+        return conexao_falsa(lambda sql, params:
+                             frota if sql is consultas.SQL_CAPACIDADE_ONIBUS else eventos)
+    return conexao
+
+def segundos(data_hora):
+    return int((data_hora - datetime.datetime(1970, 1, 1)).total_seconds())
+
+def a_bordo(viagens, placa, t):
+    return sum(1 for p, inicio, fim in viagens if p == placa and inicio <= t < fim)
+
+def test_distribuir_divide_o_intervalo_pelas_horas():
+    por_hora = [0] * 24
+    ocupacao._distribuir(por_hora, 3500, 7300, 2)
+    assert por_hora[:3] == [200, 7200, 200]
+    assert sum(por_hora) == 2 * (7300 - 3500)
+
+def test_distribuir_volta_para_a_hora_zero_depois_da_meia_noite():
+    por_hora = [0] * 24
+    ocupacao._distribuir(por_hora, 23 * 3600 + 1800, 24 * 3600 + 600, 1)
+    assert por_hora[23] == 1800
+    assert por_hora[0] == 600
+
+def test_viagem_que_termina_quando_outra_comeca_nao_se_sobrepoe(sweep):
+    viagens = [("AAA0001", 0, 100), ("AAA0001", 100, 200)]
+    relatorio = ocupacao.calcular(sweep([("AAA0001", "L1", 2)], viagens), limiar=1.0)
+    onibus, = relatorio.onibus
+    assert onibus.pico == 1
+    assert onibus.segundos_acima == 0
+    assert onibus.passageiros_medio == 1.0
+
+def test_sweep_confere_com_a_contagem_por_segundo(sweep):
+    gerador = random.Random(7)
+    frota = [("AAA0001", "L1", 3), ("BBB0002", "L1", 4), ("CCC0003", "L2", 2)]
+    viagens = []
+    for _ in range(60):
+        placa = gerador.choice(frota)[0]
+        inicio = gerador.randrange(0, 3 * 3600)
+        viagens.append((placa, inicio, inicio + gerador.randrange(1, 1800)))
+    limiar = 0.6
+
+    conn = sweep(frota, viagens)
+    relatorio = ocupacao.calcular(conn, limiar=limiar)
+
+    assert relatorio.viagens == len(viagens)
+    assert conn.executadas[1][0] is consultas.SQL_EVENTOS_OCUPACAO
+    assert conn.rollbacks == 1
+    fim = max(v[2] for v in viagens)
+    for onibus in relatorio.onibus:
+        contagem = [a_bordo(viagens, onibus.placa, t) for t in range(fim)]
+        assert onibus.pico == max(contagem)
+        assert a_bordo(viagens, onibus.placa, segundos(onibus.pico_em)) == onibus.pico
+        assert onibus.segundos_acima == sum(1 for n in contagem
+                                            if n and n >= limiar * onibus.capacidade)
+        minhas = [v for v in viagens if v[0] == onibus.placa]
+        ativo = max(v[2] for v in minhas) - min(v[1] for v in minhas)
+        assert onibus.passageiros_medio == pytest.approx(sum(contagem) / ativo)
+
+    for linha in relatorio.linhas:
+        placas = [p for p, l, _ in frota if l == linha.linha]
+        assert linha.pico == max(sum(a_bordo(viagens, p, t) for p in placas)
+                                 for t in range(fim))
+
+    # Curva por hora: media da frota nos segundos de cada hora entre o primeiro e o ultimo evento
+    inicio = min(v[1] for v in viagens)
+    for hora in relatorio.horas[:4]:
+        trecho = range(max(hora.hora * 3600, inicio), min((hora.hora + 1) * 3600, fim))
+        total = sum(sum(a_bordo(viagens, p, t) for p, _, _ in frota) for t in trecho)
+        assert hora.passageiros_medio == pytest.approx(total / len(trecho) if trecho else 0.0)
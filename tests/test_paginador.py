@@ -0,0 +1,76 @@
+import pytest
+
+import paginador
+
+class ConsoleFalso:
+    class size:
+        height = 14
+
+@pytest.fixture
+def bloco_pequeno(monkeypatch):
+    monkeypatch.setattr(paginador, "BLOCO_BUSCA", 4)
+
+@pytest.fixture
+def keyset(conexao_falsa, banco):
+    # WHERE chave > depois_de ORDER BY chave LIMIT limite OFFSET offset sobre rows
+    def conexao(rows):
+        def janela(sql, params):
+            depois_de, limite, offset = params
+            return [row for row in rows if row[0] > depois_de][offset:offset + limite]
+        return banco(conexao_falsa(janela))
+    return conexao
+
+def rows(n):
+    return [(f"{i:03d}", f"item {i}") for i in range(n)]
+
+def paginador_de(fonte):
+    return paginador.Paginador(ConsoleFalso(), "Teste", [("Codigo", {})], fonte)
+
+def test_buscar_da_posicao_ate_o_fim(bloco_pequeno):
+    p = paginador_de(paginador.FonteLista(rows(10)))
+    assert p.buscar("ITEM 7", 3) == 7
+    assert p.buscar("item", 9) == 9
+
+def test_buscar_volta_ao_inicio(bloco_pequeno):
+    p = paginador_de(paginador.FonteLista(rows(10)))
+    assert p.buscar("item 2", 5) == 2
+
+def test_buscar_sem_resultado(bloco_pequeno):
+    p = paginador_de(paginador.FonteLista(rows(10)))
+    assert p.buscar("nada", 6) is None
+    p.ir_para_resultado("nada", 6)
+    assert p.destaque is None
+    assert "nada" in p.mensagem
+
+def test_ir_para_resultado_carrega_a_janela_do_resultado(bloco_pequeno):
+    p = paginador_de(paginador.FonteLista(rows(30)))
+    p.carregar(0)
+    p.ir_para_resultado("item 20", 0)
+    assert p.destaque == 20
+    assert p.inicio <= 20 < p.inicio + len(p.rows)
+
+def test_keyset_guarda_marcos_e_janelas_conferem(bloco_pequeno, keyset):
+    dados = rows(11)
+    conn = keyset(dados)
+    fonte = paginador.FonteKeyset("SQL_DEBUG_CIDADAOS")
+
+    assert fonte.janela(9, 3) == dados[9:11]
+    assert fonte.total() == 11
+    assert fonte.marcos == {0: "", 4: "003", 8: "007"}
+    assert all(params[2] < paginador.BLOCO_BUSCA for _, params in conn.executadas)
+    # Uma conexao emprestada por leitura, nenhuma presa entre elas
+    assert conn.emprestimos == len(conn.executadas)
+
+    for inicio in range(12):
+        assert fonte.janela(inicio, 3) == dados[inicio:inicio + 3]
+    assert fonte.janela(20, 3) == []
+
+def test_keyset_busca_ate_o_fim_sem_total(bloco_pequeno, keyset):
+    dados = rows(9)
+    keyset(dados)
+    p = paginador_de(paginador.FonteKeyset("SQL_DEBUG_CIDADAOS"))
+    assert p.fonte.total() is None
+    assert p.buscar("item 8", 0) == 8
+    assert p.fonte.total() == 9
+    p.ir_para_fim()
+    assert p.rows == dados[p.inicio:]
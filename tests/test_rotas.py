@@ -0,0 +1,71 @@
+import pytest
+
+import referencia
+import rotas
+
+def ponto(linha, nro, rua, bairro):
+    return (linha, nro, rua, bairro, 100, "00000-000", "S", "N", "N")
+
+def grafo(rua_baldeacao="Rua das Flores"):
+    # A: Centro -> Meio e C: Meio -> Norte, 10 min e R$ 4,00 cada; B: Centro -> Norte
+    # direto em 40 min por R$ 3,00. E liga Ilha e Lago sem tocar as demais; D esta inativa.
+    tabelas = {
+        "EMPRESA_PUBLICA": [("11", "SPTrans")],
+        "LINHA": [
+            ("A", 4.0, 10, "S", "11"),
+            ("B", 3.0, 40, "S", "11"),
+            ("C", 4.0, 10, "S", "11"),
+            ("D", 1.0, 10, "N", "11"),
+            ("E", 2.0, 10, "S", "11"),
+        ],
+        "PONTO_PARADA": [
+            ponto("A", 1, "Rua Um", "Centro"),
+            ponto("A", 2, "Rua das Flores", "Meio"),
+            ponto("B", 1, "Rua Dois", "Centro"),
+            ponto("B", 2, "Rua Tres", "Norte"),
+            ponto("C", 1, rua_baldeacao, "Meio"),
+            ponto("C", 2, "Rua Quatro", "Norte"),
+            ponto("D", 1, "Rua Cinco", "Centro"),
+            ponto("D", 2, "Rua Seis", "Deserto"),
+            ponto("E", 1, "Rua Sete", "Ilha"),
+            ponto("E", 2, "Rua Oito", "Lago"),
+        ],
+        "ONIBUS": [],
+    }
+    return rotas.Grafo(referencia.Snapshot(tabelas))
+
+def test_criterio_tempo_baldeia_na_mesma_rua():
+    rota = grafo().planejar("Centro", "Norte", "tempo")
+    assert [t.linha for t in rota.trechos] == ["A", "C"]
+    assert rota.minutos == 20 + rotas.TEMPO_BALDEACAO
+    assert rota.tarifa == 8.0
+    assert rota.baldeacoes == 1
+    assert [t.embarque[3] for t in rota.trechos] == ["Centro", "Meio"]
+
+def test_baldeacao_em_outra_rua_do_bairro_custa_mais():
+    rota = grafo(rua_baldeacao="Rua Larga").planejar("Centro", "Norte", "tempo")
+    assert [t.linha for t in rota.trechos] == ["A", "C"]
+    assert rota.minutos == 20 + rotas.TEMPO_BALDEACAO_BAIRRO
+
+def test_criterio_tarifa_prefere_a_linha_direta():
+    rota = grafo().planejar("centro", "NORTE", "tarifa")
+    assert [t.linha for t in rota.trechos] == ["B"]
+    assert rota.minutos == 40
+    assert rota.tarifa == 3.0
+    assert rota.baldeacoes == 0
+
+def test_sem_caminho_entre_componentes_desligadas():
+    assert grafo().planejar("Centro", "Lago") is rotas.SEM_ROTA
+
+def test_bairro_desconhecido_ou_so_com_linha_inativa():
+    g = grafo()
+    assert g.planejar("Centro", "Atlantida") is None
+    assert g.planejar("Centro", "Deserto") is None
+    assert "Deserto" not in g.bairros()
+
+def test_origem_igual_ao_destino():
+    assert grafo().planejar("Meio", "meio") == rotas.Rota([], 0, 0, 0)
+
+def test_criterio_invalido():
+    with pytest.raises(ValueError):
+        grafo().planejar("Centro", "Norte", "distancia")
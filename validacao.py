@@ -0,0 +1,45 @@
+def validar_cpf(cpf):
+    if not cpf:
+        return False, "CPF não pode estar vazio"
+
+    if not cpf.isdigit():
+        return False, "CPF deve conter apenas números (sem pontos ou traços)"
+
+    if len(cpf) != 11:
+        return False, "CPF deve conter exatamente 11 dígitos"
+
+    return True, "CPF válido"
+
+def validar_cep(cep):
+    if not cep:
+        return False, "CEP não pode estar vazio"
+
+    if not cep.isdigit():
+        return False, "CEP deve conter apenas números (sem pontos ou traços)"
+
+    if len(cep) != 8:
+        return False, "CEP deve conter exatamente 8 dígitos"
+
+    return True, "CEP válido"
+
+def validar_email(email):
+    if not email:
+        return False, "Email não pode estar vazio"
+
+    if '@' not in email:
+        return False, "Email deve conter o caractere @"
+
+    partes = email.split('@')
+    if len(partes) != 2 or not partes[0] or not partes[1]:
+        return False, "Email deve ter o formato nome@dominio"
+
+    return True, "Email válido"
+
+def validar_numero_casa(numero):
+    if not numero:
+        return True, "Número vazio é válido"
+
+    if not numero.isdigit():
+        return False, "Número da casa deve conter apenas dígitos"
+
+    return True, "Número válido"